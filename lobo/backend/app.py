@@ -38,6 +38,10 @@ logging.info("Starting Flask application...")
 # ✅ Initialize Flask app
 app = Flask(__name__)
 
+# 📤 Hash and validate file uploads while the request body is parsed
+from utils.file_handler import IngestRequest
+app.request_class = IngestRequest
+
 # 🔐 Apply security & JWT configurations
 app.config["SECRET_KEY"] = Config.SECRET_KEY
 app.config["JWT_SECRET_KEY"] = Config.JWT_SECRET_KEY
@@ -47,6 +47,21 @@ def run_seed(args):
     print("🌱 Seeding database...")
     seed_users()
 
+def run_shard_vectors(args):
+    """Split the legacy global vector index into per-user shards."""
+    from scripts.shard_vectors import shard_vectors
+    
+    print("🧩 Sharding vector index...")
+    shard_vectors()
+
+def run_fetch_tokenizer(args):
+    """Download the tokenizer used to budget chat context."""
+    from utils.context_builder import fetch_tokenizer
+    
+    print("🔤 Fetching tokenizer...")
+    path = fetch_tokenizer()
+    print(f"✅ Tokenizer saved to {path}")
+
 def main():
     """Main entry point for the CLI."""
     parser = argparse.ArgumentParser(description="LOBO Management CLI")
@@ -67,6 +82,12 @@ def main():
     # Seed command
     seed_parser = subparsers.add_parser("seed", help="Seed the database")
     
+    # Vector sharding command
+    shard_parser = subparsers.add_parser("shard-vectors", help="Split the global vector index into per-user shards")
+    
+    # Tokenizer download command
+    tokenizer_parser = subparsers.add_parser("fetch-tokenizer", help="Download the chat context tokenizer")
+    
     args = parser.parse_args()
     
     if args.command == "server":
@@ -77,6 +98,10 @@ def main():
         run_backup(args)
     elif args.command == "seed":
         run_seed(args)
+    elif args.command == "shard-vectors":
+        run_shard_vectors(args)
+    elif args.command == "fetch-tokenizer":
+        run_fetch_tokenizer(args)
     else:
         parser.print_help()
 
@@ -103,6 +103,42 @@ def extract_jwt_payload(auth_header):
         logging.error(f"Error extracting JWT payload: {str(e)}")
         return None
 
+def get_user_tier(user_id):
+    """
+    Get a user's subscription tier with caching for better performance.
+    Redis and database connection errors are left to the caller.
+    """
+    # Check cache in Redis first
+    cache_key = f"user_tier:{user_id}"
+    cached_tier = redis_client.get(cache_key)
+    
+    if cached_tier:
+        return cached_tier
+    
+    # Fetch tier from database if not in cache
+    response = supabase.table("subscriptions") \
+        .select("tier") \
+        .eq("user_id", user_id) \
+        .eq("status", "active") \
+        .limit(1) \
+        .execute()
+        
+    if response.error:
+        logging.error(f"Error fetching subscription: {response.error}")
+        return "free"
+        
+    if not response.data:
+        # Cache default tier with expiration
+        redis_client.setex(cache_key, 3600, "free")  # Cache for 1 hour
+        return "free"
+        
+    user_tier = response.data[0].get("tier", "free")
+    
+    # Cache tier with expiration
+    redis_client.setex(cache_key, 3600, user_tier)  # Cache for 1 hour
+    
+    return user_tier
+
 def get_user_tier_from_token(auth_header):
     """
     Extract user tier from auth token with caching for better performance.
@@ -116,38 +152,7 @@ def get_user_tier_from_token(auth_header):
         if not payload or "sub" not in payload:
             return "guest"
             
-        user_id = payload["sub"]
-        
-        # Check cache in Redis first
-        cache_key = f"user_tier:{user_id}"
-        cached_tier = redis_client.get(cache_key)
-        
-        if cached_tier:
-            return cached_tier
-        
-        # Fetch tier from database if not in cache
-        response = supabase.table("subscriptions") \
-            .select("tier") \
-            .eq("user_id", user_id) \
-            .eq("status", "active") \
-            .limit(1) \
-            .execute()
-            
-        if response.error:
-            logging.error(f"Error fetching subscription: {response.error}")
-            return "free"
-            
-        if not response.data:
-            # Cache default tier with expiration
-            redis_client.setex(cache_key, 3600, "free")  # Cache for 1 hour
-            return "free"
-            
-        user_tier = response.data[0].get("tier", "free")
-        
-        # Cache tier with expiration
-        redis_client.setex(cache_key, 3600, user_tier)  # Cache for 1 hour
-        
-        return user_tier
+        return get_user_tier(payload["sub"])
         
     except Exception as e:
         logging.error(f"Error extracting user tier: {str(e)}")
@@ -1,39 +1,226 @@
+import time
 import logging
-from typing import Optional
-from langchain_ollama import OllamaLLM
+from typing import Dict, Iterator, List, Optional
 from config import Config
+from utils.context_builder import CHAT_SYSTEM_PROMPT, CONTEXT_WINDOW, build_context
+from utils.metrics import record_latency
+from utils.model_pool import OLLAMA_KEEP_ALIVE, record_model_use
+from utils.llm_router import LLMRouter, get_llm_router
+from utils.prefetch import mark_interactive
+from utils.response_cache import (
+    RESPONSE_CACHE_MAX_HISTORY, ResponseCache, get_response_cache, history_digest, response_cache_key
+)
+from utils.single_flight import SINGLE_FLIGHT_ENABLED, SingleFlight, get_single_flight
+from utils.inference_scheduler import (
+    GenerationBudget, InferenceScheduler, SchedulerRejected, get_inference_scheduler, tier_budget
+)
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
 
 class Chatbot:
-    """A chatbot powered by LangChain and Ollama.
+    """A chatbot powered by Ollama.
 
     Attributes:
-        llm (OllamaLLM): The language model used for generating responses.
+        client (LLMRouter): Routes generations to the least-loaded Ollama host.
+        cache (ResponseCache): Response cache consulted before the model is called.
+        single_flight (SingleFlight): Coalesces concurrent identical generations, or None.
+        scheduler (InferenceScheduler): Admission control for calls to the model.
     """
 
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None, single_flight: Optional[SingleFlight] = None,
+                 scheduler: Optional[InferenceScheduler] = None, client: Optional[LLMRouter] = None):
         """Initialize the chatbot with the configured Ollama model."""
         if not Config.OLLAMA_MODEL:
             raise ValueError("Ollama model is not configured in Config.")
-        self.llm = OllamaLLM(model=Config.OLLAMA_MODEL)
+        self.client = client or get_llm_router()
+        self.cache = cache or get_response_cache()
+        self.single_flight = single_flight or (get_single_flight() if SINGLE_FLIGHT_ENABLED else None)
+        self.scheduler = scheduler or get_inference_scheduler()
 
-    def generate_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 512) -> Optional[str]:
+    @staticmethod
+    def _reply_tokens(tier: Optional[str], max_tokens: int) -> int:
+        """Requested reply length capped by the tier's budget and half the context window."""
+        return min(tier_budget(tier).clamp(max_tokens), CONTEXT_WINDOW // 2)
+
+    @staticmethod
+    def _cacheable(history: Optional[List[Dict[str, str]]], knowledge: Optional[str]) -> bool:
+        """Whether a reply can be shared with other users asking the same thing at the same point."""
+        # Answers from a user's own documents, or deep into a conversation, are not reusable
+        return not knowledge and len(history or []) <= RESPONSE_CACHE_MAX_HISTORY
+
+    @staticmethod
+    def _cache_params(temperature: float, max_tokens: int,
+                      history: Optional[List[Dict[str, str]]] = None) -> dict:
+        """Generation parameters, and the earlier turns if any, a cached response must match."""
+        params = {"temperature": temperature, "max_tokens": max_tokens}
+        if history:
+            params["history"] = history_digest(history)
+        return params
+
+    def _flight_key(self, prompt: str, params: dict, tier: Optional[str]) -> str:
+        """
+        Single-flight key: the cache key plus the tier's scheduling priority and budget.
+
+        Callers only share a generation that is queued and limited like their
+        own, so a user never waits behind a background prefetch of the same
+        prompt, and a paid tier's reply is never cut off at a free tier's time limit.
+        """
+        priority = self.scheduler.priority(tier or "guest")
+        budget = tier_budget(tier)
+        return (f"{response_cache_key(prompt, Config.OLLAMA_MODEL, params)}"
+                f":p{priority}:b{budget.max_tokens}/{budget.max_seconds:g}")
+
+    def is_cached(self, prompt: str, temperature: float = 0.7, max_tokens: int = 512,
+                  tier: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None) -> bool:
+        """
+        Checks whether a response to the prompt is already cached.
+
+        Args:
+            prompt (str): The user input prompt.
+            temperature (float): Temperature the response must have been generated with.
+            max_tokens (int): Requested token limit, capped by the tier's budget.
+            tier (Optional[str]): Subscription tier of the user.
+            history (Optional[List[Dict[str, str]]]): Earlier turns the response must follow.
+
+        Returns:
+            bool: True if generate_response would answer from the cache.
+        """
+        max_tokens = self._reply_tokens(tier, max_tokens)
+        return self.cache.contains(prompt, Config.OLLAMA_MODEL, self._cache_params(temperature, max_tokens, history))
+
+    @staticmethod
+    def _build_messages(prompt: str, history: Optional[List[Dict[str, str]]], max_tokens: int,
+                        knowledge: Optional[str] = None) -> List[Dict[str, str]]:
+        """System prompt and retrieved knowledge, previous turns that fit the context window, then the prompt."""
+        system_prompt = "\n\n".join(part for part in (CHAT_SYSTEM_PROMPT, knowledge) if part)
+        messages, _ = build_context(
+            list(history or []) + [{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            system_prompt=system_prompt
+        )
+        return messages
+
+    def _generate_tokens(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                         tier: Optional[str], budget: GenerationBudget, outcome: dict) -> Iterator[str]:
+        """
+        Runs one generation within the tier's budget and yields its tokens.
+
+        Ollama stops at `max_tokens` (num_predict). A generation still running
+        after the budget's time limit is cancelled and `outcome["truncated"]`
+        is set, so the partial reply is returned but never cached.
+        """
+        if tier != "background":
+            mark_interactive()
+        record_model_use(Config.OLLAMA_MODEL)
+        options = {"temperature": temperature, "num_predict": max_tokens, "num_ctx": CONTEXT_WINDOW}
+        with self.scheduler.slot(Config.OLLAMA_MODEL, tier):
+            start = time.perf_counter()
+            try:
+                # Closing this generator cancels the request, so Ollama stops generating
+                for chunk in self.client.stream_chat(Config.OLLAMA_MODEL, messages, options=options,
+                                                     keep_alive=OLLAMA_KEEP_ALIVE, timeout=budget.max_seconds):
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        yield token
+            except TimeoutError:
+                outcome["truncated"] = True
+                logging.warning(f"Generation for tier {tier} cut off after {budget.max_seconds:.0f}s")
+            record_latency("generation", time.perf_counter() - start)
+
+    def generate_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 512,
+                          tier: Optional[str] = None,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          knowledge: Optional[str] = None) -> Optional[str]:
         """
         Generates a response from the AI model.
 
         Args:
             prompt (str): The user input prompt.
             temperature (float): Controls randomness (higher = more creative). Defaults to 0.7.
-            max_tokens (int): Limits the length of the response. Defaults to 512.
+            max_tokens (int): Limits the length of the response, capped by the tier's budget. Defaults to 512.
+            tier (Optional[str]): Subscription tier of the user, used to prioritize and budget the request.
+            history (Optional[List[Dict[str, str]]]): Earlier turns of the conversation, oldest first.
+            knowledge (Optional[str]): Retrieved document context to answer from.
 
         Returns:
             Optional[str]: AI-generated response, or None if an error occurs.
+
+        Raises:
+            SchedulerRejected: If the model is overloaded or the request timed out in the queue.
+        """
+        budget = tier_budget(tier)
+        max_tokens = self._reply_tokens(tier, max_tokens)
+        cacheable = self._cacheable(history, knowledge)
+        params = self._cache_params(temperature, max_tokens, history)
+        if cacheable:
+            cached = self.cache.get(prompt, Config.OLLAMA_MODEL, params)
+            if cached is not None:
+                return cached
+
+        messages = self._build_messages(prompt, history, max_tokens, knowledge)
+
+        def generate() -> Optional[str]:
+            try:
+                outcome = {}
+                response = "".join(self._generate_tokens(messages, temperature, max_tokens, tier, budget, outcome))
+                if cacheable and not outcome.get("truncated"):
+                    self.cache.set(prompt, Config.OLLAMA_MODEL, params, response)
+                return response or None
+            except SchedulerRejected:
+                raise
+            except Exception as e:
+                logging.error(f"Error generating response for prompt: '{prompt}'. Error: {str(e)}")
+                return None
+
+        if self.single_flight is None or not cacheable:
+            return generate()
+        # Concurrent identical prompts share one generation
+        return self.single_flight.do(self._flight_key(prompt, params, tier), generate)
+
+    def stream_response(self, prompt: str, temperature: float = 0.7, max_tokens: int = 512,
+                        tier: Optional[str] = None,
+                        history: Optional[List[Dict[str, str]]] = None,
+                        knowledge: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams a response from the AI model as tokens are generated.
+
+        Args:
+            prompt (str): The user input prompt.
+            temperature (float): Controls randomness (higher = more creative). Defaults to 0.7.
+            max_tokens (int): Limits the length of the response, capped by the tier's budget. Defaults to 512.
+            tier (Optional[str]): Subscription tier of the user, used to prioritize and budget the request.
+            history (Optional[List[Dict[str, str]]]): Earlier turns of the conversation, oldest first.
+            knowledge (Optional[str]): Retrieved document context to answer from.
+
+        Yields:
+            str: Text fragments of the response, in generation order. A cached
+            response is yielded as a single fragment.
         """
-        try:
-            response = self.llm.invoke(prompt)
-            return response
-        except Exception as e:
-            logging.error(f"Error generating response for prompt: '{prompt}'. Error: {str(e)}")
-            return None
\ No newline at end of file
+        budget = tier_budget(tier)
+        max_tokens = self._reply_tokens(tier, max_tokens)
+        cacheable = self._cacheable(history, knowledge)
+        params = self._cache_params(temperature, max_tokens, history)
+        if cacheable:
+            cached = self.cache.get(prompt, Config.OLLAMA_MODEL, params)
+            if cached is not None:
+                yield cached
+                return
+
+        messages = self._build_messages(prompt, history, max_tokens, knowledge)
+
+        def generate() -> Iterator[str]:
+            parts, outcome = [], {}
+            for token in self._generate_tokens(messages, temperature, max_tokens, tier, budget, outcome):
+                parts.append(token)
+                yield token
+
+            # Only a completed stream is cached; an interrupted or cut off one never is
+            if cacheable and not outcome.get("truncated"):
+                self.cache.set(prompt, Config.OLLAMA_MODEL, params, "".join(parts))
+
+        if self.single_flight is None or not cacheable:
+            yield from generate()
+        else:
+            # Concurrent identical prompts share one token stream
+            yield from self.single_flight.stream(self._flight_key(prompt, params, tier), generate)
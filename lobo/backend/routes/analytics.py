@@ -3,6 +3,12 @@ from middleware.auth_middleware import auth_required
 from middleware.csrf_middleware import csrf_protect
 from utils.api_response import success_response, error_response
 from utils.database import supabase
+from utils.response_cache import get_response_cache_stats
+from utils.inference_scheduler import get_inference_stats
+from utils.metrics import get_latency_stats
+from utils.model_pool import get_model_pool_stats
+from utils.llm_router import get_llm_router_stats
+from utils.embeddings import get_embedding_stats
 import logging
 from datetime import datetime, timedelta
 
@@ -211,7 +217,13 @@ def get_system_analytics(user_id):
             "avg_chats_per_active_user": round(total_chats / active_user_count, 2) if active_user_count else 0,
             "daily_registrations": daily_registrations,
             "new_users": len(registrations_response.data),
-            "new_user_rate": round(len(registrations_response.data) / total_users * 100, 2) if total_users else 0
+            "new_user_rate": round(len(registrations_response.data) / total_users * 100, 2) if total_users else 0,
+            "response_cache": get_response_cache_stats(),
+            "inference_queues": get_inference_stats(),
+            "latency": get_latency_stats(),
+            "model_pool": get_model_pool_stats(),
+            "llm_backends": get_llm_router_stats(),
+            "embeddings": get_embedding_stats()
         }
         
         return success_response(
@@ -1,11 +1,20 @@
 # File: lobo/backend/routes/chatbot.py
+# Enhancement: Token streaming over Server-Sent Events and Socket.IO
+# Enhancement: Server-side conversation context instead of the cookie session
+# Enhancement: Retrieval-augmented answers from the caller's uploaded files
+import json
+import uuid
 import logging
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 from config import Config  # Import configuration settings
 from flask_limiter.util import get_remote_address
-from utils.websocket import broadcast_chat_update
+from utils.websocket import broadcast_chat_update, ChatMessageStream, verify_jwt_token
 import datetime
 from models.chatbot import Chatbot  # Import the Chatbot class
+from middleware.rate_limiter import get_user_tier_from_token
+from utils.inference_scheduler import SchedulerRejected
+from utils.conversation_store import get_conversation_store
+from utils.rag import build_rag_context
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,6 +31,101 @@ def is_valid_message(message: str) -> bool:
     allowed_chars = " .,!?+-*/=(){}[]<>@#$%^&_|\\\"'`"
     return all(char.isalnum() or char in allowed_chars for char in message)
 
+def wants_stream(data: dict) -> bool:
+    """Checks whether the client asked for a streamed response."""
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+def sse_event(event: str, payload: dict) -> str:
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def get_authenticated_user_id() -> str:
+    """Gets the ID of the signed-in caller, or None for guests."""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    return verify_jwt_token(auth_header.split("Bearer ")[1])
+
+def get_conversation_id(chat_id: str = None, user_id: str = None) -> str:
+    """
+    Gets the ID the conversation context is stored under.
+
+    Signed-in clients that send a chat_id use it directly; their context is
+    stored under their user ID too, so it is only found by them. Guests, and
+    clients without a chat_id, get a random conversation ID that is the only
+    value kept in the session, never the messages themselves.
+    """
+    if chat_id and user_id:
+        return chat_id
+    conversation_id = session.get("conversation_id")
+    if not conversation_id:
+        conversation_id = str(uuid.uuid4())
+        session["conversation_id"] = conversation_id
+        session.permanent = True  # Enable session expiration
+    return conversation_id
+
+def stream_chatbot_response(user_message: str, chat_id: str = None,
+                            temperature: float = 0.7, max_tokens: int = 512,
+                            tier: str = None, conversation_id: str = None,
+                            history: list = None, knowledge: str = None,
+                            user_id: str = None) -> Response:
+    """
+    Streams the AI response as Server-Sent Events.
+
+    Each generated fragment is sent as a `token` event, followed by a `done`
+    event with the full response (or an `error` event). When a chat_id is
+    given, the same tokens are relayed to the chat room over Socket.IO.
+    """
+    def generate():
+        socket_stream = ChatMessageStream(chat_id) if chat_id else None
+        parts = []
+        try:
+            for token in chatbot_instance.stream_response(
+                user_message,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                tier=tier,
+                history=history,
+                knowledge=knowledge
+            ):
+                parts.append(token)
+                if socket_stream:
+                    socket_stream.push(token)
+                yield sse_event("token", {"token": token})
+
+            bot_response = "".join(parts) or "Sorry, I couldn't generate a response."
+            if conversation_id and parts:
+                get_conversation_store().append(
+                    conversation_id,
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": bot_response},
+                    owner=user_id
+                )
+            if socket_stream:
+                socket_stream.finish(bot_response)
+            yield sse_event("done", {"response": bot_response, "chat_id": conversation_id})
+
+        except SchedulerRejected as e:
+            logging.warning(f"Streaming chatbot request rejected: {str(e)}")
+            if socket_stream:
+                socket_stream.finish("The assistant is busy, please try again shortly.")
+            yield sse_event("error", {"error": "The assistant is busy", "retry_after": e.retry_after})
+
+        except Exception as e:
+            logging.error(f"Error streaming chatbot response: {str(e)}")
+            if socket_stream:
+                socket_stream.finish("Sorry, I couldn't generate a response.")
+            yield sse_event("error", {"error": "An internal error occurred"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stop nginx from buffering the stream
+        }
+    )
+
 @chatbot.route("/", methods=["POST"])
 def chatbot_response():
     try:
@@ -37,31 +141,66 @@ def chatbot_response():
         if not is_valid_message(user_message):
             return jsonify({"error": "Invalid message content"}), 400
 
-        # Retrieve previous conversation from session (for chat context)
-        chat_history = session.get("chat_history", [])
-
-        # Append user message to history
-        chat_history.append({"role": "user", "content": user_message})
+        # Retrieve previous turns from the server-side conversation store
+        user_id = get_authenticated_user_id()
+        conversation_id = get_conversation_id(chat_id, user_id)
+        conversation_store = get_conversation_store()
+        history = conversation_store.get_history(conversation_id, owner=user_id)
         
-        # Generate AI response using the Chatbot class
-        temperature = 0.7  # Default value, could be customized
-        max_tokens = 512  # Default value, could be customized
-        bot_response = chatbot_instance.generate_response(
-            user_message, 
-            temperature=temperature, 
-            max_tokens=max_tokens
-        )
+        # Generation parameters; max_tokens is further capped by the caller's tier
+        temperature = data.get("temperature", 0.7)
+        max_tokens = data.get("max_tokens", 512)
+        if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2:
+            return jsonify({"error": "temperature must be a number between 0 and 2"}), 400
+        if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 1:
+            return jsonify({"error": "max_tokens must be a positive integer"}), 400
+        tier = get_user_tier_from_token(request.headers.get("Authorization"))
+
+        # RAG mode: answer from the caller's own uploaded files
+        knowledge = None
+        if data.get("rag"):
+            if not user_id:
+                return jsonify({"error": "Authentication is required to answer from your files"}), 401
+            filters = {"file_id": data["file_ids"]} if data.get("file_ids") else None
+            knowledge = build_rag_context(user_message, user_id, filters)
+
+        if wants_stream(data):
+            return stream_chatbot_response(
+                user_message, chat_id, temperature, max_tokens, tier,
+                conversation_id=conversation_id, history=history, knowledge=knowledge,
+                user_id=user_id
+            )
+
+        try:
+            bot_response = chatbot_instance.generate_response(
+                user_message, 
+                temperature=temperature, 
+                max_tokens=max_tokens,
+                tier=tier,
+                history=history,
+                knowledge=knowledge
+            )
+        except SchedulerRejected as e:
+            logging.warning(f"Chatbot request rejected: {str(e)}")
+            response = jsonify({"error": "The assistant is busy, please try again shortly"})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, 503
         
+        generated = bot_response is not None
         if bot_response is None:
             bot_response = "Sorry, I couldn't generate a response."
 
         # Log the response
         logging.info(f"Generated response: {bot_response}")
 
-        # Append bot response to chat history and update session
-        chat_history.append({"role": "assistant", "content": bot_response})
-        session["chat_history"] = chat_history  # Store chat history in session
-        session.permanent = True  # Enable session expiration
+        # Store both turns so the next request sees them as context
+        if generated:
+            conversation_store.append(
+                conversation_id,
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": bot_response},
+                owner=user_id
+            )
 
         # If chat_id is provided, broadcast the response via WebSocket
         if chat_id:
@@ -74,7 +213,7 @@ def chatbot_response():
                 }
             })
 
-        return jsonify({"response": bot_response}), 200
+        return jsonify({"response": bot_response, "chat_id": conversation_id}), 200
 
     except Exception as e:
         logging.error(f"Error in chatbot response: {str(e)}")
@@ -8,7 +8,7 @@ import pandas as pd
 from flask import Blueprint, request, jsonify, send_file, abort, g
 from werkzeug.utils import secure_filename
 from utils.file_handler import (
-    save_uploaded_file, store_file_metadata, get_file_by_id,
+    save_uploaded_file, store_file_metadata, get_file_by_id, release_stored_file,
     get_user_files, delete_file, ALLOWED_EXTENSIONS
 )
 from utils.vector_db import store_vectors, process_document_for_vectors
@@ -18,6 +18,7 @@ from middleware.rate_limiter import tier_limit_decorator, subscription_required
 from utils.api_response import success_response, error_response
 from utils.cache import cache_response, invalidate_user_cache
 from utils.file_processors import process_pdf, process_text_file, process_csv, process_excel
+from utils.chunked_upload import ChunkedUpload, UploadError, tier_upload_limit
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -75,51 +76,236 @@ def upload_file(user_id):
                 status_code=status_code
             )
 
-        # Store file metadata in database with initial processing status
-        file_metadata = {
-            **metadata,
-            "processing_status": "PENDING",
-            "processing_progress": 0
-        }
-        file_id = store_file_metadata(user_id, file_metadata)
-        
-        if not file_id:
-            return error_response(
-                message="Failed to store file metadata",
-                status_code=500
-            )
+        return register_uploaded_file(user_id, metadata)
 
-        # Invalidate user files cache
-        invalidate_user_cache(user_id, "files")
+    except Exception as e:
+        logging.error(f"File upload error: {str(e)}")
+        return error_response(
+            message="An internal error occurred while processing the file",
+            status_code=500,
+            exc=e
+        )
 
-        # Start asynchronous processing task
-        from utils.tasks import process_file
-        task = process_file.delay(
-            file_id,
-            metadata.get("file_path", ""),
-            metadata.get("mime_type", ""),
-            user_id
+def register_uploaded_file(user_id, metadata):
+    """
+    Record a stored upload and start processing it.
+
+    Args:
+        user_id (str): Owner of the file
+        metadata (Dict): Metadata of the stored file
+
+    Returns:
+        Response: 202 with the file details and processing task ID
+    """
+    # Store file metadata in database with initial processing status
+    file_metadata = {
+        **metadata,
+        "processing_status": "PENDING",
+        "processing_progress": 0
+    }
+    file_id = store_file_metadata(user_id, file_metadata)
+    
+    if not file_id:
+        release_stored_file(metadata)
+        return error_response(
+            message="Failed to store file metadata",
+            status_code=500
         )
 
-        # Return response with file details and task ID
+    # Invalidate user files cache
+    invalidate_user_cache(user_id, "files")
+
+    # Start asynchronous processing task
+    from utils.tasks import process_file
+    task = process_file.delay(
+        file_id,
+        metadata.get("file_path", ""),
+        metadata.get("mime_type", ""),
+        user_id,
+        metadata.get("upload_date"),
+        metadata.get("file_hash")
+    )
+
+    # Return response with file details and task ID
+    return success_response(
+        data={
+            "file_id": file_id,
+            "original_filename": metadata.get("original_filename", ""),
+            "file_size": metadata.get("file_size", 0),
+            "mime_type": metadata.get("mime_type", ""),
+            "processing_status": "PENDING",
+            "processing_progress": 0,
+            "task_id": task.id
+        },
+        message="File uploaded and processing started",
+        status_code=202  # Accepted
+    )
+
+@files_bp.route("/uploads", methods=["POST"])
+@auth_required
+@csrf_protect
+@tier_limit_decorator("files")
+def create_chunked_upload(user_id):
+    """
+    Start a resumable chunked upload.
+
+    Expected JSON:
+    - filename: Name of the file
+    - size: Total size in bytes, up to the tier's `max_upload_bytes`
+    - chunk_size (optional): Preferred chunk size in bytes
+
+    Returns:
+        - 201: Upload ID, chunk size and the offsets to send
+        - 400: Bad request if the filename or size is invalid
+        - 413: Payload too large if the size exceeds the tier's limit
+        - 415: Unsupported media type if the file type is not allowed
+        - 507: Insufficient storage if the file does not fit on disk
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = secure_filename(str(data.get("filename") or ""))
+        if not filename:
+            return error_response(message="No filename provided", status_code=400, error_code="empty_filename")
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if ext not in ALLOWED_EXTENSIONS:
+            return error_response(message=f"File type not allowed (.{ext or 'no extension'})", status_code=415)
+
+        upload = ChunkedUpload.create(
+            user_id,
+            filename,
+            data.get("size"),
+            chunk_size=data.get("chunk_size") if isinstance(data.get("chunk_size"), int) else None,
+            max_size=tier_upload_limit(getattr(g, "user_tier", None))
+        )
         return success_response(
-            data={
-                "file_id": file_id,
-                "original_filename": metadata.get("original_filename", ""),
-                "file_size": metadata.get("file_size", 0),
-                "mime_type": metadata.get("mime_type", ""),
-                "processing_status": "PENDING",
-                "processing_progress": 0,
-                "task_id": task.id
-            },
-            message="File uploaded and processing started",
-            status_code=202  # Accepted
+            data=upload.status(),
+            message="Upload started",
+            status_code=201
         )
 
+    except UploadError as e:
+        return error_response(message=str(e), status_code=e.status_code, error_code=e.error_code)
     except Exception as e:
-        logging.error(f"File upload error: {str(e)}")
+        logging.error(f"Error starting chunked upload: {str(e)}")
         return error_response(
-            message="An internal error occurred while processing the file",
+            message="An error occurred while starting the upload",
+            status_code=500,
+            exc=e
+        )
+
+@files_bp.route("/uploads/<upload_id>", methods=["GET"])
+@auth_required
+@csrf_protect
+def get_chunked_upload(user_id, upload_id):
+    """
+    Get the progress of a chunked upload, including the offsets still missing.
+    """
+    try:
+        upload = ChunkedUpload.load(upload_id, user_id)
+        return success_response(data=upload.status(), message="Upload status retrieved successfully")
+
+    except UploadError as e:
+        return error_response(message=str(e), status_code=e.status_code, error_code=e.error_code)
+    except Exception as e:
+        logging.error(f"Error retrieving chunked upload: {str(e)}")
+        return error_response(
+            message="An error occurred while retrieving the upload",
+            status_code=500,
+            exc=e
+        )
+
+@files_bp.route("/uploads/<upload_id>", methods=["PUT"])
+@auth_required
+@csrf_protect
+def put_upload_chunk(user_id, upload_id):
+    """
+    Upload one chunk.
+
+    Expected:
+    - `offset` query parameter: Byte offset of the chunk, a multiple of the chunk size
+    - `X-Chunk-SHA256` header: Hex SHA-256 of the chunk
+    - Raw chunk bytes as the body
+
+    Returns:
+        - 200: Upload status after the chunk
+        - 400: Bad request if the chunk is incomplete or has the wrong length
+        - 409: Conflict if the chunk is already being sent or the upload is finalizing
+        - 416: Range not satisfiable if the offset is invalid
+        - 422: Unprocessable if the chunk does not match its hash
+    """
+    try:
+        offset = request.args.get("offset", type=int)
+        if offset is None:
+            return error_response(message="Chunk offset is required", status_code=400, error_code="missing_offset")
+
+        upload = ChunkedUpload.load(upload_id, user_id)
+        status = upload.write_chunk(
+            offset,
+            request.stream,
+            request.content_length,
+            request.headers.get("X-Chunk-SHA256")
+        )
+        return success_response(data=status, message="Chunk received")
+
+    except UploadError as e:
+        return error_response(message=str(e), status_code=e.status_code, error_code=e.error_code)
+    except Exception as e:
+        logging.error(f"Error receiving upload chunk: {str(e)}")
+        return error_response(
+            message="An error occurred while receiving the chunk",
+            status_code=500,
+            exc=e
+        )
+
+@files_bp.route("/uploads/<upload_id>/complete", methods=["POST"])
+@auth_required
+@csrf_protect
+def complete_chunked_upload(user_id, upload_id):
+    """
+    Finish a chunked upload once every chunk was received.
+
+    Expected JSON (optional):
+    - sha256: Hex SHA-256 of the whole file
+
+    Returns:
+        - 202: File details and processing task ID, as for /upload
+        - 409: Conflict if chunks are missing or still uploading
+        - 415: Unsupported media type if the content does not match the file type
+        - 422: Unprocessable if the file does not match its hash
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        upload = ChunkedUpload.load(upload_id, user_id)
+        metadata = upload.finalize(data.get("sha256"))
+        return register_uploaded_file(user_id, metadata)
+
+    except UploadError as e:
+        return error_response(message=str(e), status_code=e.status_code, error_code=e.error_code)
+    except Exception as e:
+        logging.error(f"Error completing chunked upload: {str(e)}")
+        return error_response(
+            message="An error occurred while completing the upload",
+            status_code=500,
+            exc=e
+        )
+
+@files_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+@auth_required
+@csrf_protect
+def abort_chunked_upload(user_id, upload_id):
+    """
+    Cancel a chunked upload and delete what was received.
+    """
+    try:
+        ChunkedUpload.load(upload_id, user_id).abort()
+        return success_response(message="Upload cancelled")
+
+    except UploadError as e:
+        return error_response(message=str(e), status_code=e.status_code, error_code=e.error_code)
+    except Exception as e:
+        logging.error(f"Error cancelling chunked upload: {str(e)}")
+        return error_response(
+            message="An error occurred while cancelling the upload",
             status_code=500,
             exc=e
         )
@@ -402,7 +588,7 @@ def process_file_manually(user_id, file_id):
         
         # Trigger asynchronous processing
         from utils.tasks import process_file
-        task = process_file.delay(file_id, file_path, mime_type, user_id)
+        task = process_file.delay(file_id, file_path, mime_type, user_id, file_data.get("upload_date"))
         
         return success_response(
             data={"task_id": task.id},
@@ -424,6 +610,13 @@ def process_file_manually(user_id, file_id):
 def search_files(user_id):
     """
     Search files using vector similarity.
+
+    Query Parameters:
+        query (str): Search query
+        file_id (str): Restrict to these files (may be repeated)
+        mime_type (str): Restrict to these MIME types (may be repeated)
+        uploaded_after (str): ISO date lower bound on the upload date
+        uploaded_before (str): ISO date upper bound on the upload date
     """
     try:
         # Get query parameter
@@ -434,12 +627,34 @@ def search_files(user_id):
                 status_code=400
             )
             
-        # Search vectors
-        from utils.vector_db import search_vectors
-        results = search_vectors(query, top_k=5)
+        # Metadata filters are applied inside the index, before ranking
+        filters = {
+            "file_id": request.args.getlist('file_id') or None,
+            "mime_type": request.args.getlist('mime_type') or None,
+            "uploaded_after": request.args.get('uploaded_after'),
+            "uploaded_before": request.args.get('uploaded_before')
+        }
+        filters = {key: value for key, value in filters.items() if value}
+        
+        # Reject unreadable date bounds instead of silently matching nothing
+        from utils.vector_db import search_vectors, to_timestamp
+        for bound in ("uploaded_after", "uploaded_before"):
+            if bound in filters:
+                try:
+                    to_timestamp(filters[bound])
+                except ValueError:
+                    return error_response(
+                        message=f"{bound} must be an ISO 8601 date",
+                        status_code=400
+                    )
+            
+        # Search vectors in the caller's shard only
+        results = search_vectors(query, top_k=5, user_id=user_id, filters=filters)
         
-        # Extract file IDs from results
-        file_ids = [result.get("metadata", {}).get("file_id") for result in results if result.get("metadata", {}).get("file_id")]
+        # Extract unique file IDs from results, best match first
+        file_ids = list(dict.fromkeys(
+            result.get("metadata", {}).get("file_id") for result in results if result.get("metadata", {}).get("file_id")
+        ))
         
         # Get file details for the results
         file_details = []
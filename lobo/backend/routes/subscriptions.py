@@ -16,6 +16,9 @@ SUBSCRIPTION_TIERS = {
         "features": ["Basic chatbot access", "10 messages per session", "No saving chats"],
         "message_limit": 10,
         "save_limit": 0,
+        "max_output_tokens": 512,  # per reply
+        "max_generation_seconds": 30,
+        "max_upload_bytes": 10 * 1024 * 1024,  # chunked uploads
         "monthly_price": 0
     },
     "standard": {
@@ -23,6 +26,9 @@ SUBSCRIPTION_TIERS = {
         "features": ["Unlimited messages", "50 saved chats", "Chat organization", "Export/Import"],
         "message_limit": -1,  # unlimited
         "save_limit": 50,
+        "max_output_tokens": 1024,
+        "max_generation_seconds": 60,
+        "max_upload_bytes": 50 * 1024 * 1024,
         "monthly_price": 4.99
     },
     "premium": {
@@ -30,6 +36,9 @@ SUBSCRIPTION_TIERS = {
         "features": ["Unlimited messages", "Unlimited saved chats", "Advanced organization", "Priority support", "All themes"],
         "message_limit": -1,  # unlimited
         "save_limit": -1,  # unlimited
+        "max_output_tokens": 2048,
+        "max_generation_seconds": 120,
+        "max_upload_bytes": 200 * 1024 * 1024,
         "monthly_price": 9.99
     },
     "enterprise": {
@@ -37,10 +46,20 @@ SUBSCRIPTION_TIERS = {
         "features": ["Everything in Premium", "Custom AI training", "API access", "Team management"],
         "message_limit": -1,
         "save_limit": -1,
+        "max_output_tokens": 4096,
+        "max_generation_seconds": 300,
+        "max_upload_bytes": 2048 * 1024 * 1024,
         "monthly_price": 49.99
     }
 }
 
+# Scheduler budgets that tune the model server, not part of the published plans
+INTERNAL_TIER_FIELDS = ("max_output_tokens", "max_generation_seconds")
+
+def public_tier_info(tier_info):
+    """Get a tier's details without the internal scheduling limits."""
+    return {key: value for key, value in tier_info.items() if key not in INTERNAL_TIER_FIELDS}
+
 @subscriptions_bp.route("/tiers", methods=["GET"])
 def get_subscription_tiers():
     """
@@ -48,7 +67,7 @@ def get_subscription_tiers():
     """
     try:
         return success_response(
-            data={"tiers": SUBSCRIPTION_TIERS},
+            data={"tiers": {name: public_tier_info(info) for name, info in SUBSCRIPTION_TIERS.items()}},
             message="Subscription tiers retrieved successfully"
         )
     except Exception as e:
@@ -85,7 +104,7 @@ def get_user_subscription(user_id):
             return success_response(
                 data={
                     "tier": "free", 
-                    "tier_info": SUBSCRIPTION_TIERS["free"], 
+                    "tier_info": public_tier_info(SUBSCRIPTION_TIERS["free"]), 
                     "status": "active",
                     "expiry_date": None
                 },
@@ -96,7 +115,7 @@ def get_user_subscription(user_id):
         tier = subscription.get("tier", "free")
         
         # Add tier details to response
-        subscription["tier_info"] = SUBSCRIPTION_TIERS.get(tier, SUBSCRIPTION_TIERS["free"])
+        subscription["tier_info"] = public_tier_info(SUBSCRIPTION_TIERS.get(tier, SUBSCRIPTION_TIERS["free"]))
         
         return success_response(
             data=subscription,
@@ -179,7 +198,7 @@ def create_subscription(user_id):
             )
             
         # Add tier details to response
-        subscription_data["tier_info"] = SUBSCRIPTION_TIERS.get(tier)
+        subscription_data["tier_info"] = public_tier_info(SUBSCRIPTION_TIERS[tier])
             
         return success_response(
             data=subscription_data,
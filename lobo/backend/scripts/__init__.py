@@ -1,5 +1,6 @@
 # scripts/__init__.py
 from .seed_db import seed_users
 from .backup_db import backup_database
+from .shard_vectors import shard_vectors
 
-__all__ = ["seed_users", "backup_database"]
\ No newline at end of file
+__all__ = ["seed_users", "backup_database", "shard_vectors"]
\ No newline at end of file
@@ -0,0 +1,41 @@
+# scripts/shard_vectors.py
+import logging
+from collections import defaultdict
+from utils.vector_db import get_vector_store
+
+def shard_vectors():
+    """
+    Move chunks from the legacy global FAISS index into per-user shards.
+
+    Vectors are copied as-is, so no embedding calls are made. Chunks without
+    a user_id stay in the legacy index.
+    """
+    store = get_vector_store()
+    legacy = store.get_shard(None)
+
+    text_embeddings, metadatas = legacy.export()
+    if not text_embeddings:
+        print("ℹ️ No legacy index found, nothing to migrate.")
+        return
+
+    by_user = defaultdict(lambda: ([], []))
+    unowned = ([], [])
+    for text_embedding, metadata in zip(text_embeddings, metadatas):
+        user_id = metadata.get("user_id")
+        target = by_user[user_id] if user_id else unowned
+        target[0].append(text_embedding)
+        target[1].append(metadata)
+
+    for user_id, (user_embeddings, user_metadatas) in by_user.items():
+        store.get_shard(user_id).add_embeddings(user_embeddings, user_metadatas)
+        logging.info(f"Moved {len(user_embeddings)} chunks to shard {user_id}")
+
+    # Keep only the chunks that have no owner in the legacy index
+    legacy.reset(*unowned)
+
+    written = store.flush_all()
+    moved = len(text_embeddings) - len(unowned[0])
+    print(f"✅ Migrated {moved} chunks into {len(by_user)} shards ({written} snapshots written)")
+
+if __name__ == "__main__":
+    shard_vectors()
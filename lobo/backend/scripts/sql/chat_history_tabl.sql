@@ -6,9 +6,15 @@ CREATE TABLE IF NOT EXISTS chat_history (
   messages JSONB NOT NULL DEFAULT '[]',
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-  category TEXT DEFAULT 'General'
+  category TEXT DEFAULT 'General',
+  summary TEXT,
+  summary_message_count INTEGER NOT NULL DEFAULT 0
 );
 
+-- Rolling summary columns for tables created before they existed
+ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE chat_history ADD COLUMN IF NOT EXISTS summary_message_count INTEGER NOT NULL DEFAULT 0;
+
 -- Set up Row Level Security
 ALTER TABLE chat_history ENABLE ROW LEVEL SECURITY;
 
@@ -0,0 +1,49 @@
+# tests/test_blob_store.py
+import os
+import hashlib
+import pytest
+from utils.blob_store import BlobStore
+
+def make_file(folder, content):
+    path = os.path.join(folder, f"upload-{len(os.listdir(folder))}.part")
+    with open(path, "wb") as f:
+        f.write(content)
+    return path, hashlib.sha256(content).hexdigest()
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(root=str(tmp_path / "blobs"), depth=2)
+
+def test_blobs_are_sharded_by_hash(store):
+    """Test that a blob's path fans out over the leading hex digits of its hash."""
+    file_hash = "ab" + "cd" + "0" * 60
+    assert store.path(file_hash) == os.path.join(store.root, "ab", "cd", file_hash)
+    with pytest.raises(ValueError):
+        store.path("../../etc/passwd")
+
+def test_duplicate_content_is_stored_once(store, tmp_path):
+    """Test that identical uploads share one blob and only add a reference."""
+    first, file_hash = make_file(str(tmp_path), b"same pdf bytes")
+    second, _ = make_file(str(tmp_path), b"same pdf bytes")
+
+    path, created = store.put(first, file_hash)
+    assert created
+    assert store.put(second, file_hash) == (path, False)
+
+    assert not os.path.exists(first) and not os.path.exists(second)
+    with open(path, "rb") as f:
+        assert f.read() == b"same pdf bytes"
+    assert store.refcount(file_hash) == 2
+    assert store.get_stats()["bytes_saved"] == len(b"same pdf bytes")
+
+def test_blob_is_deleted_with_its_last_reference(store, tmp_path):
+    """Test that releasing references keeps shared content until nobody uses it."""
+    for _ in range(2):
+        source, file_hash = make_file(str(tmp_path), b"shared")
+        path, _ = store.put(source, file_hash)
+
+    assert store.release(file_hash) == 1
+    assert os.path.exists(path)
+    assert store.release(file_hash) == 0
+    assert not os.path.exists(path)
+    assert store.refcount(file_hash) == 0
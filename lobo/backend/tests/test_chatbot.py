@@ -25,4 +25,72 @@ def test_chatbot_long_message(client):
         "message": long_message
     })
     assert response.status_code == 400
-    assert json.loads(response.data) == {"error": "Message exceeds 1000 characters"}
\ No newline at end of file
+    assert json.loads(response.data) == {"error": "Message exceeds 1000 characters"}
+
+def test_chatbot_streaming_response(client, monkeypatch):
+    """Test that a streamed response is sent as Server-Sent Events."""
+    from routes import chatbot as chatbot_routes
+    monkeypatch.setattr(
+        chatbot_routes.chatbot_instance, "stream_response",
+        lambda prompt, **kwargs: iter(["Hel", "lo"])
+    )
+    response = client.post("/api/chatbot", json={
+        "message": "Hello, chatbot!",
+        "stream": True
+    })
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    assert body.count("event: token") == 2
+    assert 'event: done\ndata: {"response": "Hello", "chat_id": ' in body
+
+def test_chatbot_context_is_scoped_to_the_caller(client, monkeypatch):
+    """Test that a user sending another user's chat_id does not get their turns."""
+    from routes import chatbot as chatbot_routes
+    from utils.conversation_store import ConversationStore
+    from tests.test_conversation_store import FakeRedis
+
+    store = ConversationStore(FakeRedis())
+    monkeypatch.setattr(chatbot_routes, "get_conversation_store", lambda: store)
+    histories = []
+    def generate_response(prompt, history=None, **kwargs):
+        histories.append([m["content"] for m in history or []])
+        return f"answer to {prompt}"
+    monkeypatch.setattr(chatbot_routes.chatbot_instance, "generate_response", generate_response)
+
+    monkeypatch.setattr(chatbot_routes, "get_authenticated_user_id", lambda: "user-a")
+    client.post("/api/chatbot", json={"message": "my secret", "chat_id": "chat-a"})
+    client.post("/api/chatbot", json={"message": "still there", "chat_id": "chat-a"})
+    assert histories[1] == ["my secret", "answer to my secret"]
+
+    monkeypatch.setattr(chatbot_routes, "get_authenticated_user_id", lambda: "user-b")
+    client.post("/api/chatbot", json={"message": "what was said", "chat_id": "chat-a"})
+    assert histories[2] == []
+
+    monkeypatch.setattr(chatbot_routes, "get_authenticated_user_id", lambda: None)
+    client.post("/api/chatbot", json={"message": "what was said", "chat_id": "chat-a"})
+    assert histories[3] == []
+
+def test_background_and_user_generations_are_not_coalesced():
+    """Test that a user request never joins a background prefetch of the same prompt."""
+    from models.chatbot import Chatbot
+    from utils.inference_scheduler import InferenceScheduler
+
+    chatbot = Chatbot(cache=object(), single_flight=object(), client=object(),
+                      scheduler=InferenceScheduler(priorities={"premium": 0, "free": 1}))
+    params = chatbot._cache_params(0.7, 512)
+    assert chatbot._flight_key("Hi", params, "background") != chatbot._flight_key("Hi", params, "free")
+    assert chatbot._flight_key("Hi", params, "guest") == chatbot._flight_key("Hi", params, None)
+
+def test_tiers_with_different_budgets_are_not_coalesced(monkeypatch):
+    """Test that a paid request never shares a generation limited by a free tier's budget."""
+    from models import chatbot as chatbot_module
+    from models.chatbot import Chatbot
+    from utils.inference_scheduler import GenerationBudget, InferenceScheduler
+
+    budgets = {"premium": GenerationBudget(2048, 120), "free": GenerationBudget(512, 30)}
+    monkeypatch.setattr(chatbot_module, "tier_budget", lambda tier: budgets.get(tier, budgets["free"]))
+    chatbot = Chatbot(cache=object(), single_flight=object(), client=object(),
+                      scheduler=InferenceScheduler(priorities={"premium": 0, "free": 0}))
+    params = chatbot._cache_params(0.7, 512)
+    assert chatbot._flight_key("Hi", params, "premium") != chatbot._flight_key("Hi", params, "free")
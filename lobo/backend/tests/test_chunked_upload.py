@@ -0,0 +1,74 @@
+# tests/test_chunked_upload.py
+import io
+import os
+import time
+import hashlib
+import pytest
+import utils.blob_store as blob_store
+import utils.file_handler as file_handler
+import utils.chunked_upload as chunked_upload
+from utils.chunked_upload import ChunkedUpload, UploadError, cleanup_expired_uploads
+
+CHUNK = 256 * 1024
+PDF = b"%PDF-1.4\n" + os.urandom(CHUNK * 2 + 1000) + b"\n%%EOF\n"
+
+@pytest.fixture(autouse=True)
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handler, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(chunked_upload, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(chunked_upload, "CHUNKED_UPLOAD_FOLDER", str(tmp_path / "sessions"))
+    monkeypatch.setattr(blob_store, "_blob_store", blob_store.BlobStore(root=str(tmp_path / "blobs")))
+    return tmp_path
+
+def send(upload, data, offset, sha256=None):
+    chunk = data[offset:offset + CHUNK]
+    return upload.write_chunk(offset, io.BytesIO(chunk), len(chunk), sha256 or hashlib.sha256(chunk).hexdigest())
+
+def test_chunks_in_any_order_finalize_into_the_blob_store():
+    """Test that out-of-order chunks fill the preallocated file and finalize into a stored file."""
+    upload = ChunkedUpload.create("u1", "big.pdf", len(PDF), chunk_size=CHUNK, max_size=10 * CHUNK)
+    assert os.path.getsize(upload.data_path) == len(PDF)
+    assert upload.status()["missing_offsets"] == [0, CHUNK, 2 * CHUNK]
+
+    for offset in (2 * CHUNK, 0, CHUNK):
+        status = send(upload, PDF, offset)
+    assert status["complete"] and status["received_bytes"] == len(PDF)
+
+    metadata = upload.finalize(hashlib.sha256(PDF).hexdigest())
+    assert metadata["file_hash"] == hashlib.sha256(PDF).hexdigest()
+    assert metadata["mime_type"] == "application/pdf"
+    with open(metadata["file_path"], "rb") as f:
+        assert f.read() == PDF
+    assert os.listdir(upload.folder) == []
+
+def test_bad_chunks_are_rejected_and_can_be_resent():
+    """Test that a chunk failing its hash is not counted and a retry succeeds."""
+    upload = ChunkedUpload.create("u1", "big.pdf", len(PDF), chunk_size=CHUNK, max_size=10 * CHUNK)
+
+    with pytest.raises(UploadError) as error:
+        send(upload, PDF, 0, sha256="0" * 64)
+    assert error.value.error_code == "chunk_hash_mismatch"
+    with pytest.raises(UploadError) as error:
+        send(upload, PDF, 100)
+    assert error.value.status_code == 416
+
+    assert send(upload, PDF, 0)["missing_offsets"] == [CHUNK, 2 * CHUNK]
+    with pytest.raises(UploadError) as error:
+        upload.finalize()
+    assert error.value.error_code == "upload_incomplete"
+
+def test_sessions_are_private_limited_and_expire():
+    """Test ownership checks, the size limit and cleanup of idle sessions."""
+    with pytest.raises(UploadError) as error:
+        ChunkedUpload.create("u1", "big.pdf", 11 * CHUNK, max_size=10 * CHUNK)
+    assert error.value.status_code == 413
+
+    upload = ChunkedUpload.create("u1", "big.pdf", len(PDF), chunk_size=CHUNK, max_size=10 * CHUNK)
+    with pytest.raises(UploadError):
+        ChunkedUpload.load(upload.upload_id, "u2")
+    assert ChunkedUpload.load(upload.upload_id, "u1").status()["size"] == len(PDF)
+
+    assert cleanup_expired_uploads(ttl=3600) == 0
+    time.sleep(0.01)
+    assert cleanup_expired_uploads(ttl=0) == 1
+    assert os.listdir(upload.folder) == []
@@ -0,0 +1,102 @@
+# tests/test_context_builder.py
+import pytest
+from utils.context_builder import TokenCounter, build_context, summary_backlog, summary_prompt
+
+class WordCounter(TokenCounter):
+    """Token counter that treats each word as one token."""
+
+    def _tokenize(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens, keep_start=False):
+        if max_tokens <= 0:
+            return ""
+        words = text.split()
+        return " ".join(words[:max_tokens] if keep_start else words[-max_tokens:])
+
+def turns(count, words=10):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join([f"w{i}"] * words)}
+        for i in range(count)
+    ]
+
+def test_keeps_system_prompt_and_most_recent_turns():
+    """Test that the newest turns that fit the budget are kept, in order."""
+    messages, omitted = build_context(
+        turns(20), max_tokens=10, system_prompt="Be brief.",
+        context_window=60, counter=WordCounter()
+    )
+    # 60 - 10 reserved - 6 system = 44 tokens: three 14-token turns fit
+    assert messages[0] == {"role": "system", "content": "Be brief."}
+    assert [m["content"].split()[0] for m in messages[1:]] == ["w17", "w18", "w19"]
+    assert omitted == 17
+
+def test_oversized_latest_message_is_truncated():
+    """Test that the latest message is always sent, trimmed to the budget."""
+    messages, omitted = build_context(
+        turns(1, words=100), max_tokens=10, system_prompt="",
+        context_window=30, counter=WordCounter()
+    )
+    assert len(messages) == 1
+    assert len(messages[0]["content"].split()) == 16
+
+def test_token_counts_are_cached():
+    """Test that repeated history is tokenized only once."""
+    calls = []
+
+    class CountingCounter(WordCounter):
+        def _tokenize(self, text):
+            calls.append(text)
+            return super()._tokenize(text)
+
+    counter = CountingCounter()
+    history = turns(5)
+    build_context(history, counter=counter)
+    build_context(history, counter=counter)
+    assert len(calls) == 5
+
+def test_summary_backlog_excludes_recent_and_summarized_turns():
+    """Test that only turns between the summary and the recent window are summarized."""
+    history = turns(10)
+    end, tokens = summary_backlog(history, summarized_count=2, keep_recent=4, counter=WordCounter())
+    assert end == 6
+    assert tokens == 4 * 14
+
+    assert summary_backlog(history, summarized_count=8, keep_recent=4, counter=WordCounter()) == (8, 0)
+
+def test_summary_backlog_is_folded_in_slices_that_fit():
+    """Test that a long unsummarized backlog is split into runs within a token budget."""
+    history = turns(10)
+    counter = WordCounter()
+    assert summary_backlog(history, keep_recent=4, counter=counter, max_tokens=30) == (2, 28)
+    assert summary_backlog(history, summarized_count=2, keep_recent=4, counter=counter, max_tokens=30) == (4, 28)
+    # A single message larger than the budget still makes progress, cut to fit in the prompt
+    assert summary_backlog(history, keep_recent=4, counter=counter, max_tokens=5) == (1, 14)
+    prompt = summary_prompt(None, history[:1], max_tokens=5, counter=counter)
+    assert prompt[-1]["content"].endswith("New messages:\nuser: w0 w0 w0 w0")
+
+def test_summary_is_sent_before_recent_turns():
+    """Test that the rolling summary is placed after the system prompt."""
+    messages, _ = build_context(turns(2), system_prompt="Be brief.", summary="User likes tea.",
+                                counter=WordCounter())
+    assert [m["role"] for m in messages] == ["system", "system", "user", "assistant"]
+    assert "User likes tea." in messages[1]["content"]
+
+def test_oversized_prefix_leaves_room_for_the_latest_message(monkeypatch):
+    """Test that a prefix larger than the budget is shortened instead of the question."""
+    import utils.context_builder as context_builder
+    monkeypatch.setattr(context_builder, "CONTEXT_MIN_PROMPT_TOKENS", 20)
+    knowledge = " ".join(f"k{i}" for i in range(500))
+    question = [{"role": "user", "content": "what does the contract say about renewal"}]
+
+    messages, _ = build_context(question, max_tokens=10, system_prompt=knowledge,
+                                summary="User likes tea. " * 50, context_window=100, counter=WordCounter())
+    assert messages[-1] == question[0]
+    assert messages[0]["content"].startswith("k0 k1")
+    assert sum(WordCounter().count_message(m) for m in messages) <= 90
+
+    # With a long question only the reserved minimum is guaranteed
+    long_question = [{"role": "user", "content": " ".join(["why"] * 200)}]
+    messages, _ = build_context(long_question, max_tokens=10, system_prompt=knowledge,
+                                context_window=100, counter=WordCounter())
+    assert len(messages[-1]["content"].split()) >= 20 - 4
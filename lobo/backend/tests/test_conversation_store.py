@@ -0,0 +1,58 @@
+# tests/test_conversation_store.py
+import pytest
+from utils.conversation_store import ConversationStore, decode_message, encode_message
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the Redis list commands the store uses."""
+
+    def __init__(self):
+        self.lists = {}
+        self.expiry = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists[key][start:] if end == -1 else self.lists[key][start:end + 1]
+
+    def expire(self, key, ttl):
+        self.expiry[key] = ttl
+
+    def execute(self):
+        return []
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def delete(self, key):
+        self.lists.pop(key, None)
+
+def test_messages_round_trip_compactly():
+    """Test that stored messages use short role codes and decode unchanged."""
+    encoded = encode_message("assistant", "Hi there")
+    assert encoded == b'["a","Hi there"]'
+    assert decode_message(encoded) == {"role": "assistant", "content": "Hi there"}
+
+def test_history_is_capped_and_expires():
+    """Test that only the newest messages are kept and the TTL is refreshed."""
+    client = FakeRedis()
+    store = ConversationStore(client, max_messages=4, ttl=60)
+    for turn in range(3):
+        store.append("chat-1", {"role": "user", "content": f"q{turn}"}, {"role": "assistant", "content": f"a{turn}"})
+
+    history = store.get_history("chat-1")
+    assert [m["content"] for m in history] == ["q1", "a1", "q2", "a2"]
+    assert client.expiry["conv:chat-1"] == 60
+    assert store.get_history("other") == []
+
+def test_conversations_are_scoped_by_owner():
+    """Test that a chat ID only finds the turns stored under the same owner."""
+    store = ConversationStore(FakeRedis())
+    store.append("chat-1", {"role": "user", "content": "secret"}, owner="user-a")
+
+    assert [m["content"] for m in store.get_history("chat-1", owner="user-a")] == ["secret"]
+    assert store.get_history("chat-1", owner="user-b") == []
+    assert store.get_history("chat-1") == []
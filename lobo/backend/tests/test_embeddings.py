@@ -0,0 +1,86 @@
+# tests/test_embeddings.py
+import os
+import time
+import pytest
+from utils.embeddings import CachedEmbeddings, FilesystemEmbeddingCache, MemoryEmbeddingCache, chunk_hash
+
+class CountingEmbeddings:
+    """Fake embedding model that records how many chunks it was asked to embed."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.batches.append([text])
+        return [0.0, 1.0]
+
+@pytest.fixture
+def embeddings(tmp_path):
+    """Fixture to provide cached embeddings backed by a temporary directory."""
+    base = CountingEmbeddings()
+    cached = CachedEmbeddings(
+        base,
+        cache=FilesystemEmbeddingCache(str(tmp_path), "test/doc"),
+        query_cache=MemoryEmbeddingCache(max_entries=2),
+        batch_size=2
+    )
+    return base, cached
+
+def test_chunk_hash_ignores_whitespace():
+    """Test that chunks differing only in whitespace share a hash."""
+    assert chunk_hash("hello   world\n") == chunk_hash("hello world")
+    assert chunk_hash("hello world") != chunk_hash("Hello world")
+
+def test_embed_documents_batches_misses(embeddings):
+    """Test that uncached chunks are embedded in batches of the configured size."""
+    base, cached = embeddings
+    vectors = cached.embed_documents(["a", "bb", "ccc"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert base.batches == [["a", "bb"], ["ccc"]]
+
+def test_reupload_costs_zero_embedding_calls(embeddings):
+    """Test that previously embedded chunks are served from the cache."""
+    base, cached = embeddings
+    cached.embed_documents(["page one", "boilerplate"])
+    base.batches.clear()
+
+    vectors = cached.embed_documents(["boilerplate", "page  one", "boilerplate"])
+    assert base.batches == []
+    assert vectors == [[11.0, 1.0], [8.0, 1.0], [11.0, 1.0]]
+
+    stats = cached.get_stats()
+    assert stats["cache_hits"] == 3
+    assert stats["embedded"] == 2
+
+def test_embed_query_is_cached(embeddings):
+    """Test that repeated queries reuse the cached query embedding."""
+    base, cached = embeddings
+    assert cached.embed_query("search") == cached.embed_query("search")
+    assert base.batches == [["search"]]
+
+def test_query_cache_is_bounded(embeddings):
+    """Test that only the most recently used queries stay cached."""
+    base, cached = embeddings
+    for query in ("a", "b", "a", "c", "a", "b"):
+        cached.embed_query(query)
+    assert base.batches == [["a"], ["b"], ["c"], ["b"]]
+
+def test_sweep_drops_unused_and_excess_entries(tmp_path):
+    """Test that the filesystem cache is bounded by age, then by size, least recently used first."""
+    cache = FilesystemEmbeddingCache(str(tmp_path), "test/doc")
+    cache.set_many({"aa": [1.0], "bb": [2.0], "cc": [3.0]})
+    now = time.time()
+    os.utime(cache._path("aa"), (now - 1000, now - 1000))
+    os.utime(cache._path("bb"), (now - 100, now - 100))
+    os.utime(cache._path("cc"), (now - 10, now - 10))
+
+    assert cache.sweep(max_age=500, max_bytes=0) == 1
+    cache.get_many(["bb"])  # A hit makes bb the most recently used
+    size = os.path.getsize(cache._path("bb"))
+    assert cache.sweep(max_age=0, max_bytes=size) == 1
+    assert cache.get_many(["aa", "bb", "cc"]) == {"bb": [2.0]}
+
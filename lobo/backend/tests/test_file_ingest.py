@@ -0,0 +1,69 @@
+# tests/test_file_ingest.py
+import io
+import os
+import hashlib
+import pytest
+from werkzeug.datastructures import FileStorage
+import utils.blob_store as blob_store
+import utils.file_handler as file_handler
+from utils.file_handler import IngestFile, save_uploaded_file, sniff_mimetype
+
+PDF = b"%PDF-1.4\n" + b"0" * 10000 + b"\n%%EOF\n"
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handler, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(blob_store, "_blob_store", blob_store.BlobStore(root=str(tmp_path / "blobs")))
+    return tmp_path
+
+def upload(data, name):
+    return FileStorage(stream=io.BytesIO(data), filename=name)
+
+def test_sniff_mimetype_checks_content_against_extension():
+    """Test that magic bytes confirm the extension or name the real type."""
+    assert sniff_mimetype(b"%PDF-1.7", "pdf") == "application/pdf"
+    assert sniff_mimetype(b"PK\x03\x04", "xlsx") == file_handler.ALLOWED_EXTENSIONS["xlsx"]
+    assert sniff_mimetype(b"a,b\n1,2\n", "csv") == "text/csv"
+    assert sniff_mimetype(b"\x89PNG\r\n\x1a\n", "pdf") == "image/png"
+    assert sniff_mimetype(b"MZ\x90\x00", "txt") == "application/octet-stream"
+
+def test_upload_is_hashed_and_committed_in_one_pass(upload_folder):
+    """Test that a valid upload is renamed into the blob store with its hash, size and type."""
+    success, path, metadata = save_uploaded_file(upload(PDF, "report.pdf"))
+
+    assert success
+    with open(path, "rb") as f:
+        assert f.read() == PDF
+    assert metadata["file_hash"] == hashlib.sha256(PDF).hexdigest()
+    assert os.path.basename(path) == metadata["file_hash"]
+    assert metadata["file_size"] == len(PDF)
+    assert metadata["mime_type"] == "application/pdf"
+    assert os.listdir(upload_folder) == ["blobs"]  # No temporary left behind
+
+def test_duplicate_upload_shares_the_stored_file(upload_folder):
+    """Test that uploading the same content twice stores it once until both are released."""
+    _, first_path, first = save_uploaded_file(upload(PDF, "report.pdf"))
+    _, second_path, second = save_uploaded_file(upload(PDF, "copy.pdf"))
+
+    assert second_path == first_path
+    assert not first["deduplicated"] and second["deduplicated"]
+
+    file_handler.release_stored_file(first)
+    assert os.path.exists(first_path)
+    file_handler.release_stored_file(second)
+    assert not os.path.exists(first_path)
+
+def test_mismatched_or_oversized_uploads_are_rejected(upload_folder, monkeypatch):
+    """Test that bad content and oversized files are refused without keeping anything on disk."""
+    success, message, _ = save_uploaded_file(upload(b"\x89PNG\r\n\x1a\n" + b"0" * 100, "report.pdf"))
+    assert not success and "doesn't match extension" in message
+
+    sink = IngestFile("big.txt", max_size=1024)
+    for _ in range(4):
+        sink.write(b"x" * 512)
+    valid, message = sink.finish()
+    assert not valid and "size exceeds" in message
+    assert sink.size == 2048 and os.path.getsize(sink.path) == 0
+    sink.close()
+
+    assert os.listdir(upload_folder) == ["blobs"]
@@ -24,4 +24,17 @@ def test_file_upload_no_file(client):
     """Test file upload with no file provided."""
     response = client.post("/api/files/upload")
     assert response.status_code == 400
-    assert json.loads(response.data) == {"error": "No file provided"}
\ No newline at end of file
+    assert json.loads(response.data) == {"error": "No file provided"}
+
+def test_search_rejects_invalid_date_bounds(app, monkeypatch):
+    """Test that an unreadable date filter is a client error, not an empty result."""
+    import routes.files as files_routes
+    import utils.vector_db as vector_db
+    monkeypatch.setattr(vector_db, "search_vectors", lambda *args, **kwargs: pytest.fail("searched"))
+
+    # Call the view under its auth and CSRF decorators
+    view = files_routes.search_files.__wrapped__.__wrapped__
+    with app.test_request_context("/api/files/search?query=report&uploaded_after=yesterday"):
+        response, status_code = view("user-1")
+    assert status_code == 400
+    assert "uploaded_after" in json.loads(response.data)["message"]
@@ -0,0 +1,59 @@
+# tests/test_inference_scheduler.py
+import threading
+import time
+import pytest
+from utils.inference_scheduler import InferenceScheduler, SchedulerOverloaded, DeadlineExceeded, GenerationBudget
+
+PRIORITIES = {"enterprise": 0, "premium": 1, "standard": 2, "free": 3}
+
+def test_higher_tier_is_admitted_first():
+    """Test that queued requests are admitted by tier, not arrival order."""
+    scheduler = InferenceScheduler(max_concurrency=1, priorities=PRIORITIES)
+    scheduler.acquire("model", "free")
+    order = []
+
+    def request(tier):
+        with scheduler.slot("model", tier, timeout=5):
+            order.append(tier)
+
+    threads = []
+    for tier in ("free", "standard", "enterprise"):
+        thread = threading.Thread(target=request, args=(tier,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)  # Make arrival order deterministic
+
+    assert scheduler.get_stats()["model"]["queue_depth"] == 3
+    scheduler.release("model")
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["enterprise", "standard", "free"]
+
+def test_background_work_runs_after_guests():
+    """Test that background generations are ranked below guests and unknown tiers."""
+    scheduler = InferenceScheduler(priorities=PRIORITIES)
+    assert scheduler.priority("free") < scheduler.priority("guest") < scheduler.priority("background")
+
+def test_full_queue_is_rejected_and_deadline_sheds():
+    """Test backpressure on a full queue and shedding of requests that wait too long."""
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue_depth=0, priorities=PRIORITIES)
+    scheduler.acquire("model", "free")
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.acquire("model", "premium")
+
+    scheduler.max_queue_depth = 1
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("model", "premium", timeout=0.05)
+
+    stats = scheduler.get_stats()["model"]
+    assert stats["rejected_overload"] == 1
+    assert stats["shed_deadline"] == 1
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 1
+
+def test_generation_budget_caps_reply_length():
+    """Test that requested reply lengths are capped by the tier's token budget."""
+    budget = GenerationBudget(max_tokens=512, max_seconds=30)
+    assert budget.clamp(2048) == 512
+    assert budget.clamp(100) == 100
+    assert budget.clamp(0) == 1
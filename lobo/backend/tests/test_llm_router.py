@@ -0,0 +1,98 @@
+# tests/test_llm_router.py
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils.llm_router import LLMRouter
+from utils.ollama_client import OllamaError
+
+class StubBackend(BaseHTTPRequestHandler):
+    """Ollama /api/chat stub answering with its own name after `server.latency` seconds, or `server.status`."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        if self.server.status != 200:
+            body = b'{"error": "backend down"}'
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        time.sleep(self.server.latency)
+        body = b"".join(
+            json.dumps(chunk).encode("utf-8") + b"\n"
+            for chunk in ({"message": {"role": "assistant", "content": self.server.name}, "done": False},
+                          {"message": {"role": "assistant", "content": ""}, "done": True})
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def backends():
+    servers = []
+    for name in ("a", "b"):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubBackend)
+        server.name, server.latency, server.status, server.requests = name, 0.0, 200, 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+
+def make_router(servers, **kwargs):
+    return LLMRouter([f"http://127.0.0.1:{s.server_port}" for s in servers], **kwargs)
+
+def answer(router):
+    return router.chat("model", [{"role": "user", "content": "hi"}])["message"]["content"]
+
+def test_requests_prefer_the_faster_backend(backends):
+    """Test that the EWMA latency steers most requests to the backend answering faster."""
+    backends[0].latency = 0.15
+    router = make_router(backends)
+
+    answers = [answer(router) for _ in range(10)]
+
+    assert answers.count("b") >= 8
+    stats = router.get_stats()
+    fast, slow = (stats[f"http://127.0.0.1:{s.server_port}"] for s in (backends[1], backends[0]))
+    assert fast["ewma_ms"] < slow["ewma_ms"]
+    assert fast["in_flight"] == slow["in_flight"] == 0
+
+def test_in_flight_requests_spread_load(backends):
+    """Test that concurrent requests are split across equally fast backends by queue depth."""
+    for server in backends:
+        server.latency = 0.2
+    router = make_router(backends)
+    answer(router), answer(router)  # Give the backends a latency sample
+    before = [server.requests for server in backends]
+
+    threads = [threading.Thread(target=answer, args=(router,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert [server.requests - count for server, count in zip(backends, before)] == [2, 2]
+
+def test_failed_backend_fails_over_and_is_ejected(backends):
+    """Test failover to a healthy backend and ejection after repeated failures."""
+    backends[0].status = 500
+    router = make_router(backends, failure_threshold=2, cooldown=60)
+
+    assert [answer(router) for _ in range(6)] == ["b"] * 6
+    assert backends[0].requests == 2  # Skipped once ejected
+    host = f"http://127.0.0.1:{backends[0].server_port}"
+    assert router.get_stats()[host]["healthy"] is False
+
+    backends[1].status = 503
+    with pytest.raises(OllamaError):
+        answer(router)
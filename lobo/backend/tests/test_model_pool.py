@@ -0,0 +1,125 @@
+# tests/test_model_pool.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils.model_pool import ModelPool
+
+class StubOllama(BaseHTTPRequestHandler):
+    """Minimal Ollama API: /api/generate changes residency, /api/ps lists loaded models."""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply({"models": [{"name": name} for name in sorted(self.server.loaded)]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.calls.append((request["model"], request["keep_alive"]))
+        if request["keep_alive"] != 0:
+            assert request["options"] == {"num_ctx": self.server.num_ctx}
+        if request["keep_alive"] == 0:
+            self.server.loaded.discard(request["model"])
+        else:
+            self.server.loaded.add(request["model"])
+        self._reply({"model": request["model"], "done": True, "load_duration": 1000000})
+
+@pytest.fixture
+def ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    server.loaded, server.calls, server.num_ctx = set(), [], 8192
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+class FakeRedis:
+    """The sorted-set commands the pool uses to share last use between processes."""
+
+    def __init__(self):
+        self.scores = {}
+
+    def zadd(self, key, mapping):
+        self.scores.setdefault(key, {}).update(mapping)
+
+    def zscore(self, key, member):
+        return self.scores.get(key, {}).get(member)
+
+def make_pool(server, max_resident=2, redis_client=None, evict_idle=0):
+    return ModelPool(host=f"http://127.0.0.1:{server.server_port}", max_resident=max_resident, keep_alive="30m",
+                     redis_client=redis_client if redis_client is not None else FakeRedis(), evict_idle=evict_idle,
+                     num_ctx=server.num_ctx)
+
+def test_preload_loads_once_and_records_timings(ollama):
+    """Test that preloaded models are loaded once and later requests are served from the pool."""
+    pool = make_pool(ollama)
+    assert pool.preload(["chat", "code"]) == {"code": True, "chat": True}
+    assert pool.ensure_loaded("chat")
+    assert ollama.calls == [("code", "30m"), ("chat", "30m")]
+
+    stats = pool.get_stats()
+    assert [entry["model"] for entry in stats["resident"]] == ["code", "chat"]
+    assert stats["models"]["chat"]["loads"] == 1
+    assert stats["models"]["chat"]["last_load_ms"] > 0
+
+def test_least_recently_used_model_is_unloaded(ollama):
+    """Test that loading past the residency limit unloads the least recently used model."""
+    pool = make_pool(ollama)
+    pool.ensure_loaded("a")
+    pool.ensure_loaded("b")
+    pool.ensure_loaded("a")  # b is now the least recently used
+    pool.ensure_loaded("c")
+
+    assert ("b", 0) in ollama.calls
+    assert ollama.loaded == {"a", "c"}
+    assert pool.get_stats()["models"]["b"]["unloads"] == 1
+
+def test_ping_refreshes_resident_models_and_forgets_dropped_ones(ollama):
+    """Test that keep-alive pings reach resident models and expired ones are reloaded on next use."""
+    pool = make_pool(ollama)
+    pool.preload(["a", "b"])
+    ollama.loaded.discard("b")  # Ollama expired it on its own
+    ollama.calls.clear()
+
+    assert pool.ping() == {"a": True}
+    assert ollama.calls == [("a", "30m")]
+
+    pool.ensure_loaded("b")
+    assert ollama.calls[-1] == ("b", "30m")
+    assert ollama.loaded == {"a", "b"}
+
+def test_model_in_use_by_another_process_is_not_unloaded(ollama):
+    """Test that eviction follows use shared through Redis, not this process's own history."""
+    shared = FakeRedis()
+    web = make_pool(ollama, redis_client=shared, evict_idle=60)
+    worker = make_pool(ollama, redis_client=shared, evict_idle=60)
+    web.ensure_loaded("a")
+    worker.ensure_loaded("b")
+    worker.ensure_loaded("c")  # a and b were both just used
+
+    assert ollama.loaded == {"a", "b", "c"}
+    assert not any(keep_alive == 0 for _, keep_alive in ollama.calls)
+
+    # Once a has been idle long enough, the web process may unload it
+    shared.zadd(web._usage_key, {"a": 0})
+    web.ensure_loaded("d")
+    assert ("a", 0) in ollama.calls
+    assert ollama.loaded == {"b", "c", "d"}
+
+
+def test_recording_use_does_not_call_ollama(ollama):
+    """Test that a generation only records its use instead of loading the model on the request path."""
+    shared = FakeRedis()
+    pool = make_pool(ollama, redis_client=shared)
+    pool.record_use("a")
+
+    assert ollama.calls == []
+    assert shared.zscore(pool._usage_key, "a") > 0
@@ -0,0 +1,113 @@
+# tests/test_ollama_client.py
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils.ollama_client import OllamaClient, OllamaError
+
+class StubChat(BaseHTTPRequestHandler):
+    """Ollama /api/chat stub that fails `server.failures` times, then streams `server.tokens`."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            body = b'{"error": "server busy"}'
+            self.send_response(503)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in self.server.tokens:
+                self._chunk({"message": {"role": "assistant", "content": token}, "done": False})
+                time.sleep(self.server.delay)
+            self._chunk({"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 3})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.disconnected.set()
+
+    def _chunk(self, payload):
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+@pytest.fixture
+def ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChat)
+    server.requests, server.failures, server.delay = 0, 0, 0.0
+    server.tokens = ["Hel", "lo", "!"]
+    server.disconnected = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+def make_client(server, **kwargs):
+    return OllamaClient(host=f"http://127.0.0.1:{server.server_port}", backoff=0.01, **kwargs)
+
+def test_stream_and_chat_share_the_pool(ollama):
+    """Test streaming chunks and assembling a full reply over pooled connections."""
+    client = make_client(ollama)
+    tokens = [chunk["message"]["content"] for chunk in client.stream_chat("model", [])]
+    assert tokens == ["Hel", "lo", "!", ""]
+
+    result = client.chat("model", [{"role": "user", "content": "hi"}])
+    assert result["message"]["content"] == "Hello!"
+    assert result["eval_count"] == 3
+    assert client.get_stats()["in_flight"] == 0
+
+def test_overloaded_server_is_retried_then_gives_up(ollama):
+    """Test that 503s are retried with backoff and surface as OllamaError once retries run out."""
+    ollama.failures = 2
+    client = make_client(ollama, max_retries=2)
+    assert client.chat("model", [])["message"]["content"] == "Hello!"
+    assert ollama.requests == 3
+    assert client.get_stats()["retries"] == 2
+
+    ollama.failures = 5
+    with pytest.raises(OllamaError) as error:
+        client.chat("model", [])
+    assert error.value.status_code == 503
+
+def test_closing_a_stream_cancels_the_request(ollama):
+    """Test that abandoning a stream aborts the HTTP request instead of reading it to the end."""
+    ollama.tokens = ["tok"] * 50
+    ollama.delay = 0.02
+    client = make_client(ollama)
+
+    stream = client.stream_chat("model", [])
+    next(stream)
+    stream.close()
+
+    assert ollama.disconnected.wait(5)
+    deadline = time.monotonic() + 2
+    while client.get_stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.get_stats()["in_flight"] == 0
+    assert client.get_stats()["cancelled"] == 1
+
+def test_stream_is_cut_off_at_the_time_budget(ollama):
+    """Test that a stream running past its timeout is cancelled after yielding what it had."""
+    ollama.tokens = ["tok"] * 50
+    ollama.delay = 0.05
+    client = make_client(ollama)
+
+    tokens = []
+    with pytest.raises(TimeoutError):
+        for chunk in client.stream_chat("model", [], options={"num_predict": 50}, timeout=0.3):
+            tokens.append(chunk["message"]["content"])
+
+    assert 0 < len(tokens) < 50
+    assert ollama.disconnected.wait(5)
@@ -0,0 +1,70 @@
+# tests/test_prefetch.py
+from utils.prefetch import mine_follow_ups, prefetch_follow_ups
+
+def chat(*prompts):
+    messages = []
+    for prompt in prompts:
+        messages.append({"role": "user", "content": prompt})
+        messages.append({"role": "assistant", "content": f"answer to {prompt}"})
+    return messages
+
+class FakeChatbot:
+    """Chatbot stand-in whose cache is keyed by prompt and earlier turns."""
+
+    def __init__(self, cached=()):
+        self.cache = {key: f"cached {key[0]}" for key in cached}
+        self.generated = []
+
+    @staticmethod
+    def _key(prompt, history):
+        return (prompt, tuple(m["content"] for m in history or []))
+
+    def is_cached(self, prompt, tier=None, history=None):
+        return self._key(prompt, history) in self.cache
+
+    def generate_response(self, prompt, tier=None, history=None):
+        key = self._key(prompt, history)
+        if key not in self.cache:
+            assert tier == "background"
+            self.generated.append(key)
+            self.cache[key] = f"generated {prompt}"
+        return self.cache[key]
+
+def test_mine_follow_ups_ranks_openers_and_filters_rare_follow_ups():
+    """Test that follow-ups are grouped by normalized opening prompt and filtered by count and share."""
+    chats = (
+        [chat("What is LOBO?", "How do I upload a file?")] * 3
+        + [chat("what is  lobo?", "Is it free?")] * 2
+        + [chat("What is LOBO?")]
+        + [chat("Hello", "Tell me a joke")] * 3
+    )
+    topics = mine_follow_ups(chats, min_count=2, min_probability=0.3)
+
+    assert [topic["prompt"] for topic in topics] == ["What is LOBO?", "Hello"]
+    assert topics[0]["count"] == 6
+    assert topics[0]["follow_ups"] == [{"prompt": "How do I upload a file?", "probability": 0.5}, {"prompt": "Is it free?", "probability": 0.333}]
+    assert topics[1]["follow_ups"] == [{"prompt": "Tell me a joke", "probability": 1.0}]
+
+def test_prefetch_answers_follow_ups_after_the_shared_first_answer():
+    """Test that follow-ups are generated with the cached opening answer as history."""
+    topics = [{"prompt": "What is LOBO?", "count": 6, "follow_ups": [{"prompt": "Is it free?", "probability": 0.5}]}]
+    chatbot = FakeChatbot(cached=[("What is LOBO?", ())])
+
+    stats = prefetch_follow_ups(topics, chatbot, idle=lambda: True)
+
+    assert chatbot.generated == [("Is it free?", ("What is LOBO?", "cached What is LOBO?"))]
+    assert stats == {"generated": 1, "cached": 1, "failed": 0, "interrupted": 0}
+
+def test_prefetch_stops_when_the_model_gets_busy():
+    """Test that speculative generation stops as soon as user traffic needs the model."""
+    topics = [
+        {"prompt": "A", "count": 5, "follow_ups": [{"prompt": "B", "probability": 0.5}]},
+        {"prompt": "C", "count": 4, "follow_ups": [{"prompt": "D", "probability": 0.5}]}
+    ]
+    chatbot = FakeChatbot()
+    answers = iter([True, True])
+
+    stats = prefetch_follow_ups(topics, chatbot, idle=lambda: next(answers, False))
+
+    assert chatbot.generated == [("A", ()), ("B", ("A", "generated A"))]
+    assert stats["interrupted"] == 1
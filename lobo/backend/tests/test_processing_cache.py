@@ -0,0 +1,55 @@
+# tests/test_processing_cache.py
+import pytest
+from utils.processing_cache import ProcessingCache, processing_cache_key
+import utils.processing_cache as processing_cache
+
+class DictRedis:
+    """Minimal stand-in for the Redis calls the cache makes."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+ENTRY = {"file_id": "f1", "user_id": "u1", "text_extracted": True, "vectors_stored": True,
+         "processing_result": {"page_count": 2}, "extracted_text": "hello"}
+
+def test_results_are_shared_by_content_hash():
+    """Test that a stored result is found for the same hash and type only."""
+    cache = ProcessingCache(client=DictRedis())
+    assert cache.get("a" * 64, "application/pdf") is None
+
+    cache.set("a" * 64, "application/pdf", ENTRY)
+    assert cache.get("a" * 64, "application/pdf") == ENTRY
+    assert cache.get("a" * 64, "text/plain") is None
+    assert cache.get("b" * 64, "application/pdf") is None
+    assert cache.get_stats()["hits"] == 1
+
+    cache.invalidate("a" * 64, "application/pdf")
+    assert cache.get("a" * 64, "application/pdf") is None
+
+def test_processor_version_change_misses(monkeypatch):
+    """Test that bumping the processor version stops reuse of older results."""
+    key = processing_cache_key("a" * 64, "application/pdf")
+    monkeypatch.setattr(processing_cache, "PROCESSOR_VERSION", "2")
+    assert processing_cache_key("a" * 64, "application/pdf") != key
+
+def test_redis_errors_are_misses():
+    """Test that an unreachable store degrades to processing the file."""
+    class DownRedis:
+        def get(self, key):
+            raise ConnectionError("down")
+
+    cache = ProcessingCache(client=DownRedis())
+    assert cache.get("a" * 64, "application/pdf") is None
+    assert cache.get_stats()["misses"] == 1
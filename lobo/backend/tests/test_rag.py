@@ -0,0 +1,43 @@
+# tests/test_rag.py
+import pytest
+from utils.rag import rerank, pack_context
+from utils.metrics import LatencyTracker
+
+class WordCounter:
+    """Token counter that treats each word as one token."""
+
+    def count(self, text):
+        return len(text.split())
+
+def test_lexical_rerank_lifts_keyword_matches_and_dedupes():
+    """Test that a chunk containing the query terms outranks a slightly closer vector match."""
+    chunks = [
+        {"text": "General notes about the office", "metadata": {}, "score": 0.50},
+        {"text": "The invoice total is due in March", "metadata": {}, "score": 0.60},
+        {"text": "General notes about the office", "metadata": {}, "score": 0.50},
+    ]
+    ranked = rerank("When is the invoice total due?", chunks, reranker_name="")
+    assert [c["text"] for c in ranked] == [
+        "The invoice total is due in March",
+        "General notes about the office"
+    ]
+
+def test_pack_context_respects_budget():
+    """Test that chunks are numbered with their source and skipped once the budget is spent."""
+    chunks = [
+        {"text": "one two three four five six", "metadata": {"file_name": "a.pdf"}},
+        {"text": " ".join(["long"] * 50), "metadata": {"file_name": "b.pdf"}},
+        {"text": "seven eight", "metadata": {"file_id": "f3"}},
+    ]
+    packed = pack_context(chunks, max_tokens=20, counter=WordCounter())
+    assert packed == "[1] (a.pdf)\none two three four five six\n\n[2] (f3)\nseven eight"
+
+def test_latency_percentiles():
+    """Test that percentiles are reported in milliseconds over the window."""
+    tracker = LatencyTracker(window=100)
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    summary = tracker.summary()
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["p99_ms"] == pytest.approx(99.01)
@@ -0,0 +1,48 @@
+# tests/test_response_cache.py
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+from utils.response_cache import (
+    MemoryResponseStore, ResponseCache, SemanticResponseIndex, normalize_prompt
+)
+
+class StaticEmbeddings(FakeEmbeddings):
+    """Embeddings that map every prompt to the same vector."""
+
+    def embed_query(self, text):
+        return [1.0] * self.size
+
+def test_exact_hit_ignores_case_and_whitespace():
+    """Test that normalized prompts share an entry but parameters do not."""
+    cache = ResponseCache(store=MemoryResponseStore())
+    cache.set("What is LOBO?", "model", {"temperature": 0.7}, "An assistant.")
+
+    assert normalize_prompt("  what   is lobo? ") == "what is lobo?"
+    assert cache.get("  what   is LOBO? ", "model", {"temperature": 0.7}) == "An assistant."
+    assert cache.get("What is LOBO?", "model", {"temperature": 0.2}) is None
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+def test_memory_store_evicts_least_recently_used():
+    """Test LRU eviction and TTL expiry of the in-memory store."""
+    store = MemoryResponseStore(max_entries=2)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.get("a")
+    store.set("c", "3")
+    assert store.get("b") is None and store.get("a") == "1"
+
+    store._entries["a"] = (1.0, "1")  # Expired long ago
+    assert store.get("a") is None
+
+def test_semantic_hit_above_threshold():
+    """Test that a near-identical prompt is served from the semantic layer."""
+    cache = ResponseCache(
+        store=MemoryResponseStore(),
+        semantic_index=SemanticResponseIndex(),
+        embeddings=StaticEmbeddings(size=8),
+        similarity=0.9
+    )
+    cache.set("How do I reset my password?", "model", None, "Use the reset link.")
+
+    assert cache.get("how can i reset my password", "model", None) == "Use the reset link."
+    assert cache.get("how can i reset my password", "other-model", None) is None
+    assert cache.get_stats()["semantic_hits"] == 1
@@ -0,0 +1,94 @@
+# tests/test_single_flight.py
+import threading
+import time
+import pytest
+from utils.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_generation():
+    """Test that concurrent callers with the same key run the producer once."""
+    group = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def producer():
+        calls.append(1)
+        release.wait(5)
+        yield "Hel"
+        yield "lo"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append("".join(group.stream("key", producer))))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["Hello"] * 5
+    assert len(calls) == 1
+    assert group.get_stats()["coalesced"] == 4
+
+def test_failure_reaches_every_waiter():
+    """Test that a failed shared generation is reported and the key is released."""
+    group = SingleFlight()
+
+    def failing():
+        raise RuntimeError("model unavailable")
+        yield
+
+    with pytest.raises(RuntimeError):
+        list(group.stream("key", failing))
+    assert group.do("key", lambda: None) is None
+    assert group.do("key", lambda: "ok") == "ok"
+
+def test_generation_is_cancelled_when_every_caller_leaves():
+    """Test that the producer is closed once the last subscriber disconnects."""
+    group = SingleFlight()
+    closed = threading.Event()
+    next_token = threading.Event()
+    produced = []
+
+    def producer():
+        try:
+            for token in ("a", "b", "c"):
+                next_token.wait(5)
+                next_token.clear()
+                produced.append(token)
+                yield token
+        finally:
+            closed.set()
+
+    stream = group.stream("key", producer)
+    next_token.set()
+    assert next(stream) == "a"
+    stream.close()
+
+    next_token.set()
+    assert closed.wait(5)
+    assert produced == ["a", "b"]
+
+    # A later caller starts a new generation instead of joining the cancelled one
+    assert "".join(group.stream("key", lambda: iter(["fresh"]))) == "fresh"
+
+def test_mirrored_tokens_are_batched():
+    """Test that a leader writes its tokens to the Redis stream in batches, not one XADD each."""
+    from utils.single_flight import _StreamMirror
+
+    class FakeRedis:
+        def __init__(self):
+            self.entries = []
+
+        def xadd(self, key, fields):
+            self.entries.append(fields["token"])
+
+    redis_client = FakeRedis()
+    mirror = _StreamMirror(redis_client, "sf:stream:key", interval=60)
+    for token in ("Hel", "lo", " world"):
+        mirror.push(token)
+    assert redis_client.entries == []
+    mirror.flush()
+    assert redis_client.entries == ["Hello world"]
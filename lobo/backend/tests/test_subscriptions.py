@@ -0,0 +1,15 @@
+# tests/test_subscriptions.py
+from flask import json
+from routes.subscriptions import SUBSCRIPTION_TIERS
+
+def test_tiers_hide_internal_limits(client):
+    """Test that the public tier list omits the scheduler's generation budgets."""
+    response = client.get("/api/subscriptions/tiers")
+    assert response.status_code == 200
+
+    tiers = json.loads(response.data)["data"]["tiers"]
+    assert set(tiers) == set(SUBSCRIPTION_TIERS)
+    for tier in tiers.values():
+        assert "max_output_tokens" not in tier
+        assert "max_generation_seconds" not in tier
+        assert "monthly_price" in tier and "max_upload_bytes" in tier
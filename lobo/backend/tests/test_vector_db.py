@@ -0,0 +1,240 @@
+# tests/test_vector_db.py
+import time
+from datetime import date
+import pytest
+import numpy as np
+import faiss
+from langchain_core.embeddings import Embeddings
+from utils.vector_db import VectorIndexManager, ShardedVectorStore
+import utils.vector_db as vector_db
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings derived from the text, no model required."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.random(8).tolist()
+
+@pytest.fixture
+def manager(tmp_path):
+    """Fixture to provide an index manager over a temporary directory."""
+    index_manager = VectorIndexManager(str(tmp_path), embeddings=FakeEmbeddings(), reload_interval=0)
+    yield index_manager
+    index_manager.close()
+
+def test_search_served_from_memory(manager):
+    """Test that added chunks are searchable before any snapshot is written."""
+    manager.add_texts(["alpha", "beta"], [{"file_id": "f1"}, {"file_id": "f2"}])
+    results = manager.similarity_search("alpha", k=1)
+    assert results[0][0].page_content == "alpha"
+
+def test_snapshot_is_picked_up_by_other_manager(manager, tmp_path):
+    """Test that a snapshot bumps the version and another process-level manager reloads it."""
+    reader = VectorIndexManager(str(tmp_path), embeddings=FakeEmbeddings(), reload_interval=0)
+    assert reader.size == 0
+
+    manager.add_texts(["alpha"])
+    assert manager.snapshot()
+    assert reader.size == 1
+
+def test_concurrent_writers_do_not_lose_chunks(manager, tmp_path):
+    """Test that a writer rebases its pending chunks onto a newer snapshot."""
+    other = VectorIndexManager(str(tmp_path), embeddings=FakeEmbeddings(), reload_interval=0)
+    manager.add_texts(["alpha"])
+    other.add_texts(["beta"])
+    other.snapshot()
+    manager.snapshot()
+
+    fresh = VectorIndexManager(str(tmp_path), embeddings=FakeEmbeddings())
+    assert fresh.size == 2
+
+def test_filtered_search(manager):
+    """Test metadata predicates applied inside the index."""
+    manager.add_texts(["a", "b", "c"], [
+        {"file_id": "f1", "mime_type": "text/plain", "upload_date": "2024-01-01T00:00:00"},
+        {"file_id": "f2", "mime_type": "application/pdf", "upload_date": "2024-06-01T00:00:00"},
+        {"file_id": "f1", "mime_type": "application/pdf", "upload_date": "2025-01-01T00:00:00"},
+    ])
+
+    def texts(filters):
+        return sorted(doc.page_content for doc, _ in manager.similarity_search("a", k=5, filters=filters))
+
+    assert texts({"file_id": "f1"}) == ["a", "c"]
+    assert texts({"mime_type": ["application/pdf"]}) == ["b", "c"]
+    assert texts({"uploaded_after": "2024-03-01"}) == ["b", "c"]
+    assert texts({"file_id": "f1", "uploaded_before": "2024-03-01"}) == ["a"]
+    assert texts({"file_id": "missing"}) == []
+
+def test_date_bounds_are_utc_and_validated(manager, monkeypatch):
+    """Test that naive dates are read as UTC and unreadable bounds are rejected."""
+    manager.add_texts(["a", "b"], [
+        {"upload_date": "2024-03-01T00:30:00+00:00"},
+        {"upload_date": "not a date"},
+    ])
+
+    def texts(filters):
+        return sorted(doc.page_content for doc, _ in manager.similarity_search("a", k=5, filters=filters))
+
+    # Naive dates must not follow the server's timezone
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        assert texts({"uploaded_after": "2024-03-01"}) == ["a"]
+        assert texts({"uploaded_before": "2024-03-01T00:00:00"}) == []
+        assert texts({"uploaded_after": date(2024, 3, 1)}) == ["a"]
+        with pytest.raises(ValueError):
+            texts({"uploaded_after": "yesterday"})
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+def test_shards_are_isolated_and_evicted(tmp_path, monkeypatch):
+    """Test that each user only sees their own shard and inactive shards are evicted."""
+    monkeypatch.setattr(vector_db, "get_embeddings", lambda: FakeEmbeddings())
+    store = ShardedVectorStore(str(tmp_path), max_shards=1)
+
+    store.get_shard("u1").add_texts(["alpha"], [{"user_id": "u1"}])
+    store.get_shard("u2").add_texts(["beta"], [{"user_id": "u2"}])
+    assert store.resident_shards() == ["u2"]
+
+    results = store.get_shard("u1").similarity_search("beta", k=5)
+    assert [doc.page_content for doc, _ in results] == ["alpha"]
+
+class NumberedEmbeddings(FakeEmbeddings):
+    """Distinct embeddings for texts ending in a number, so nearest neighbours are unambiguous."""
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(int(text.rsplit("-", 1)[1]))
+        return rng.random(8).tolist()
+
+@pytest.mark.parametrize("index_type, index_class", [
+    ("ivf_flat", faiss.IndexIVFFlat),
+    ("ivf_pq", faiss.IndexIVFPQ),
+    ("hnsw", faiss.IndexHNSWFlat),
+])
+def test_promoted_index_searches_filters_deletes_and_reloads(tmp_path, monkeypatch, index_type, index_class):
+    """Test that a shard past the threshold is promoted and keeps every search feature."""
+    monkeypatch.setattr(vector_db, "VECTOR_PQ_NBITS", 4)  # 256 centroids per sub-quantizer is slow to train
+    def open_manager():
+        return VectorIndexManager(str(tmp_path), embeddings=NumberedEmbeddings(), reload_interval=0,
+                                  index_type=index_type, ann_threshold=200)
+
+    manager = open_manager()
+    manager.add_texts([f"chunk-{i}" for i in range(300)], [{"file_id": f"f{i % 3}"} for i in range(300)])
+    manager.maybe_promote()
+    index = manager._vectorstore.index
+    assert isinstance(index, index_class)
+
+    params = vector_db.search_parameters(index)
+    if index_type == "hnsw":
+        assert params.efSearch == vector_db.VECTOR_HNSW_EF_SEARCH
+    else:
+        assert params.nprobe == vector_db.VECTOR_IVF_NPROBE
+
+    def search(target, query, **kwargs):
+        return [(doc.page_content, doc.metadata["file_id"]) for doc, _ in target.similarity_search(query, **kwargs)]
+
+    assert search(manager, "chunk-42", k=1) == [("chunk-42", "f0")]
+    filtered = search(manager, "chunk-42", k=5, filters={"file_id": "f1"})
+    assert len(filtered) == 5 and all(file_id == "f1" for _, file_id in filtered)
+
+    assert manager.delete_file("f0") == 100
+    remaining = search(manager, "chunk-42", k=5)
+    assert len(remaining) == 5 and all(file_id != "f0" for _, file_id in remaining)
+
+    manager.snapshot()
+    reader = open_manager()
+    assert reader.size == 300 and isinstance(reader._vectorstore.index, index_class)
+    assert search(reader, "chunk-43", k=1) == [("chunk-43", "f1")]
+    assert all(file_id != "f0" for _, file_id in search(reader, "chunk-42", k=5))
+    manager.close()
+
+def test_deleted_file_is_hidden_and_compacted(manager, tmp_path):
+    """Test that tombstoned chunks never match and compaction reclaims them across reloads."""
+    manager.add_texts(["a", "b", "c"], [{"file_id": "f1"}, {"file_id": "f2"}, {"file_id": "f1"}])
+    assert manager.delete_file("f1") == 2
+    assert [doc.page_content for doc, _ in manager.similarity_search("a", k=5)] == ["b"]
+    assert manager.similarity_search("a", k=5, filters={"file_id": "f1"}) == []
+
+    manager.snapshot()
+    reader = VectorIndexManager(str(tmp_path), embeddings=FakeEmbeddings(), reload_interval=0)
+    assert reader.dead_ratio == pytest.approx(2 / 3)
+    assert [doc.page_content for doc, _ in reader.similarity_search("a", k=5)] == ["b"]
+
+    assert manager.compact(min_dead_ratio=0.5)
+    assert manager.size == 1 and manager.dead_ratio == 0.0
+    manager.snapshot()
+    assert reader.size == 1
+
+def test_compaction_covers_shards_on_disk(tmp_path, monkeypatch):
+    """Test that compaction from a fresh store reaches shards it never loaded."""
+    monkeypatch.setattr(vector_db, "get_embeddings", lambda: FakeEmbeddings())
+    writer = ShardedVectorStore(str(tmp_path))
+    for user_id in ("u1", "u2"):
+        writer.get_shard(user_id).add_texts(["a", "b", "c"], [{"file_id": "f1"}, {"file_id": "f2"}, {"file_id": "f1"}])
+    writer.get_shard("u1").delete_file("f1")
+    writer.get_shard("u2").delete_file("f2")
+    writer.flush_all()
+
+    monkeypatch.setattr(vector_db, "_vector_store", ShardedVectorStore(str(tmp_path)))
+    assert vector_db.get_vector_store().stored_shards() == ["u1", "u2"]
+    assert vector_db.compact_vectors(min_dead_ratio=0.5) == 1
+    assert vector_db.get_vector_store().resident_shards() == []
+
+    reader = ShardedVectorStore(str(tmp_path))
+    assert reader.get_shard("u1").size == 1 and reader.get_shard("u1").dead_ratio == 0.0
+    assert reader.get_shard("u2").size == 3
+
+def test_file_vectors_are_copied_to_another_owner(tmp_path, monkeypatch):
+    """Test that a duplicate file gets the source's chunks in its owner's shard without embedding."""
+    monkeypatch.setattr(vector_db, "get_embeddings", lambda: FakeEmbeddings())
+    monkeypatch.setattr(vector_db, "_vector_store", ShardedVectorStore(str(tmp_path)))
+    source = vector_db.get_index_manager("u1")
+    source.add_texts(["a", "b", "c"], [{"file_id": "f1", "user_id": "u1"}, {"file_id": "f2", "user_id": "u1"},
+                                       {"file_id": "f1", "user_id": "u1"}])
+    target = vector_db.get_index_manager("u2")
+    target.embeddings = None  # Copying must not need the model
+
+    assert vector_db.copy_file_vectors("f1", "u1", {"file_id": "f9", "user_id": "u2"}) == 2
+    texts, metadatas = target.export()
+    assert [text for text, _ in texts] == ["a", "c"]
+    assert all(m == {"file_id": "f9", "user_id": "u2"} for m in metadatas)
+
+    source.delete_file("f1")
+    assert vector_db.copy_file_vectors("f1", "u1", {"file_id": "f10", "user_id": "u2"}) == 0
+
+def test_streamed_pages_chunk_like_whole_document():
+    """Test that chunking pages as they arrive covers the document like chunking it at once."""
+    pages = [" ".join(f"page{p}word{w}" for w in range(300)) for p in range(12)]
+    whole = vector_db.process_document_for_vectors("\n".join(pages))
+    chunks = list(vector_db.split_text_stream(iter(pages), chunk_size=200, chunk_overlap=40))
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert set(" ".join(chunks).split()) == set(whole.split())
+    assert chunks[0] == whole[:len(chunks[0])] and whole.endswith(chunks[-1])
+
+def test_page_vectors_are_stored_in_batches(tmp_path, monkeypatch):
+    """Test that streamed pages are embedded in batches and undone when embedding fails."""
+    monkeypatch.setattr(vector_db, "get_embeddings", lambda: FakeEmbeddings())
+    monkeypatch.setattr(vector_db, "_vector_store", ShardedVectorStore(str(tmp_path)))
+    monkeypatch.setattr(vector_db, "STREAM_EMBED_BATCH", 4)
+    pages = [" ".join(f"p{p}w{w}" for w in range(400)) for p in range(10)]
+    manager = vector_db.get_index_manager("u1")
+
+    assert vector_db.store_page_vectors(iter(pages), {"file_id": "f1", "user_id": "u1"})
+    stored = manager.export_file("f1")[0]
+    assert len(stored) == len(list(vector_db.split_text_stream(pages)))
+    assert not vector_db.store_page_vectors(iter([]), {"file_id": "f2", "user_id": "u1"})
+
+    calls = []
+    def flaky_embed(texts):
+        calls.append(texts)
+        if len(calls) > 1:
+            raise RuntimeError("model unavailable")
+        return FakeEmbeddings().embed_documents(texts)
+    monkeypatch.setattr(manager.embeddings, "embed_documents", flaky_embed)
+    assert not vector_db.store_page_vectors(iter(pages), {"file_id": "f3", "user_id": "u1"})
+    assert manager.export_file("f3")[0] == []
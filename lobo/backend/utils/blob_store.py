@@ -0,0 +1,160 @@
+# File: lobo/backend/utils/blob_store.py
+# Enhancement: Content-addressed, reference-counted file storage with fan-out directories
+
+import os
+import re
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from filelock import FileLock
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+BLOB_FOLDER = os.getenv("BLOB_FOLDER", os.path.join(os.getenv("UPLOAD_FOLDER", "uploads"), "blobs"))
+BLOB_FANOUT_DEPTH = int(os.getenv("BLOB_FANOUT_DEPTH", 2))  # directory levels, two hex digits each
+
+REFS_SUFFIX = ".refs"
+LOCK_FILE = ".lock"
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class BlobStore:
+    """
+    Stores file contents once per SHA-256, however many uploads share them.
+
+    A blob lives at `<root>/ab/cd/<hash>` so no directory grows past a few
+    thousand entries. Next to it a `<hash>.refs` file counts the uploads
+    pointing at it; the blob is deleted when the last one is released.
+    Reference changes take a file lock on the blob's directory, so worker
+    processes sharing the folder see consistent counts.
+
+    Blobs are added by renaming a finished temporary file into place, so
+    the temporary file must be on the same filesystem as the store.
+    """
+
+    def __init__(self, root: str = BLOB_FOLDER, depth: int = BLOB_FANOUT_DEPTH):
+        self.root = root
+        self.depth = max(0, depth)
+        self._stats = {"stored": 0, "deduplicated": 0, "deleted": 0, "bytes_saved": 0}
+        self._stats_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, file_hash: str) -> str:
+        """
+        Get the path of a blob.
+
+        Args:
+            file_hash (str): Lowercase hex SHA-256 of the content
+
+        Returns:
+            str: Path of the blob, whether it exists or not
+
+        Raises:
+            ValueError: If file_hash is not a SHA-256 hex digest
+        """
+        if not _HASH_PATTERN.match(file_hash or ""):
+            raise ValueError(f"Invalid blob hash: {file_hash!r}")
+        shards = [file_hash[i * 2:i * 2 + 2] for i in range(self.depth)]
+        return os.path.join(self.root, *shards, file_hash)
+
+    def _lock(self, blob_path: str) -> FileLock:
+        directory = os.path.dirname(blob_path)
+        os.makedirs(directory, exist_ok=True)
+        return FileLock(os.path.join(directory, LOCK_FILE))
+
+    @staticmethod
+    def _read_refs(blob_path: str) -> int:
+        try:
+            with open(blob_path + REFS_SUFFIX) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            # A blob without a counter predates counting or lost it: assume one owner
+            return 1 if os.path.exists(blob_path) else 0
+
+    @staticmethod
+    def _write_refs(blob_path: str, refs: int):
+        temp_path = blob_path + REFS_SUFFIX + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(str(refs))
+        os.replace(temp_path, blob_path + REFS_SUFFIX)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def put(self, source_path: str, file_hash: str) -> Tuple[str, bool]:
+        """
+        Add a reference to the content of a finished file, storing it if it is new.
+
+        The source file is always consumed: it becomes the blob, or it is
+        deleted because the blob already exists.
+
+        Args:
+            source_path (str): Temporary file holding the content
+            file_hash (str): SHA-256 of the content
+
+        Returns:
+            Tuple[str, bool]: (blob_path, created), created is False for a duplicate
+        """
+        blob_path = self.path(file_hash)
+        with self._lock(blob_path):
+            refs = self._read_refs(blob_path)
+            if refs and os.path.exists(blob_path):
+                size = os.path.getsize(source_path)
+                os.remove(source_path)
+                self._write_refs(blob_path, refs + 1)
+                self._count("deduplicated")
+                self._count("bytes_saved", size)
+                return blob_path, False
+
+            # Counted references without content (blob lost) get it back too
+            os.replace(source_path, blob_path)
+            self._write_refs(blob_path, refs + 1 if refs else 1)
+            self._count("stored")
+            return blob_path, True
+
+    def release(self, file_hash: str) -> int:
+        """
+        Drop a reference to a blob, deleting it once nothing refers to it.
+
+        Args:
+            file_hash (str): SHA-256 of the content
+
+        Returns:
+            int: Remaining reference count
+        """
+        blob_path = self.path(file_hash)
+        with self._lock(blob_path):
+            refs = self._read_refs(blob_path) - 1
+            if refs > 0:
+                self._write_refs(blob_path, refs)
+                return refs
+            for path in (blob_path, blob_path + REFS_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._count("deleted")
+            logging.info(f"Deleted unreferenced blob {file_hash}")
+            return 0
+
+    def refcount(self, file_hash: str) -> int:
+        """Get the number of references to a blob (0 if it is not stored)."""
+        return self._read_refs(self.path(file_hash))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store, dedupe and delete counts of this process."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+# Process-wide blob store
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """Get the process-wide blob store at BLOB_FOLDER, creating it on first use."""
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = BlobStore()
+    return _blob_store
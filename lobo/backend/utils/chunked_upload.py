@@ -0,0 +1,442 @@
+# File: lobo/backend/utils/chunked_upload.py
+# Enhancement: Resumable chunked uploads written straight into preallocated files
+
+import os
+import re
+import json
+import time
+import uuid
+import errno
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from filelock import FileLock
+from utils.file_handler import (
+    MAX_FILE_SIZE, TAIL_BYTES, UPLOAD_CHUNK_SIZE, UPLOAD_FOLDER, UPLOAD_SNIFF_BYTES,
+    store_validated_file, validate_content
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+CHUNKED_UPLOAD_FOLDER = os.getenv("CHUNKED_UPLOAD_FOLDER", os.path.join(UPLOAD_FOLDER, "sessions"))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv("CHUNKED_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))  # default bytes per chunk
+CHUNKED_UPLOAD_MIN_CHUNK_SIZE = int(os.getenv("CHUNKED_UPLOAD_MIN_CHUNK_SIZE", 256 * 1024))
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 32 * 1024 * 1024))
+CHUNKED_UPLOAD_TTL = int(os.getenv("CHUNKED_UPLOAD_TTL", 24 * 3600))  # seconds an idle session is kept
+CHUNKED_UPLOAD_WRITE_TIMEOUT = int(os.getenv("CHUNKED_UPLOAD_WRITE_TIMEOUT", 300))  # seconds a chunk write may hold its slot
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class UploadError(Exception):
+    """Raised when a chunked upload request cannot be served."""
+
+    def __init__(self, message: str, status_code: int = 400, error_code: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.error_code = error_code
+
+def tier_upload_limit(tier: Optional[str]) -> int:
+    """
+    Get the largest file a subscription tier may upload in chunks.
+
+    Args:
+        tier (str, optional): Subscription tier
+
+    Returns:
+        int: Size limit in bytes, `max_upload_bytes` of the tier or MAX_FILE_SIZE
+    """
+    from routes.subscriptions import SUBSCRIPTION_TIERS
+
+    info = SUBSCRIPTION_TIERS.get(tier) or SUBSCRIPTION_TIERS["free"]
+    return int(info.get("max_upload_bytes", MAX_FILE_SIZE))
+
+def _preallocate(fd: int, size: int):
+    """Reserve disk space for a file, or make it sparse where the filesystem cannot."""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except AttributeError:
+        os.ftruncate(fd, size)
+    except OSError as e:
+        if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+        os.ftruncate(fd, size)
+
+class ChunkedUpload:
+    """
+    A resumable upload session.
+
+    Creating a session preallocates a file of the announced size. Chunks
+    are fixed-size slices of it, each sent with its SHA-256 and written in
+    place with pwrite as the request body is read, so a chunk is never held
+    in memory and chunks may arrive in any order, on any worker, and be
+    retried after a dropped connection. A chunk only counts as received
+    once its hash matched.
+
+    Session state lives in a JSON file next to the data and is changed
+    under a file lock, so all workers sharing UPLOAD_FOLDER agree on it.
+    Finalizing reads the file once to hash and validate it, then renames
+    it into the blob store.
+    """
+
+    def __init__(self, upload_id: str, folder: Optional[str] = None):
+        if not _UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise UploadError("Upload not found", 404, "upload_not_found")
+        self.upload_id = upload_id
+        self.folder = folder or CHUNKED_UPLOAD_FOLDER
+        base = os.path.join(self.folder, upload_id)
+        self.data_path = base + ".part"
+        self.state_path = base + ".json"
+        self._lock = FileLock(base + ".lock")
+
+    # ------------------------------------------------------------------
+    # Session lifecycle
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def create(cls, user_id: str, filename: str, size: int, chunk_size: Optional[int] = None,
+               max_size: int = MAX_FILE_SIZE, folder: Optional[str] = None) -> "ChunkedUpload":
+        """
+        Start an upload session and preallocate its file.
+
+        Args:
+            user_id (str): Owner of the upload
+            filename (str): Name of the file being uploaded
+            size (int): Total size in bytes
+            chunk_size (int, optional): Requested chunk size, clamped to the allowed range
+            max_size (int): Largest size the user may upload
+            folder (str, optional): Session folder, on the same filesystem as the blob store
+
+        Returns:
+            ChunkedUpload: The new session
+
+        Raises:
+            UploadError: If the size is invalid, too large or does not fit on disk
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("File size must be a positive number of bytes", 400, "invalid_size")
+        if size > max_size:
+            raise UploadError(f"File size exceeds maximum allowed ({max_size // 1024 // 1024} MB)", 413, "file_too_large")
+
+        chunk_size = min(max(chunk_size or CHUNKED_UPLOAD_CHUNK_SIZE, CHUNKED_UPLOAD_MIN_CHUNK_SIZE),
+                         CHUNKED_UPLOAD_MAX_CHUNK_SIZE)
+        upload = cls(uuid.uuid4().hex, folder)
+        os.makedirs(upload.folder, exist_ok=True)
+
+        fd = os.open(upload.data_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        try:
+            # Reserve the space now so a full disk fails here, not halfway through
+            _preallocate(fd, size)
+        except OSError as e:
+            os.close(fd)
+            os.remove(upload.data_path)
+            if e.errno == errno.ENOSPC:
+                raise UploadError("Not enough storage for this upload", 507, "insufficient_storage")
+            raise
+        os.close(fd)
+
+        now = time.time()
+        upload._save({
+            "upload_id": upload.upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": chunk_size,
+            "received": [],
+            "writing": {},
+            "finalizing": False,
+            "created_at": now,
+            "updated_at": now
+        })
+        logging.info(f"Started chunked upload {upload.upload_id} of {size} bytes for user {user_id}")
+        return upload
+
+    @classmethod
+    def load(cls, upload_id: str, user_id: str, folder: Optional[str] = None) -> "ChunkedUpload":
+        """
+        Open an existing session of a user.
+
+        Raises:
+            UploadError: If the session does not exist, expired or belongs to someone else
+        """
+        upload = cls(upload_id, folder)
+        state = upload._load()
+        if state is None or state["user_id"] != user_id or upload._expired(state):
+            raise UploadError("Upload not found", 404, "upload_not_found")
+        return upload
+
+    def abort(self):
+        """Delete the session and its data."""
+        self._discard()
+        logging.info(f"Aborted chunked upload {self.upload_id}")
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, state: Dict[str, Any]):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _remove(self):
+        for path in (self.data_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _discard(self):
+        with self._lock:
+            self._remove()
+        try:
+            os.remove(self._lock.lock_file)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _expired(state: Dict[str, Any], ttl: int = CHUNKED_UPLOAD_TTL) -> bool:
+        return ttl > 0 and state["updated_at"] + ttl < time.time()
+
+    @staticmethod
+    def _chunk_count(state: Dict[str, Any]) -> int:
+        return -(-state["size"] // state["chunk_size"])
+
+    @staticmethod
+    def _active_writes(state: Dict[str, Any]) -> List[int]:
+        now = time.time()
+        return [int(index) for index, started in state["writing"].items()
+                if started + CHUNKED_UPLOAD_WRITE_TIMEOUT > now]
+
+    def _missing_offsets(self, state: Dict[str, Any]) -> List[int]:
+        received = set(state["received"])
+        return [index * state["chunk_size"] for index in range(self._chunk_count(state)) if index not in received]
+
+    def _locked_state(self) -> Dict[str, Any]:
+        state = self._load()
+        if state is None:
+            raise UploadError("Upload not found", 404, "upload_not_found")
+        return state
+
+    def status(self, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Describe the session so a client can resume it.
+
+        Returns:
+            Dict[str, Any]: Size, chunk size, received bytes and the offsets still missing
+        """
+        if state is None:
+            with self._lock:
+                state = self._locked_state()
+        missing = self._missing_offsets(state)
+        received_bytes = sum(min(state["chunk_size"], state["size"] - index * state["chunk_size"])
+                             for index in state["received"])
+        return {
+            "upload_id": self.upload_id,
+            "filename": state["filename"],
+            "size": state["size"],
+            "chunk_size": state["chunk_size"],
+            "chunk_count": self._chunk_count(state),
+            "received_bytes": received_bytes,
+            "missing_offsets": missing,
+            "complete": not missing,
+            "expires_at": state["updated_at"] + CHUNKED_UPLOAD_TTL
+        }
+
+    # ------------------------------------------------------------------
+    # Chunks
+    # ------------------------------------------------------------------
+
+    def write_chunk(self, offset: int, stream, length: Optional[int], sha256: Optional[str]) -> Dict[str, Any]:
+        """
+        Write one chunk into the file at its offset while reading it from the request.
+
+        Re-sending a chunk that was already received is accepted without
+        writing it again.
+
+        Args:
+            offset (int): Byte offset of the chunk, a multiple of the chunk size
+            stream: Request body
+            length (int, optional): Content length of the body
+            sha256 (str, optional): Hex SHA-256 of the chunk
+
+        Returns:
+            Dict[str, Any]: Session status after the chunk
+
+        Raises:
+            UploadError: If the chunk is misplaced, incomplete or does not match its hash
+        """
+        sha256 = (sha256 or "").lower()
+        if not _SHA256_PATTERN.match(sha256):
+            raise UploadError("Chunk SHA-256 is required", 400, "missing_chunk_hash")
+
+        with self._lock:
+            state = self._locked_state()
+            size, chunk_size = state["size"], state["chunk_size"]
+            if offset < 0 or offset >= size or offset % chunk_size:
+                raise UploadError(f"Offset must be a multiple of {chunk_size} below {size}", 416, "invalid_offset")
+            index = offset // chunk_size
+            expected = min(chunk_size, size - offset)
+            if length is not None and length != expected:
+                raise UploadError(f"Chunk at offset {offset} must be {expected} bytes", 400, "invalid_chunk_length")
+            if state["finalizing"]:
+                raise UploadError("Upload is being finalized", 409, "upload_finalizing")
+            if index in state["received"]:
+                return self.status(state)
+            if index in self._active_writes(state):
+                raise UploadError("This chunk is already being uploaded", 409, "chunk_in_progress")
+            state["writing"][str(index)] = time.time()
+            self._save(state)
+
+        received = False
+        try:
+            digest = hashlib.sha256()
+            fd = os.open(self.data_path, os.O_WRONLY)
+            try:
+                position, remaining = offset, expected
+                while remaining:
+                    data = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    digest.update(data)
+                    view = memoryview(data)
+                    while view:
+                        written = os.pwrite(fd, view, position)
+                        view, position = view[written:], position + written
+                    remaining -= len(data)
+            finally:
+                os.close(fd)
+
+            if remaining:
+                raise UploadError(f"Chunk ended {remaining} bytes early", 400, "incomplete_chunk")
+            if digest.hexdigest() != sha256:
+                raise UploadError("Chunk does not match its SHA-256", 422, "chunk_hash_mismatch")
+            received = True
+        finally:
+            with self._lock:
+                state = self._locked_state()
+                state["writing"].pop(str(index), None)
+                if received and index not in state["received"]:
+                    state["received"].append(index)
+                state["updated_at"] = time.time()
+                self._save(state)
+
+        return self.status(state)
+
+    # ------------------------------------------------------------------
+    # Finalization
+    # ------------------------------------------------------------------
+
+    def finalize(self, sha256: Optional[str] = None) -> Dict:
+        """
+        Validate the complete file and move it into the blob store.
+
+        Args:
+            sha256 (str, optional): Expected SHA-256 of the whole file
+
+        Returns:
+            Dict: File metadata as returned by save_uploaded_file
+
+        Raises:
+            UploadError: If chunks are missing or still uploading, or the content is invalid
+        """
+        with self._lock:
+            state = self._locked_state()
+            if state["finalizing"]:
+                raise UploadError("Upload is already being finalized", 409, "upload_finalizing")
+            if self._active_writes(state):
+                raise UploadError("Chunks are still being uploaded", 409, "chunks_in_progress")
+            missing = self._missing_offsets(state)
+            if missing:
+                raise UploadError(f"{len(missing)} chunks are missing", 409, "upload_incomplete")
+            state["finalizing"] = True
+            self._save(state)
+
+        try:
+            digest, head, tail = hashlib.sha256(), b"", b""
+            with open(self.data_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+                    if len(head) < UPLOAD_SNIFF_BYTES:
+                        head += block[:UPLOAD_SNIFF_BYTES - len(head)]
+                    tail = (tail + block[-TAIL_BYTES:])[-TAIL_BYTES:]
+            file_hash = digest.hexdigest()
+
+            filename = state["filename"]
+            ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+            # The content is final, so a retry cannot fix either error
+            if sha256 and sha256.lower() != file_hash:
+                self._discard()
+                raise UploadError("File does not match its SHA-256", 422, "file_hash_mismatch")
+            mime_type, error = validate_content(ext, head, tail)
+            if error:
+                self._discard()
+                raise UploadError(error, 400 if error.startswith("Invalid") else 415, "invalid_file")
+
+            metadata = store_validated_file(self.data_path, filename, state["size"], mime_type, file_hash)
+        except Exception:
+            with self._lock:
+                state = self._load()
+                if state is not None:
+                    state["finalizing"] = False
+                    self._save(state)
+            raise
+
+        self._discard()
+        logging.info(f"Finalized chunked upload {self.upload_id} as {file_hash}")
+        return metadata
+
+def cleanup_expired_uploads(ttl: int = CHUNKED_UPLOAD_TTL, folder: Optional[str] = None) -> int:
+    """
+    Delete upload sessions and temporary upload files nobody touched for `ttl` seconds.
+
+    Args:
+        ttl (int): Idle time after which a session is abandoned
+        folder (str, optional): Session folder
+
+    Returns:
+        int: Number of sessions and temporary files deleted
+    """
+    folder = folder or CHUNKED_UPLOAD_FOLDER
+    cutoff = time.time() - ttl
+    removed = 0
+
+    # Sessions, judged by their last activity
+    upload_ids = set()
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            upload_id, ext = os.path.splitext(name)
+            if ext in (".part", ".json") and _UPLOAD_ID_PATTERN.match(upload_id):
+                upload_ids.add(upload_id)
+
+    for upload_id in upload_ids:
+        upload = ChunkedUpload(upload_id, folder)
+        state = upload._load()
+        if state is not None:
+            last_active = state["updated_at"]
+        elif os.path.exists(upload.data_path):
+            last_active = os.path.getmtime(upload.data_path)
+        else:
+            continue
+        if last_active < cutoff:
+            upload._discard()
+            removed += 1
+
+    # Single-request uploads left behind by a crashed worker
+    for name in os.listdir(UPLOAD_FOLDER):
+        path = os.path.join(UPLOAD_FOLDER, name)
+        if name.startswith(".upload-") and name.endswith(".part") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+
+    if removed:
+        logging.info(f"Removed {removed} abandoned uploads")
+    return removed
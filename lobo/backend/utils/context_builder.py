@@ -0,0 +1,305 @@
+# File: lobo/backend/utils/context_builder.py
+# Enhancement: Token-budgeted context window for chat generations
+# Enhancement: Rolling summary of turns that left the context window
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", 4096))  # tokens, also sent to Ollama as num_ctx
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "tokenizers/tokenizer.json")  # local file, see manage.py fetch-tokenizer
+CONTEXT_TOKENIZER_SOURCE = os.getenv("CONTEXT_TOKENIZER_SOURCE", "deepseek-ai/DeepSeek-R1-Distill-Qwen-1.5B")
+CONTEXT_TOKEN_CACHE_SIZE = int(os.getenv("CONTEXT_TOKEN_CACHE_SIZE", 50000))
+CONTEXT_MIN_PROMPT_TOKENS = int(os.getenv("CONTEXT_MIN_PROMPT_TOKENS", 256))  # kept for the latest message
+CHAT_SYSTEM_PROMPT = os.getenv("CHAT_SYSTEM_PROMPT", "")
+CHAT_SUMMARY_TRIGGER_TOKENS = int(os.getenv("CHAT_SUMMARY_TRIGGER_TOKENS", 1024))  # unsummarized backlog
+CHAT_SUMMARY_KEEP_RECENT = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", 6))  # messages never folded into the summary
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 300))
+MESSAGE_TOKEN_OVERHEAD = 4  # role markers and separators added by the chat template
+CHARS_PER_TOKEN = 4  # estimate used when no tokenizer can be loaded
+
+@lru_cache(maxsize=4)
+def get_tokenizer(path: str = CONTEXT_TOKENIZER):
+    """
+    Load a tokenizer from a local tokenizer.json once per process.
+
+    Never downloads: this runs on the request path, so a missing file only
+    means token counts are estimated. Fetch the file ahead of time with
+    `python manage.py fetch-tokenizer`.
+
+    Args:
+        path (str): Path of the tokenizer.json file
+
+    Returns:
+        The tokenizer, or None if it cannot be loaded (token counts are then estimated)
+    """
+    if not os.path.isfile(path):
+        logging.warning(f"Tokenizer file {path} not found, estimating token counts")
+        return None
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_file(path)
+    except Exception as e:
+        logging.warning(f"Could not load tokenizer {path}, estimating token counts: {e}")
+        return None
+
+def fetch_tokenizer(source: str = CONTEXT_TOKENIZER_SOURCE, path: str = CONTEXT_TOKENIZER) -> str:
+    """
+    Download a tokenizer from the Hugging Face hub and save it where get_tokenizer loads it.
+
+    Args:
+        source (str): Hugging Face model name
+        path (str): Destination tokenizer.json path
+
+    Returns:
+        str: The path written
+    """
+    from tokenizers import Tokenizer
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    Tokenizer.from_pretrained(source).save(path)
+    get_tokenizer.cache_clear()
+    return path
+
+class TokenCounter:
+    """
+    Counts tokens with a bounded cache keyed by content hash.
+
+    Chat history is re-sent on every turn, so each message is tokenized once
+    and later turns only pay for a dictionary lookup.
+    """
+
+    def __init__(self, tokenizer_name: str = CONTEXT_TOKENIZER, max_entries: int = CONTEXT_TOKEN_CACHE_SIZE):
+        self.tokenizer_name = tokenizer_name
+        self.max_entries = max(1, max_entries)
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokenize(self, text: str) -> int:
+        tokenizer = get_tokenizer(self.tokenizer_name)
+        if tokenizer is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Args:
+            text (str): Text to count
+
+        Returns:
+            int: Number of tokens
+        """
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+
+        tokens = self._tokenize(text)
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """Count the tokens a chat message occupies in the prompt."""
+        return self.count(message.get("content") or "") + MESSAGE_TOKEN_OVERHEAD
+
+    def truncate(self, text: str, max_tokens: int, keep_start: bool = False) -> str:
+        """Keep the end (or with keep_start, the start) of a text that fits in max_tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        tokenizer = get_tokenizer(self.tokenizer_name)
+        if tokenizer is None:
+            if keep_start:
+                return text[:max_tokens * CHARS_PER_TOKEN]
+            return text[-max_tokens * CHARS_PER_TOKEN:]
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if keep_start:
+            return text[:encoding.offsets[max_tokens - 1][1]]
+        start = encoding.offsets[-max_tokens][0]
+        return text[start:]
+
+# Process-wide token counter
+_token_counter: Optional[TokenCounter] = None
+
+def get_token_counter() -> TokenCounter:
+    """Get the process-wide token counter, creating it on first use."""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
+
+def build_context(messages: List[Dict[str, Any]], max_tokens: int = 512,
+                  system_prompt: Optional[str] = CHAT_SYSTEM_PROMPT,
+                  summary: Optional[str] = None,
+                  context_window: int = CONTEXT_WINDOW,
+                  counter: Optional[TokenCounter] = None) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Build the messages sent to the model within a token budget.
+
+    The system prompt and the summary of earlier turns always go first. The
+    remaining budget (the context window minus `max_tokens` reserved for the
+    reply) is filled with the most recent turns, newest first, stopping at
+    the first turn that does not fit. The latest message is always kept,
+    truncated to its end if it alone exceeds the budget.
+
+    Up to CONTEXT_MIN_PROMPT_TOKENS of the budget are held back for the
+    latest message before the prefix is added. A prefix that does not fit in
+    the rest is shortened, the summary first and then the system prompt
+    (which carries any retrieved knowledge), each keeping its start.
+
+    Args:
+        messages (List[Dict[str, Any]]): Chat history, oldest first, each with role and content
+        max_tokens (int): Tokens reserved for the reply
+        system_prompt (str, optional): System instructions
+        summary (str, optional): Rolling summary of turns that are no longer sent verbatim
+        context_window (int): Model context size in tokens
+        counter (TokenCounter, optional): Token counter, defaults to the process-wide one
+
+    Returns:
+        Tuple[List[Dict[str, str]], int]: Messages for the model and the number of history messages left out
+    """
+    counter = counter or get_token_counter()
+    budget = context_window - max_tokens
+
+    # Hold back room for the latest message so a large prefix can't crowd it out
+    latest = next((message for message in reversed(messages) if message.get("content")), None)
+    reserved = min(counter.count_message(latest), CONTEXT_MIN_PROMPT_TOKENS) if latest else 0
+
+    prefix = []
+    prefix_budget = budget - reserved
+    parts = [(system_prompt, ""), (summary, "Summary of the earlier conversation:\n")]
+    for content, heading in parts:
+        if not content:
+            continue
+        available = prefix_budget - MESSAGE_TOKEN_OVERHEAD - counter.count(heading)
+        if available <= 0:
+            break
+        fitted = counter.truncate(content, available, keep_start=True)
+        if fitted != content:
+            logging.info(f"Context budget reached: shortened a {counter.count(content)}-token prefix to {available}")
+        message = {"role": "system", "content": f"{heading}{fitted}"}
+        prefix.append(message)
+        prefix_budget -= counter.count_message(message)
+    budget -= sum(counter.count_message(message) for message in prefix)
+
+    recent = []
+    for message in reversed(messages):
+        if not message.get("content"):
+            continue
+        tokens = counter.count_message(message)
+        if tokens > budget:
+            if not recent:
+                # The newest message must be sent even if it has to be shortened
+                content = counter.truncate(message["content"], budget - MESSAGE_TOKEN_OVERHEAD)
+                recent.append({"role": message["role"], "content": content})
+            break
+        budget -= tokens
+        recent.append({"role": message["role"], "content": message["content"]})
+
+    omitted = len([m for m in messages if m.get("content")]) - len(recent)
+    if omitted:
+        logging.info(f"Context budget reached: sending {len(recent)} recent messages, {omitted} older left out")
+
+    return prefix + recent[::-1], omitted
+
+def summary_backlog(messages: List[Dict[str, Any]], summarized_count: int = 0,
+                    keep_recent: int = CHAT_SUMMARY_KEEP_RECENT,
+                    counter: Optional[TokenCounter] = None,
+                    max_tokens: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Measure the history that could be folded into the rolling summary.
+
+    Args:
+        messages (List[Dict[str, Any]]): Full chat history, oldest first
+        summarized_count (int): Number of leading messages already covered by the summary
+        keep_recent (int): Number of latest messages that always stay verbatim
+        counter (TokenCounter, optional): Token counter, defaults to the process-wide one
+        max_tokens (int, optional): Stop before the message that would pass this many
+            tokens; the first message is always included
+
+    Returns:
+        Tuple[int, int]: Index up to which messages can be summarized, and their token count
+    """
+    counter = counter or get_token_counter()
+    limit = max(summarized_count, len(messages) - keep_recent)
+    end, tokens = summarized_count, 0
+    for message in messages[summarized_count:limit]:
+        count = counter.count_message(message)
+        if max_tokens is not None and end > summarized_count and tokens + count > max_tokens:
+            break
+        end, tokens = end + 1, tokens + count
+    return end, tokens
+
+def needs_summary(messages: List[Dict[str, Any]], summarized_count: int = 0,
+                  trigger_tokens: int = CHAT_SUMMARY_TRIGGER_TOKENS) -> bool:
+    """Check whether the unsummarized backlog of a chat has passed the trigger size."""
+    return summary_backlog(messages, summarized_count)[1] >= trigger_tokens
+
+def summary_prompt(previous_summary: Optional[str], messages: List[Dict[str, Any]],
+                   max_tokens: Optional[int] = None,
+                   counter: Optional[TokenCounter] = None) -> List[Dict[str, str]]:
+    """
+    Build the model messages that fold new turns into the rolling summary.
+
+    Args:
+        previous_summary (str, optional): Current summary of the chat
+        messages (List[Dict[str, Any]]): Turns to add to it
+        max_tokens (int, optional): Size the new turns are cut to, keeping their start
+        counter (TokenCounter, optional): Token counter, defaults to the process-wide one
+
+    Returns:
+        List[Dict[str, str]]: Messages for the model
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages if m.get("content"))
+    if max_tokens is not None:
+        # Only a single message larger than a whole run can need this
+        transcript = (counter or get_token_counter()).truncate(transcript, max_tokens, keep_start=True)
+    instructions = (
+        "You maintain a concise running summary of a conversation. Update the summary with the new "
+        "messages, keeping facts, decisions, names and open questions the assistant will need later. "
+        "Reply with the updated summary only."
+    )
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+    ]
+
+def summary_budget(previous_summary: Optional[str], context_window: int = CONTEXT_WINDOW,
+                   counter: Optional[TokenCounter] = None) -> int:
+    """
+    Get how many tokens of new turns one summary generation can fold in.
+
+    The prompt, the previous summary and the new summary must all fit in the
+    context window, or Ollama silently drops the start of the prompt.
+
+    Args:
+        previous_summary (str, optional): Current summary of the chat
+        context_window (int): Model context size in tokens
+        counter (TokenCounter, optional): Token counter, defaults to the process-wide one
+
+    Returns:
+        int: Token budget for the new turns
+    """
+    counter = counter or get_token_counter()
+    prompt = sum(counter.count_message(message) for message in summary_prompt(previous_summary, []))
+    return max(1, context_window - CHAT_SUMMARY_MAX_TOKENS - prompt)
@@ -0,0 +1,123 @@
+# File: lobo/backend/utils/conversation_store.py
+# Enhancement: Server-side conversation context in Redis, keyed by owner and chat_id
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", 40))
+CONVERSATION_MAX_MESSAGE_CHARS = int(os.getenv("CONVERSATION_MAX_MESSAGE_CHARS", 8000))
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", 7 * 86400))  # seconds since the last turn
+
+# One-letter role codes keep each stored entry small
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+def encode_message(role: str, content: str) -> bytes:
+    """
+    Encode a chat message compactly for storage.
+
+    Args:
+        role (str): Message role
+        content (str): Message text, truncated to CONVERSATION_MAX_MESSAGE_CHARS
+
+    Returns:
+        bytes: Compact JSON encoding
+    """
+    entry = [_ROLE_CODES.get(role, role), content[:CONVERSATION_MAX_MESSAGE_CHARS]]
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def decode_message(data: bytes) -> Dict[str, str]:
+    """Decode a stored chat message back to a role/content dict."""
+    role, content = json.loads(data)
+    return {"role": _ROLE_NAMES.get(role, role), "content": content}
+
+class ConversationStore:
+    """
+    Recent turns of each conversation, stored as a capped Redis list.
+
+    Each append trims the list to the newest `max_messages` entries and
+    refreshes the TTL in a single pipeline round trip, so a conversation
+    never grows beyond a fixed size and abandoned ones expire on their own.
+
+    Conversations of signed-in users are stored under their user ID as
+    well, so a chat ID sent by someone else never reaches their turns.
+    """
+
+    def __init__(self, client, max_messages: int = CONVERSATION_MAX_MESSAGES, ttl: int = CONVERSATION_TTL):
+        self.client = client
+        self.max_messages = max(2, max_messages)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(chat_id: str, owner: Optional[str] = None) -> str:
+        return f"conv:{owner}:{chat_id}" if owner else f"conv:{chat_id}"
+
+    def get_history(self, chat_id: str, owner: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Get the stored turns of a conversation, oldest first.
+
+        Args:
+            chat_id (str): Conversation ID
+            owner (str, optional): ID of the signed-in user the conversation belongs to
+
+        Returns:
+            List[Dict[str, str]]: Messages with role and content
+        """
+        try:
+            return [decode_message(item) for item in self.client.lrange(self._key(chat_id, owner), 0, -1)]
+        except Exception as e:
+            logging.error(f"Error reading conversation {chat_id}: {str(e)}")
+            return []
+
+    def append(self, chat_id: str, *messages: Dict[str, str], owner: Optional[str] = None) -> bool:
+        """
+        Append turns to a conversation, trimming it to the size cap.
+
+        Args:
+            chat_id (str): Conversation ID
+            *messages (Dict[str, str]): Messages with role and content
+            owner (str, optional): ID of the signed-in user the conversation belongs to
+
+        Returns:
+            bool: True if the turns were stored
+        """
+        if not messages:
+            return True
+        key = self._key(chat_id, owner)
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.rpush(key, *(encode_message(m["role"], m["content"]) for m in messages))
+            pipe.ltrim(key, -self.max_messages, -1)
+            if self.ttl > 0:
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logging.error(f"Error storing conversation {chat_id}: {str(e)}")
+            return False
+
+    def clear(self, chat_id: str, owner: Optional[str] = None) -> bool:
+        """Delete a conversation's stored turns."""
+        try:
+            self.client.delete(self._key(chat_id, owner))
+            return True
+        except Exception as e:
+            logging.error(f"Error clearing conversation {chat_id}: {str(e)}")
+            return False
+
+# Process-wide conversation store
+_conversation_store: Optional[ConversationStore] = None
+
+def get_conversation_store() -> ConversationStore:
+    """Get the process-wide conversation store, creating it on first use."""
+    global _conversation_store
+    if _conversation_store is None:
+        from utils.cache import redis_client
+        _conversation_store = ConversationStore(redis_client)
+    return _conversation_store
@@ -0,0 +1,390 @@
+# File: lobo/backend/utils/embeddings.py
+# Enhancement: Batched embedding pipeline with a content-hash embedding cache
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:1.5b")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "filesystem")  # filesystem, redis or none
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.getenv("VECTOR_DB_PATH", "vector_db"), "embedding_cache")
+)
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 2592000))  # Redis only, 0 = never expire
+EMBEDDING_CACHE_MAX_AGE = int(os.getenv("EMBEDDING_CACHE_MAX_AGE", 2592000))  # filesystem, seconds unused, 0 = keep
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 1024 * 1024 * 1024))  # filesystem, 0 = unbounded
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", 1024))  # in-memory query vectors, 0 = off
+
+def normalize_chunk(text: str) -> str:
+    """
+    Normalize a chunk before hashing so trivially different copies share a cache entry.
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        str: NFC-normalized text with collapsed whitespace
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def chunk_hash(text: str) -> str:
+    """
+    Compute the cache key of a chunk.
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        str: SHA-256 hex digest of the normalized chunk
+    """
+    return hashlib.sha256(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+class FilesystemEmbeddingCache:
+    """
+    Embedding cache storing one float32 .npy file per chunk hash in fan-out directories.
+
+    A hit refreshes the file's modification time, so `sweep` can drop the
+    entries unused the longest. Entries are shared by every file with the
+    same chunk, so deleting a file leaves them to age out.
+    """
+
+    def __init__(self, path: str, namespace: str):
+        self.root = os.path.join(path, namespace)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.npy")
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up several hashes, returning only the hits."""
+        hits = {}
+        for key in keys:
+            path = self._path(key)
+            try:
+                hits[key] = np.load(path).tolist()
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logging.warning(f"Corrupt embedding cache entry {key}: {e}")
+        return hits
+
+    def set_many(self, items: Dict[str, List[float]]):
+        """Store several embeddings, writing each file atomically."""
+        for key, vector in items.items():
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.asarray(vector, dtype=np.float32))
+            os.replace(tmp_path, path)
+
+    def sweep(self, max_age: int = EMBEDDING_CACHE_MAX_AGE, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES) -> int:
+        """
+        Delete entries unused for `max_age` seconds, then the least recently
+        used ones until the cache fits in `max_bytes`.
+
+        Returns:
+            int: Number of entries deleted
+        """
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        cutoff = time.time() - max_age if max_age > 0 else None
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and (max_bytes <= 0 or total <= max_bytes):
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+class RedisEmbeddingCache:
+    """Embedding cache storing raw float32 bytes in Redis."""
+
+    def __init__(self, client, namespace: str, ttl: int = EMBEDDING_CACHE_TTL):
+        self.client = client
+        self.prefix = f"emb:{namespace}:"
+        self.ttl = ttl
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up several hashes with a single MGET, returning only the hits."""
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        return {
+            key: np.frombuffer(value, dtype=np.float32).tolist()
+            for key, value in zip(keys, values)
+            if value
+        }
+
+    def set_many(self, items: Dict[str, List[float]]):
+        """Store several embeddings in one pipeline round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        for key, vector in items.items():
+            data = np.asarray(vector, dtype=np.float32).tobytes()
+            if self.ttl > 0:
+                pipe.setex(self.prefix + key, self.ttl, data)
+            else:
+                pipe.set(self.prefix + key, data)
+        pipe.execute()
+
+class MemoryEmbeddingCache:
+    """Bounded in-process LRU of embeddings, used for search queries."""
+
+    def __init__(self, max_entries: int = EMBEDDING_QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up several hashes, returning only the hits."""
+        with self._lock:
+            hits = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    hits[key] = self._entries[key]
+            return hits
+
+    def set_many(self, items: Dict[str, List[float]]):
+        """Store several embeddings, evicting the least recently used beyond max_entries."""
+        with self._lock:
+            for key, vector in items.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that batches model calls and caches vectors by content hash.
+
+    Chunks already seen (in this call or any earlier upload) are served from the
+    cache; only the misses are sent to the model, grouped into batches of
+    `batch_size`. Queries are kept apart, because the model may embed them
+    differently, in a small in-memory cache: they are rarely repeated for long.
+    """
+
+    def __init__(self, base: Embeddings, cache=None, query_cache=None,
+                 batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.base = base
+        self.cache = cache
+        self.query_cache = query_cache
+        self.batch_size = max(1, batch_size)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "chunks": 0,
+            "cache_hits": 0,
+            "embedded": 0,
+            "model_calls": 0,
+            "embed_seconds": 0.0
+        }
+
+    def _record(self, chunks: int, hits: int, embedded: int, calls: int, seconds: float):
+        with self._stats_lock:
+            self._stats["chunks"] += chunks
+            self._stats["cache_hits"] += hits
+            self._stats["embedded"] += embedded
+            self._stats["model_calls"] += calls
+            self._stats["embed_seconds"] += seconds
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get cumulative embedding statistics for this process.
+
+        Returns:
+            Dict[str, float]: Counters plus cache hit rate and model throughput in chunks/sec
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["cache_hits"] / stats["chunks"] if stats["chunks"] else 0.0
+        stats["chunks_per_sec"] = (
+            stats["embedded"] / stats["embed_seconds"] if stats["embed_seconds"] else 0.0
+        )
+        return stats
+
+    def _lookup(self, cache, keys: List[str]) -> Dict[str, List[float]]:
+        if cache is None:
+            return {}
+        try:
+            return cache.get_many(keys)
+        except Exception as e:
+            logging.warning(f"Embedding cache lookup failed: {e}")
+            return {}
+
+    def _store(self, cache, items: Dict[str, List[float]]):
+        if cache is None or not items:
+            return
+        try:
+            cache.set_many(items)
+        except Exception as e:
+            logging.warning(f"Embedding cache write failed: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed document chunks, calling the model only for uncached content.
+
+        Args:
+            texts (List[str]): Chunks to embed
+
+        Returns:
+            List[List[float]]: One embedding per chunk, in input order
+        """
+        if not texts:
+            return []
+
+        keys = [chunk_hash(text) for text in texts]
+
+        # Deduplicate within the call, then consult the persistent cache
+        unique = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+        vectors = self._lookup(self.cache, list(unique))
+        misses = [key for key in unique if key not in vectors]
+
+        start = time.perf_counter()
+        calls = 0
+        for i in range(0, len(misses), self.batch_size):
+            batch_keys = misses[i:i + self.batch_size]
+            batch_vectors = self.base.embed_documents([unique[key] for key in batch_keys])
+            calls += 1
+            new_items = dict(zip(batch_keys, batch_vectors))
+            vectors.update(new_items)
+            self._store(self.cache, new_items)
+        elapsed = time.perf_counter() - start
+
+        hits = len(texts) - len(misses)
+        self._record(len(texts), hits, len(misses), calls, elapsed)
+
+        if misses:
+            logging.info(
+                f"Embedded {len(misses)} of {len(texts)} chunks in {calls} batches "
+                f"({len(misses) / elapsed if elapsed else 0.0:.1f} chunks/sec, {hits} cache hits)"
+            )
+        else:
+            logging.info(f"All {len(texts)} chunks served from the embedding cache")
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a search query, reusing the cached vector for repeated queries.
+
+        Args:
+            text (str): Query text
+
+        Returns:
+            List[float]: Query embedding
+        """
+        key = chunk_hash(text)
+        cached = self._lookup(self.query_cache, [key])
+        if key in cached:
+            return cached[key]
+
+        vector = self.base.embed_query(text)
+        self._store(self.query_cache, {key: vector})
+        return vector
+
+def _cache_namespace(model: str, kind: str) -> str:
+    """Build a filesystem- and key-safe namespace for a model's cache entries."""
+    safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+    return f"{safe_model}/{kind}"
+
+def create_embedding_cache(kind: str, model: str = OLLAMA_MODEL, backend: str = EMBEDDING_CACHE_BACKEND):
+    """
+    Create the configured embedding cache backend.
+
+    Args:
+        kind (str): Kind of embeddings stored, e.g. "doc"
+        model (str): Embedding model name, used to namespace entries
+        backend (str): "filesystem", "redis" or "none"
+
+    Returns:
+        The cache backend, or None if caching is disabled
+    """
+    backend = (backend or "none").lower()
+    namespace = _cache_namespace(model, kind)
+
+    if backend == "redis":
+        from utils.cache import redis_client, is_redis_available
+        if is_redis_available():
+            return RedisEmbeddingCache(redis_client, namespace.replace("/", ":"))
+        logging.warning("Redis is not available, falling back to the filesystem embedding cache")
+        backend = "filesystem"
+
+    if backend == "filesystem":
+        return FilesystemEmbeddingCache(EMBEDDING_CACHE_PATH, namespace)
+
+    return None
+
+# Process-wide embeddings instance
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+def get_cached_embeddings(model: str = OLLAMA_MODEL) -> CachedEmbeddings:
+    """Get the process-wide cached embeddings model, creating it on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(
+                    OllamaEmbeddings(model=model),
+                    cache=create_embedding_cache("doc", model),
+                    query_cache=MemoryEmbeddingCache() if EMBEDDING_QUERY_CACHE_SIZE > 0 else None
+                )
+    return _embeddings
+
+def sweep_embedding_cache() -> int:
+    """
+    Bound the filesystem embedding cache by age and size; Redis entries expire on their own.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    # Query vectors used to be written to disk too; they are kept in memory now
+    legacy_queries = os.path.join(EMBEDDING_CACHE_PATH, _cache_namespace(OLLAMA_MODEL, "query"))
+    if os.path.isdir(legacy_queries):
+        shutil.rmtree(legacy_queries, ignore_errors=True)
+
+    cache = get_cached_embeddings().cache
+    if not isinstance(cache, FilesystemEmbeddingCache):
+        return 0
+    removed = cache.sweep()
+    if removed:
+        logging.info(f"Removed {removed} unused embedding cache entries")
+    return removed
+
+def get_embedding_stats() -> Dict[str, float]:
+    """Get embedding throughput and cache statistics for this process."""
+    return get_cached_embeddings().get_stats()
@@ -7,9 +7,10 @@ import logging
 import tempfile
 import shutil
 import hashlib
+import datetime
 from typing import Dict, List, Optional, Tuple, Union
 from werkzeug.utils import secure_filename
-from flask import current_app
+from flask import current_app, Request
 import mimetypes
 import os
 import PyPDF2
@@ -23,6 +24,9 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 TEMP_FOLDER = os.getenv("TEMP_FOLDER", "tmp")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))  # 10 MB default
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))  # bytes copied per read when not streamed
+UPLOAD_SNIFF_BYTES = int(os.getenv("UPLOAD_SNIFF_BYTES", 4096))  # leading bytes checked against the extension
+UPLOAD_FSYNC = os.getenv("UPLOAD_FSYNC", "False").lower() == "true"  # flush uploads to disk before committing
 
 # Define allowed file types
 ALLOWED_EXTENSIONS = {
@@ -54,6 +58,31 @@ ALLOWED_EXTENSIONS = {
     'zip': 'application/zip',
 }
 
+# Leading bytes expected for each binary extension
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # legacy Office documents
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06')  # also OOXML documents
+MAGIC_SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'rtf': (b'{\\rtf',),
+    'doc': (OLE_SIGNATURE,),
+    'xls': (OLE_SIGNATURE,),
+    'ppt': (OLE_SIGNATURE,),
+    'docx': ZIP_SIGNATURES,
+    'xlsx': ZIP_SIGNATURES,
+    'pptx': ZIP_SIGNATURES,
+    'zip': ZIP_SIGNATURES,
+}
+
+# Extensions without a signature, checked for being text instead
+TEXT_EXTENSIONS = {'txt', 'md', 'csv', 'svg'}
+
+# Trailing bytes kept for end-of-file checks
+TAIL_BYTES = 1024
+
 # Ensure folders exist
 def ensure_folders_exist():
     """Ensure that upload and temp folders exist."""
@@ -184,9 +213,200 @@ def validate_file(file_path: str, filename: str) -> Tuple[bool, str]:
     
     return True, ""
 
+def sniff_mimetype(head: bytes, ext: str) -> str:
+    """
+    Detect the MIME type of a file from its leading bytes.
+
+    The extension decides which of the types sharing a signature is meant,
+    e.g. a zip container is reported as xlsx for an .xlsx file.
+
+    Args:
+        head (bytes): First bytes of the file
+        ext (str): Lowercase extension the file was uploaded with
+
+    Returns:
+        str: MIME type, or application/octet-stream if the content is not recognized
+    """
+    if any(head.startswith(sig) for sig in MAGIC_SIGNATURES.get(ext, ())):
+        return ALLOWED_EXTENSIONS[ext]
+    if ext in TEXT_EXTENSIONS and b'\x00' not in head:
+        if ext != 'svg' or b'<svg' in head.lower():
+            return ALLOWED_EXTENSIONS[ext]
+
+    # Name what the content actually is for the error message
+    for other, signatures in MAGIC_SIGNATURES.items():
+        if any(head.startswith(sig) for sig in signatures):
+            return ALLOWED_EXTENSIONS[other]
+    return 'application/octet-stream'
+
+def validate_content(ext: str, head: bytes, tail: Optional[bytes] = None) -> Tuple[str, str]:
+    """
+    Check a file's content against its extension from its first and last bytes.
+
+    Args:
+        ext (str): Lowercase extension the file was uploaded with
+        head (bytes): First UPLOAD_SNIFF_BYTES of the file
+        tail (bytes, optional): Last bytes of the whole file, for end-of-file checks
+
+    Returns:
+        Tuple[str, str]: (mime_type, error_message), the error is empty if the content is valid
+    """
+    if ext not in ALLOWED_EXTENSIONS:
+        return "", f"File type not allowed (.{ext or 'no extension'})"
+    detected = sniff_mimetype(head, ext)
+    if detected != ALLOWED_EXTENSIONS[ext]:
+        return "", f"File content doesn't match extension (detected: {detected})"
+    if tail is not None and ext == 'pdf' and b'%%EOF' not in tail:
+        return "", "Invalid PDF file: missing end-of-file marker (truncated upload?)"
+    return detected, ""
+
+class IngestFile:
+    """
+    Upload sink that validates, hashes and stores a file while it is written.
+
+    The file goes straight into a hidden temporary file in UPLOAD_FOLDER,
+    so committing it is a rename on the same filesystem. Each chunk updates
+    the SHA-256 and the size as it passes, and the first UPLOAD_SNIFF_BYTES
+    are checked against the extension, so nothing has to be read back from
+    disk afterwards. Once the file is too large or its content does not
+    match, the rest of the body is discarded instead of written.
+
+    An uncommitted file is deleted when the sink is closed, which Flask does
+    at the end of the request.
+    """
+
+    def __init__(self, filename: str = "", max_size: int = MAX_FILE_SIZE, folder: Optional[str] = None):
+        self.ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        self.max_size = max_size
+        self.size = 0
+        self.mime_type = ""
+        self.error = ""
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._tail = b""
+        fd, self.path = tempfile.mkstemp(dir=folder or UPLOAD_FOLDER, prefix=".upload-", suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._committed = False
+
+    # File interface used by the multipart parser
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.error:
+            return len(data)
+        if self.size > self.max_size:
+            self._reject(f"File size exceeds maximum allowed ({self.max_size // 1024 // 1024} MB)")
+            return len(data)
+
+        if not self.mime_type:
+            self._head += data[:UPLOAD_SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= UPLOAD_SNIFF_BYTES:
+                self._sniff()
+                if self.error:
+                    return len(data)
+
+        self._hash.update(data)
+        self._tail = (self._tail + data[-TAIL_BYTES:])[-TAIL_BYTES:]
+        return self._file.write(data)
+
+    def read(self, *args) -> bytes:
+        return self._file.read(*args)
+
+    def readline(self, *args) -> bytes:
+        return self._file.readline(*args)
+
+    def seek(self, *args) -> int:
+        return self._file.seek(*args)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self._committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    # Validation and commit
+    def _reject(self, error: str):
+        self.error = error
+        # Give the space back right away; the rest of the body is only counted
+        self._file.seek(0)
+        self._file.truncate()
+
+    def _sniff(self):
+        self.mime_type, error = validate_content(self.ext, self._head)
+        if error:
+            self._reject(error)
+
+    def finish(self) -> Tuple[bool, str]:
+        """
+        Run the checks that need the whole file.
+
+        Returns:
+            Tuple[bool, str]: (is_valid, error_message)
+        """
+        if not self.error:
+            if self.size == 0:
+                self._reject("File is empty")
+            else:
+                self.mime_type, error = validate_content(self.ext, self._head, self._tail)
+                if error:
+                    self._reject(error)
+        return not self.error, self.error
+
+    @property
+    def file_hash(self) -> str:
+        return self._hash.hexdigest()
+
+    def seal(self) -> str:
+        """
+        Close the finished file and hand it over to the caller.
+
+        Returns:
+            str: Path of the temporary file, which is no longer deleted on close
+        """
+        self._file.flush()
+        if UPLOAD_FSYNC:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._committed = True
+        return self.path
+
+    def commit(self, destination: str):
+        """
+        Atomically move the validated file to its final path.
+
+        Args:
+            destination (str): Final path, on the same filesystem as UPLOAD_FOLDER
+        """
+        os.replace(self.seal(), destination)
+        self.path = destination
+
+class IngestRequest(Request):
+    """Request class whose multipart file uploads are written into IngestFile sinks."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return IngestFile(filename or "")
+
 def save_uploaded_file(file, filename: str = None) -> Tuple[bool, str, Dict]:
     """
     Save an uploaded file with validation.
+
+    When the app uses IngestRequest the upload was already hashed and
+    validated while the request was parsed, and saving it is a rename.
+    Other file objects are copied through an IngestFile in one pass.
+
+    The content goes into the blob store under its hash. If the same
+    content was uploaded before, the new file only adds a reference to it.
     
     Args:
         file: File object from request
@@ -206,56 +426,71 @@ def save_uploaded_file(file, filename: str = None) -> Tuple[bool, str, Dict]:
     # Secure the filename
     secure_name = secure_filename(original_filename)
     
-    # Generate a unique filename to prevent overwriting
-    file_uuid = str(uuid.uuid4())
     ext = secure_name.rsplit('.', 1)[1].lower() if '.' in secure_name else ''
-    unique_filename = f"{file_uuid}.{ext}" if ext else file_uuid
-    
-    # Create a temporary file
-    temp_path = os.path.join(TEMP_FOLDER, unique_filename)
     
+    sink = getattr(file, "stream", None)
     try:
-        # Save the file to temp folder
-        file.save(temp_path)
+        if not isinstance(sink, IngestFile) or sink.ext != ext:
+            # Not parsed by IngestRequest (or renamed): stream it through a sink now
+            source, sink = getattr(file, "stream", file), IngestFile(secure_name)
+            for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+                sink.write(chunk)
         
         # Validate the file
-        is_valid, error_message = validate_file(temp_path, secure_name)
+        is_valid, error_message = sink.finish()
         if not is_valid:
-            # Clean up invalid file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            sink.close()
             return False, error_message, {}
         
-        # Calculate file hash
-        file_hash = calculate_file_hash(temp_path)
-        
-        # Move file to upload folder
-        upload_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        shutil.move(temp_path, upload_path)
-        
-        # Create metadata
-        metadata = {
-            "original_filename": original_filename,
-            "secure_filename": secure_name,
-            "storage_filename": unique_filename,
-            "file_path": upload_path,
-            "relative_path": unique_filename,
-            "file_size": os.path.getsize(upload_path),
-            "mime_type": detect_mimetype(upload_path),
-            "file_hash": file_hash,
-            "file_ext": ext,
-            "upload_date": datetime.datetime.now().isoformat()
-        }
-        
-        return True, upload_path, metadata
+        metadata = store_validated_file(sink.seal(), original_filename, sink.size, sink.mime_type, sink.file_hash)
+        return True, metadata["file_path"], metadata
         
     except Exception as e:
         # Clean up on error
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        if isinstance(sink, IngestFile):
+            sink.close()
+            if os.path.exists(sink.path):
+                os.remove(sink.path)  # Sealed but not yet taken by the blob store
         logging.error(f"File upload error: {str(e)}")
         return False, f"Error saving file: {str(e)}", {}
 
+def store_validated_file(source_path: str, original_filename: str, file_size: int,
+                         mime_type: str, file_hash: str) -> Dict:
+    """
+    Move a validated file into the blob store and describe it.
+
+    Args:
+        source_path (str): Finished temporary file, on the same filesystem as UPLOAD_FOLDER
+        original_filename (str): Filename as uploaded
+        file_size (int): Size in bytes
+        mime_type (str): Validated MIME type
+        file_hash (str): SHA-256 of the content
+
+    Returns:
+        Dict: File metadata as stored with the file
+    """
+    from utils.blob_store import get_blob_store
+
+    # Store the content once per hash
+    upload_path, created = get_blob_store().put(source_path, file_hash)
+    relative_path = os.path.relpath(upload_path, UPLOAD_FOLDER)
+    secure_name = secure_filename(original_filename)
+
+    return {
+        "original_filename": original_filename,
+        "secure_filename": secure_name,
+        "storage_filename": relative_path,
+        "file_path": upload_path,
+        "relative_path": relative_path,
+        "storage": "blob",
+        "deduplicated": not created,
+        "file_size": file_size,
+        "mime_type": mime_type,
+        "file_hash": file_hash,
+        "file_ext": secure_name.rsplit('.', 1)[1].lower() if '.' in secure_name else '',
+        "upload_date": datetime.datetime.now().isoformat()
+    }
+
 def calculate_file_hash(file_path: str) -> str:
     """
     Calculate SHA-256 hash of a file.
@@ -273,6 +508,26 @@ def calculate_file_hash(file_path: str) -> str:
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
+def release_stored_file(metadata: Dict):
+    """
+    Give up the storage of a saved file.
+
+    Files in the blob store drop their reference, so content shared with
+    other uploads stays. Files stored before the blob store are deleted.
+
+    Args:
+        metadata (Dict): Metadata returned by save_uploaded_file or stored with the file
+    """
+    if metadata.get("storage") == "blob":
+        from utils.blob_store import get_blob_store
+        get_blob_store().release(metadata["file_hash"])
+        return
+    storage_filename = metadata.get("storage_filename")
+    if storage_filename:
+        file_path = os.path.join(UPLOAD_FOLDER, storage_filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
 def store_file_metadata(user_id: str, metadata: Dict) -> str:
     """
     Store file metadata in the database.
@@ -405,11 +660,6 @@ def delete_file(file_id: str, user_id: str) -> bool:
         if not storage_filename:
             return False
             
-        # Delete from filesystem
-        file_path = os.path.join(UPLOAD_FOLDER, storage_filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
         # Delete from database
         response = supabase.table("files").delete().eq("id", file_id).execute()
         
@@ -417,6 +667,20 @@ def delete_file(file_id: str, user_id: str) -> bool:
             logging.error(f"Error deleting file metadata: {response.error}")
             return False
             
+        # Release the stored content only once nothing refers to it from the database
+        release_stored_file({
+            **(file_data.get("metadata") or {}),
+            "storage_filename": storage_filename,
+            "file_hash": file_data.get("file_hash")
+        })
+            
+        # Drop the file's chunks from the vector index in the background
+        try:
+            from utils.tasks import delete_file_vectors
+            delete_file_vectors.delay(file_id, user_id)
+        except Exception as e:
+            logging.error(f"Error scheduling vector deletion for file {file_id}: {str(e)}")
+            
         return True
             
     except Exception as e:
@@ -0,0 +1,285 @@
+# File: lobo/backend/utils/inference_scheduler.py
+# Enhancement: Tier-prioritized inference scheduler with per-model concurrency caps and load shedding
+
+import os
+import time
+import heapq
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", 4))  # generations the model server runs at once
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", 1))  # web and worker processes sharing the model server
+INFERENCE_MAX_CONCURRENCY = int(os.getenv(
+    "INFERENCE_MAX_CONCURRENCY", max(1, OLLAMA_NUM_PARALLEL // max(1, INFERENCE_PROCESSES))
+))  # per process
+INFERENCE_MAX_QUEUE_DEPTH = int(os.getenv("INFERENCE_MAX_QUEUE_DEPTH", 64))
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", 30))  # default seconds a request may wait
+
+# Prefetching and other speculative work runs after every user-facing tier, guests included
+BACKGROUND_TIER = "background"
+
+class SchedulerRejected(Exception):
+    """Raised when a generation request is not admitted."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class SchedulerOverloaded(SchedulerRejected):
+    """Raised when the model's queue is full (backpressure)."""
+
+class DeadlineExceeded(SchedulerRejected):
+    """Raised when a request is shed because its deadline passed while queued."""
+
+def tier_priorities() -> Dict[str, int]:
+    """
+    Get the scheduling priority of each subscription tier (lower runs first).
+
+    Tiers are ranked by monthly price in SUBSCRIPTION_TIERS, so adding a
+    tier there is enough to schedule it.
+
+    Returns:
+        Dict[str, int]: Tier name to priority, 0 being the most expensive tier
+    """
+    from routes.subscriptions import SUBSCRIPTION_TIERS
+
+    ranked = sorted(SUBSCRIPTION_TIERS, key=lambda name: -SUBSCRIPTION_TIERS[name].get("monthly_price", 0))
+    return {name: rank for rank, name in enumerate(ranked)}
+
+class GenerationBudget(NamedTuple):
+    """Upper bounds on a single generation."""
+
+    max_tokens: int
+    max_seconds: float
+
+    def clamp(self, max_tokens: int) -> int:
+        """Limit a requested reply length to the budget."""
+        return max(1, min(max_tokens, self.max_tokens))
+
+def tier_budget(tier: Optional[str]) -> GenerationBudget:
+    """
+    Get the generation budget of a subscription tier.
+
+    Budgets come from `max_output_tokens` and `max_generation_seconds` in
+    SUBSCRIPTION_TIERS. Callers outside the paid tiers (guests, background
+    jobs) get the free tier's budget.
+
+    Args:
+        tier (str, optional): Subscription tier
+
+    Returns:
+        GenerationBudget: Token and time limits for one reply
+    """
+    from routes.subscriptions import SUBSCRIPTION_TIERS
+
+    info = SUBSCRIPTION_TIERS.get(tier) or SUBSCRIPTION_TIERS["free"]
+    return GenerationBudget(info.get("max_output_tokens", 512), float(info.get("max_generation_seconds", 30)))
+
+class _Waiter:
+    """A queued request waiting for a slot."""
+
+    __slots__ = ("tier", "deadline", "enqueued_at", "admitted", "event")
+
+    def __init__(self, tier: str, deadline: float):
+        self.tier = tier
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.event = threading.Event()
+
+class _ModelQueue:
+    """Slots and the priority queue of one model."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.in_flight = 0
+        self.heap: List = []
+        self.depth = 0
+        self.stats = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_overload": 0,
+            "shed_deadline": 0,
+            "peak_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+class InferenceScheduler:
+    """
+    Admission control for model generations.
+
+    Each model gets at most `max_concurrency` concurrent generations in this
+    process. The cap is per process, not global: with several web and worker
+    processes, size it so their caps add up to what the model server runs at
+    once (by default OLLAMA_NUM_PARALLEL divided by INFERENCE_PROCESSES).
+    Further requests wait in a priority queue ordered by
+    subscription tier, then arrival. A request is rejected immediately when
+    `max_queue_depth` requests are already waiting, and shed if its deadline
+    passes before a slot frees up, so a spike turns into fast 503s rather
+    than an ever-growing backlog on the model server.
+    """
+
+    def __init__(self, max_concurrency: int = INFERENCE_MAX_CONCURRENCY,
+                 max_queue_depth: int = INFERENCE_MAX_QUEUE_DEPTH,
+                 queue_timeout: float = INFERENCE_QUEUE_TIMEOUT,
+                 model_concurrency: Optional[Dict[str, int]] = None,
+                 priorities: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self.model_concurrency = model_concurrency or {}
+        self._priorities = priorities
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def priority(self, tier: str) -> int:
+        """Get a tier's priority; guests and unknown tiers run after paid tiers, background work last."""
+        if self._priorities is None:
+            self._priorities = tier_priorities()
+        if tier == BACKGROUND_TIER:
+            return len(self._priorities) + 1
+        return self._priorities.get(tier, len(self._priorities))
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = _ModelQueue(self.model_concurrency.get(model, self.max_concurrency))
+            self._queues[model] = queue
+        return queue
+
+    def _admit(self, queue: _ModelQueue, waiter: _Waiter):
+        waited = time.monotonic() - waiter.enqueued_at
+        queue.in_flight += 1
+        queue.stats["admitted"] += 1
+        queue.stats["total_wait_seconds"] += waited
+        queue.stats["max_wait_seconds"] = max(queue.stats["max_wait_seconds"], waited)
+        waiter.admitted = True
+        waiter.event.set()
+
+    def _dispatch(self, queue: _ModelQueue):
+        """Hand free slots to the highest-priority waiters whose deadline has not passed."""
+        now = time.monotonic()
+        while queue.heap and queue.in_flight < queue.max_concurrency:
+            _, _, waiter = heapq.heappop(queue.heap)
+            if waiter.event.is_set():
+                continue  # Already shed by its own timeout
+            queue.depth -= 1
+            if waiter.deadline <= now:
+                queue.stats["shed_deadline"] += 1
+                waiter.event.set()
+                continue
+            self._admit(queue, waiter)
+
+    def acquire(self, model: str, tier: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a generation slot.
+
+        Args:
+            model (str): Model the request will run on
+            tier (str, optional): Subscription tier of the requesting user
+            timeout (float, optional): Seconds the request may wait, defaults to `queue_timeout`
+
+        Raises:
+            SchedulerOverloaded: If the model's queue is full
+            DeadlineExceeded: If no slot became free before the deadline
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        waiter = _Waiter(tier or "guest", time.monotonic() + timeout)
+
+        with self._lock:
+            queue = self._queue(model)
+            if queue.in_flight < queue.max_concurrency and not queue.depth:
+                self._admit(queue, waiter)
+                return
+
+            if queue.depth >= self.max_queue_depth:
+                queue.stats["rejected_overload"] += 1
+                raise SchedulerOverloaded(f"Inference queue for {model} is full", retry_after=max(1, int(timeout)))
+
+            heapq.heappush(queue.heap, (self.priority(waiter.tier), next(self._sequence), waiter))
+            queue.depth += 1
+            queue.stats["peak_queue_depth"] = max(queue.stats["peak_queue_depth"], queue.depth)
+
+        waiter.event.wait(max(0.0, timeout))
+
+        with self._lock:
+            if waiter.admitted:
+                return
+            if not waiter.event.is_set():
+                # Timed out while still queued: drop it from the depth count
+                waiter.event.set()
+                queue.depth -= 1
+                queue.stats["shed_deadline"] += 1
+
+        logging.warning(f"Shed {waiter.tier} request for {model} after {timeout:.1f}s in queue")
+        raise DeadlineExceeded(f"Inference request for {model} timed out in queue")
+
+    def release(self, model: str):
+        """Return a generation slot and admit the next waiter."""
+        with self._lock:
+            queue = self._queue(model)
+            queue.in_flight = max(0, queue.in_flight - 1)
+            queue.stats["completed"] += 1
+            self._dispatch(queue)
+
+    @contextmanager
+    def slot(self, model: str, tier: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold a generation slot for the duration of a block.
+
+        Args:
+            model (str): Model the request will run on
+            tier (str, optional): Subscription tier of the requesting user
+            timeout (float, optional): Seconds the request may wait for the slot
+        """
+        self.acquire(model, tier, timeout)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get per-model queue metrics for this process.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Current queue depth and in-flight count plus cumulative counters
+        """
+        with self._lock:
+            stats = {}
+            for model, queue in self._queues.items():
+                model_stats = dict(queue.stats)
+                model_stats["queue_depth"] = queue.depth
+                model_stats["in_flight"] = queue.in_flight
+                model_stats["max_concurrency"] = queue.max_concurrency
+                model_stats["avg_wait_seconds"] = (
+                    queue.stats["total_wait_seconds"] / queue.stats["admitted"] if queue.stats["admitted"] else 0.0
+                )
+                stats[model] = model_stats
+            return stats
+
+# Process-wide scheduler
+_scheduler: Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_inference_scheduler() -> InferenceScheduler:
+    """Get the process-wide inference scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = InferenceScheduler()
+    return _scheduler
+
+def get_inference_stats() -> Dict[str, Dict[str, float]]:
+    """Get queue-depth and shedding metrics of the process-wide scheduler."""
+    return get_inference_scheduler().get_stats()
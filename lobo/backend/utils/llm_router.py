@@ -0,0 +1,228 @@
+# File: lobo/backend/utils/llm_router.py
+# Enhancement: Latency-aware routing of generations across several Ollama hosts with failover
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+from utils.ollama_client import OLLAMA_HOST, OllamaClient, OllamaError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", 0.3))  # weight of the newest latency sample
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", 3))  # consecutive failures before ejection
+ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", 30))  # seconds an ejected backend is skipped
+
+class Backend:
+    """One Ollama host and what the router has observed about it."""
+
+    def __init__(self, host: str, client: OllamaClient):
+        self.host = host
+        self.client = client
+        self.ewma: Optional[float] = None  # seconds to first token
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+class LLMRouter:
+    """
+    Spreads generations over several Ollama hosts.
+
+    Each request goes to the healthy backend with the lowest expected wait:
+    its EWMA time to first token multiplied by the number of requests this
+    process already has in flight there. Time to first token includes the
+    backend's own queueing, so a busy or slow box is picked less often
+    without any coordination between workers.
+
+    A request that fails before producing output is retried on the next
+    best backend. A backend that fails `failure_threshold` times in a row is
+    skipped for `cooldown` seconds, then gets traffic again and is ejected
+    once more if it still fails. A stream that already produced tokens is
+    never moved, since the caller has consumed them.
+
+    The router has the same chat/stream_chat interface as OllamaClient.
+    """
+
+    def __init__(self, hosts: Optional[List[str]] = None, alpha: float = ROUTER_EWMA_ALPHA,
+                 failure_threshold: int = ROUTER_FAILURE_THRESHOLD, cooldown: float = ROUTER_COOLDOWN,
+                 **client_kwargs):
+        hosts = hosts or OLLAMA_HOSTS
+        if len(hosts) > 1:
+            # Failing over to another host beats retrying the one that just failed
+            client_kwargs.setdefault("max_retries", 0)
+        self.backends = [Backend(host, OllamaClient(host=host, **client_kwargs)) for host in hosts]
+        self.alpha = alpha
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Selection and bookkeeping
+    # ------------------------------------------------------------------
+
+    def _score(self, backend: Backend, default_latency: float) -> float:
+        latency = backend.ewma if backend.ewma is not None else default_latency
+        return latency * (backend.in_flight + 1)
+
+    def _acquire(self, exclude: List[Backend]) -> Optional[Backend]:
+        """Pick the best untried backend and count the request against it."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            if not candidates:
+                return None
+            healthy = [b for b in candidates if b.healthy(now)]
+            if healthy:
+                known = [b.ewma for b in self.backends if b.ewma is not None]
+                # Unmeasured backends are assumed fast so they get traffic and a first sample
+                default_latency = min(known) / 2 if known else 1.0
+                backend = min(healthy, key=lambda b: (self._score(b, default_latency), random.random()))
+            else:
+                # Everything left is ejected: try the one that comes back first rather than fail outright
+                backend = min(candidates, key=lambda b: b.ejected_until)
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def _release(self, backend: Backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def _observe(self, backend: Backend, seconds: float):
+        with self._lock:
+            if backend.ewma is None:
+                backend.ewma = seconds
+            else:
+                backend.ewma = self.alpha * seconds + (1 - self.alpha) * backend.ewma
+            backend.consecutive_failures = 0
+            backend.ejected_until = 0.0
+
+    def _fail(self, backend: Backend):
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failure_threshold:
+                backend.ejected_until = time.monotonic() + self.cooldown
+                logging.warning(f"LLM backend {backend.host} ejected for {self.cooldown:.0f}s "
+                                f"after {backend.consecutive_failures} failures")
+
+    # ------------------------------------------------------------------
+    # OllamaClient interface
+    # ------------------------------------------------------------------
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                    keep_alive=None, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from the best available backend.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+            timeout (float, optional): Seconds the whole stream may take, failovers included
+
+        Yields:
+            Dict[str, Any]: Response chunks as sent by Ollama
+
+        Raises:
+            OllamaError: If every backend failed
+            TimeoutError: If the stream ran longer than `timeout`
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        tried: List[Backend] = []
+        last_error: Optional[OllamaError] = None
+
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise last_error or OllamaError("No LLM backend is configured")
+            tried.append(backend)
+
+            start = time.monotonic()
+            produced = False
+            try:
+                remaining = deadline - start if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Generation timed out while failing over")
+                for chunk in backend.client.stream_chat(model, messages, options, keep_alive, remaining):
+                    if not produced:
+                        self._observe(backend, time.monotonic() - start)
+                        produced = True
+                    yield chunk
+                return
+            except OllamaError as e:
+                self._fail(backend)
+                if produced:
+                    raise
+                last_error = e
+                logging.warning(f"LLM backend {backend.host} failed, trying another: {str(e)}")
+            finally:
+                self._release(backend)
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+             keep_alive=None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run a chat completion on the best available backend and return the whole reply.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+            timeout (float, optional): Seconds the reply may take, failovers included
+
+        Returns:
+            Dict[str, Any]: The final response with the full `message`
+        """
+        parts, final = [], {}
+        for chunk in self.stream_chat(model, messages, options, keep_alive, timeout):
+            parts.append(chunk.get("message", {}).get("content", ""))
+            final = chunk
+        final = dict(final)
+        final["message"] = {"role": "assistant", "content": "".join(parts)}
+        return final
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get latency, load and health of each backend as seen by this process."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                backend.host: {
+                    "healthy": backend.healthy(now),
+                    "ewma_ms": round(backend.ewma * 1000, 2) if backend.ewma is not None else None,
+                    "in_flight": backend.in_flight,
+                    "requests": backend.requests,
+                    "failures": backend.failures,
+                    "consecutive_failures": backend.consecutive_failures,
+                    "client": backend.client.get_stats()
+                }
+                for backend in self.backends
+            }
+
+# Process-wide router
+_llm_router: Optional[LLMRouter] = None
+_llm_router_lock = threading.Lock()
+
+def get_llm_router() -> LLMRouter:
+    """Get the process-wide LLM router over OLLAMA_HOSTS, creating it on first use."""
+    global _llm_router
+    if _llm_router is None:
+        with _llm_router_lock:
+            if _llm_router is None:
+                _llm_router = LLMRouter()
+    return _llm_router
+
+def get_llm_router_stats() -> Dict[str, Dict[str, Any]]:
+    """Get per-backend routing statistics for this process."""
+    return get_llm_router().get_stats()
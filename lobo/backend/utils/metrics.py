@@ -0,0 +1,80 @@
+# File: lobo/backend/utils/metrics.py
+# Enhancement: In-process latency percentiles for hot paths
+
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+import numpy as np
+
+# Configuration
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", 1000))  # samples kept per metric
+
+class LatencyTracker:
+    """
+    Rolling window of latency samples for one operation.
+
+    Percentiles are computed over the last `window` samples, so they follow
+    the current load instead of averaging over the whole process lifetime.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=max(1, window))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """Record one duration in seconds."""
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarize the current window.
+
+        Returns:
+            Dict[str, float]: Sample count and p50/p90/p99/max latency in milliseconds
+        """
+        with self._lock:
+            samples = np.array(self._samples, dtype=np.float64)
+            count = self._count
+        if not len(samples):
+            return {"count": count, "p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+        return {
+            "count": count,
+            "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(samples.max() * 1000), 2)
+        }
+
+# Process-wide trackers by operation name
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    """Get the process-wide tracker for an operation, creating it on first use."""
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(name, LatencyTracker())
+    return tracker
+
+def record_latency(name: str, seconds: float):
+    """Record a duration for an operation."""
+    get_latency_tracker(name).record(seconds)
+
+def get_latency_stats(name: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Get latency percentiles of one or all tracked operations.
+
+    Args:
+        name (str, optional): Operation name; all operations if omitted
+
+    Returns:
+        Dict[str, Dict[str, float]]: Summary per operation
+    """
+    names = [name] if name else list(_trackers)
+    return {n: get_latency_tracker(n).summary() for n in names}
@@ -0,0 +1,356 @@
+# File: lobo/backend/utils/model_pool.py
+# Enhancement: Warm model pool with preloading, keep-alive pings and LRU residency shared across processes
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import httpx
+from utils.context_builder import CONTEXT_WINDOW
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:1.5b")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # sent with every load, ping and generation
+MODEL_POOL_ENABLED = os.getenv("MODEL_POOL_ENABLED", "True").lower() == "true"
+MODEL_POOL_MODELS = [m.strip() for m in os.getenv("MODEL_POOL_MODELS", OLLAMA_MODEL).split(",") if m.strip()]
+MODEL_POOL_MAX_RESIDENT = int(os.getenv("MODEL_POOL_MAX_RESIDENT", 2))  # models kept loaded at once
+MODEL_POOL_PING_INTERVAL = float(os.getenv("MODEL_POOL_PING_INTERVAL", 240))  # seconds, below OLLAMA_KEEP_ALIVE
+MODEL_POOL_LOAD_TIMEOUT = float(os.getenv("MODEL_POOL_LOAD_TIMEOUT", 300))
+MODEL_POOL_CONNECT_TIMEOUT = float(os.getenv("MODEL_POOL_CONNECT_TIMEOUT", 5))
+MODEL_POOL_RETRY_INTERVAL = float(os.getenv("MODEL_POOL_RETRY_INTERVAL", 30))  # seconds before retrying a failed load
+MODEL_POOL_EVICT_IDLE = float(os.getenv("MODEL_POOL_EVICT_IDLE", 300))  # seconds unused before a model may be unloaded
+
+class ModelPool:
+    """
+    Keeps a bounded set of Ollama models loaded in memory.
+
+    Ollama unloads a model once its keep-alive expires, and the next request
+    pays for a cold load. The pool loads models ahead of use and pings the
+    resident ones before their keep-alive runs out; `keep_models_warm` does
+    both from a periodic Celery task, so only one process does it.
+
+    Every web and worker process generates on the same Ollama host, so the
+    last use of each model is recorded in Redis. When a new model would
+    exceed `max_resident` models loaded in Ollama, the least recently used
+    one is unloaded, but only if no process has used it for `evict_idle`
+    seconds, long enough for any generation on it to have finished.
+    Without Redis nothing is unloaded and Ollama's own limits apply.
+
+    Loads and unloads go through Ollama's `/api/generate` with an empty
+    prompt, which only changes residency and generates nothing.
+    """
+
+    def __init__(self, host: str = OLLAMA_HOST, max_resident: int = MODEL_POOL_MAX_RESIDENT,
+                 keep_alive: str = OLLAMA_KEEP_ALIVE, timeout: float = MODEL_POOL_LOAD_TIMEOUT,
+                 redis_client=None, evict_idle: float = MODEL_POOL_EVICT_IDLE, num_ctx: int = CONTEXT_WINDOW):
+        self.host = host.rstrip("/")
+        self.max_resident = max(1, max_resident)
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.redis = redis_client
+        self.evict_idle = evict_idle
+        self._usage_key = f"model_pool:last_used:{self.host}"
+        self._client = httpx.Client(base_url=self.host, timeout=httpx.Timeout(timeout, connect=MODEL_POOL_CONNECT_TIMEOUT))
+
+        self._resident: "OrderedDict[str, float]" = OrderedDict()  # model -> last use, least recent first
+        self._loading: Dict[str, threading.Event] = {}
+        self._failed: Dict[str, float] = {}  # model -> time of the last failed load
+        self._lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    # ------------------------------------------------------------------
+    # Ollama calls
+    # ------------------------------------------------------------------
+
+    def _set_keep_alive(self, model: str, keep_alive) -> Dict:
+        request = {"model": model, "prompt": "", "keep_alive": keep_alive}
+        if keep_alive != 0:
+            # Load with the generations' context size, or Ollama reloads the model on the next chat
+            request["options"] = {"num_ctx": self.num_ctx}
+        response = self._client.post("/api/generate", json=request)
+        response.raise_for_status()
+        return response.json()
+
+    def _server_models(self) -> List[str]:
+        """Models Ollama currently holds in memory."""
+        response = self._client.get("/api/ps")
+        response.raise_for_status()
+        return [entry.get("name") or entry.get("model") for entry in response.json().get("models", [])]
+
+    def _record(self, model: str, kind: str, seconds: float):
+        from utils.metrics import record_latency
+
+        record_latency(f"model_{kind}", seconds)
+        with self._stats_lock:
+            stats = self._stats.setdefault(model, {"loads": 0, "unloads": 0, "pings": 0,
+                                                   "last_load_ms": 0.0, "total_load_ms": 0.0,
+                                                   "last_unload_ms": 0.0})
+            stats[f"{kind}s"] += 1
+            if kind == "load":
+                stats["last_load_ms"] = round(seconds * 1000, 2)
+                stats["total_load_ms"] += seconds * 1000
+            elif kind == "unload":
+                stats["last_unload_ms"] = round(seconds * 1000, 2)
+
+    # ------------------------------------------------------------------
+    # Use shared between processes
+    # ------------------------------------------------------------------
+
+    def record_use(self, model: str):
+        """Record that this process is about to generate with a model, protecting it from eviction."""
+        if self.redis is None:
+            return
+        try:
+            self.redis.zadd(self._usage_key, {model: time.time()})
+        except Exception as e:
+            logging.warning(f"Could not record use of model {model}: {str(e)}")
+
+    def _victims(self, model: str) -> List[str]:
+        """
+        Pick the models to unload before loading another one.
+
+        Candidates are the models Ollama holds, whoever loaded them, least
+        recently used first according to the shared record; a model used by
+        any process within `evict_idle` seconds is never picked.
+        """
+        if self.redis is None:
+            return []
+        try:
+            loaded = self._server_models()
+            if model in loaded:
+                return []
+            excess = len(loaded) + 1 - self.max_resident
+            if excess <= 0:
+                return []
+            last_used = {m: self.redis.zscore(self._usage_key, m) or 0.0 for m in loaded}
+        except Exception as e:
+            logging.warning(f"Could not check which models to unload: {str(e)}")
+            return []
+
+        cutoff = time.time() - self.evict_idle
+        idle = sorted((m for m in loaded if last_used[m] <= cutoff), key=last_used.get)
+        if len(idle) < excess:
+            logging.info(f"Loading {model} without unloading models still in use")
+        return idle[:excess]
+
+    # ------------------------------------------------------------------
+    # Residency
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self, model: str, record_use: bool = True) -> bool:
+        """
+        Make sure a model is loaded, evicting the least recently used one if needed.
+
+        A resident model costs a dictionary update and one Redis write.
+        Concurrent callers for a model that is still loading wait for that
+        load instead of starting another one.
+
+        Args:
+            model (str): Model name
+            record_use (bool): Count this as use of the model, which protects it from eviction
+
+        Returns:
+            bool: True if the model is resident
+        """
+        if record_use:
+            self.record_use(model)
+        with self._lock:
+            if model in self._resident:
+                self._resident[model] = time.time()
+                self._resident.move_to_end(model)
+                return True
+            if time.monotonic() - self._failed.get(model, float("-inf")) < MODEL_POOL_RETRY_INTERVAL:
+                # An unreachable host should not add a connect timeout to every request
+                return False
+            loading = self._loading.get(model)
+            if loading is None:
+                self._loading[model] = threading.Event()
+
+        if loading is not None:
+            loading.wait(self._client.timeout.read)
+            with self._lock:
+                return model in self._resident
+
+        try:
+            # Make room first so two large models never need memory at the same time
+            for victim in self._victims(model):
+                self.unload(victim)
+            return self._load(model)
+        finally:
+            with self._lock:
+                self._loading.pop(model).set()
+
+    def _load(self, model: str) -> bool:
+        start = time.perf_counter()
+        try:
+            result = self._set_keep_alive(model, self.keep_alive)
+        except Exception as e:
+            logging.error(f"Error loading model {model} on {self.host}: {str(e)}")
+            with self._lock:
+                self._failed[model] = time.monotonic()
+            return False
+
+        elapsed = time.perf_counter() - start
+        self._record(model, "load", elapsed)
+        with self._lock:
+            self._failed.pop(model, None)
+            self._resident[model] = time.time()
+            self._resident.move_to_end(model)
+
+        # load_duration (ns) is reported by Ollama and is near zero when the model was already loaded
+        reported = result.get("load_duration", 0) / 1e9
+        logging.info(f"Model {model} ready in {elapsed * 1000:.0f} ms (Ollama load {reported * 1000:.0f} ms)")
+        return True
+
+    def unload(self, model: str) -> bool:
+        """
+        Unload a model from Ollama.
+
+        Args:
+            model (str): Model name
+
+        Returns:
+            bool: True if the model was unloaded
+        """
+        with self._lock:
+            self._resident.pop(model, None)
+
+        start = time.perf_counter()
+        try:
+            self._set_keep_alive(model, 0)
+        except Exception as e:
+            logging.error(f"Error unloading model {model}: {str(e)}")
+            return False
+
+        self._record(model, "unload", time.perf_counter() - start)
+        logging.info(f"Unloaded model {model}")
+        return True
+
+    def preload(self, models: Optional[List[str]] = None) -> Dict[str, bool]:
+        """
+        Load models ahead of the first request.
+
+        Args:
+            models (List[str], optional): Models to load, most important first;
+                defaults to MODEL_POOL_MODELS. Only the first `max_resident` are loaded.
+
+        Returns:
+            Dict[str, bool]: Whether each model was loaded
+        """
+        models = (models or MODEL_POOL_MODELS)[:self.max_resident]
+        # Load in reverse so the most important model ends up most recently used;
+        # keeping a model warm is not use, so it can still be evicted for a model in demand
+        return {model: self.ensure_loaded(model, record_use=False) for model in reversed(models)}
+
+    def ping(self) -> Dict[str, bool]:
+        """
+        Refresh the keep-alive of every resident model.
+
+        Models Ollama has dropped on its own (expired keep-alive, restart or
+        another client unloading them) are removed from the pool first, so
+        the next request reloads them instead of assuming they are warm.
+
+        Returns:
+            Dict[str, bool]: Whether each resident model answered the ping
+        """
+        try:
+            loaded = set(self._server_models())
+            with self._lock:
+                for model in [m for m in self._resident if m not in loaded]:
+                    logging.warning(f"Model {model} is no longer loaded in Ollama")
+                    del self._resident[model]
+        except Exception as e:
+            logging.warning(f"Could not list loaded models: {str(e)}")
+
+        with self._lock:
+            resident = list(self._resident)
+
+        results = {}
+        for model in resident:
+            start = time.perf_counter()
+            try:
+                # Pinging does not count as use, so it never changes the LRU order
+                self._set_keep_alive(model, self.keep_alive)
+                self._record(model, "ping", time.perf_counter() - start)
+                results[model] = True
+            except Exception as e:
+                logging.warning(f"Keep-alive ping for {model} failed: {str(e)}")
+                results[model] = False
+        return results
+
+    def get_stats(self) -> Dict[str, object]:
+        """Get the resident models and load/unload timings per model."""
+        with self._lock:
+            resident = [{"model": model, "last_used": last_used} for model, last_used in self._resident.items()]
+        with self._stats_lock:
+            models = {}
+            for model, stats in self._stats.items():
+                models[model] = {k: v for k, v in stats.items() if k != "total_load_ms"}
+                models[model]["avg_load_ms"] = round(stats["total_load_ms"] / stats["loads"], 2) if stats["loads"] else 0.0
+        return {"max_resident": self.max_resident, "resident": resident, "models": models}
+
+# Process-wide model pools, one per Ollama host
+_model_pools: Dict[str, ModelPool] = {}
+_model_pool_lock = threading.Lock()
+
+def get_model_pool(host: str = OLLAMA_HOST) -> ModelPool:
+    """Get the process-wide model pool of a host, creating it on first use."""
+    pool = _model_pools.get(host)
+    if pool is None:
+        with _model_pool_lock:
+            pool = _model_pools.get(host)
+            if pool is None:
+                from utils.cache import redis_client, is_redis_available
+                client = redis_client if is_redis_available() else None
+                if client is None:
+                    logging.warning("Redis is not available, models are never unloaded by the pool")
+                pool = _model_pools[host] = ModelPool(host, redis_client=client)
+    return pool
+
+def _hosts() -> List[str]:
+    from utils.llm_router import OLLAMA_HOSTS
+    return OLLAMA_HOSTS
+
+def keep_models_warm() -> Dict[str, Dict[str, bool]]:
+    """
+    Load the configured models on every Ollama host and refresh their keep-alive.
+
+    Run it from one place only, the periodic `keep_models_warm` Celery task,
+    every MODEL_POOL_PING_INTERVAL seconds.
+
+    Returns:
+        Dict[str, Dict[str, bool]]: Per host, whether each model is loaded and answered the ping
+    """
+    if not MODEL_POOL_ENABLED:
+        return {}
+    results = {}
+    for host in _hosts():
+        pool = get_model_pool(host)
+        pool.preload()
+        results[host] = pool.ping()
+    return results
+
+def record_model_use(model: str):
+    """
+    Record that a generation is about to use a model, so no process unloads it meanwhile.
+
+    Only a Redis write per host: loading is left to the `keep_models_warm`
+    task, or to Ollama on the host the router picks, inside the request's
+    scheduler slot and time budget. A no-op when the pool is disabled.
+    """
+    if not MODEL_POOL_ENABLED:
+        return
+    for host in _hosts():
+        get_model_pool(host).record_use(model)
+
+def get_model_pool_stats() -> Dict[str, object]:
+    """Get model residency and load timings per host for this process."""
+    return {host: get_model_pool(host).get_stats() for host in _hosts()}
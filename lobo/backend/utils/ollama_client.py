@@ -0,0 +1,301 @@
+# File: lobo/backend/utils/ollama_client.py
+# Enhancement: Async Ollama client with a keep-alive connection pool, retries and cancellation
+
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import httpx
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", 64))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", 32))  # idle connections kept open
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))  # max silence between streamed chunks
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", 2))
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", 0.25))  # seconds, doubled per attempt
+OLLAMA_RETRY_BACKOFF_MAX = float(os.getenv("OLLAMA_RETRY_BACKOFF_MAX", 4))
+
+# Status codes worth another attempt: overloaded or restarting server
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+class OllamaError(Exception):
+    """Raised when Ollama cannot serve a request."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class AsyncOllamaClient:
+    """
+    Asynchronous client for Ollama's chat API.
+
+    All requests share one httpx connection pool, so connections stay open
+    between generations instead of being set up per request. Failures
+    before any output (connection errors, timeouts, 429/5xx) are retried
+    with exponential backoff and full jitter, which keeps workers that all
+    saw the same outage from retrying in lockstep. A stream that already
+    produced tokens is never retried, since the caller has consumed them.
+
+    Cancelling the awaiting task closes the HTTP response, and Ollama stops
+    generating for a closed connection.
+    """
+
+    def __init__(self, host: str = OLLAMA_HOST, max_connections: int = OLLAMA_MAX_CONNECTIONS,
+                 max_keepalive: int = OLLAMA_MAX_KEEPALIVE, connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout: float = OLLAMA_READ_TIMEOUT, max_retries: int = OLLAMA_MAX_RETRIES,
+                 backoff: float = OLLAMA_RETRY_BACKOFF, backoff_max: float = OLLAMA_RETRY_BACKOFF_MAX):
+        self.host = host.rstrip("/")
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._client = httpx.AsyncClient(
+            base_url=self.host,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout)
+        )
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "cancelled": 0, "in_flight": 0}
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full-jitter backoff: a random delay up to the exponential cap for this attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    @staticmethod
+    def _payload(model: str, messages: List[Dict[str, str]], stream: bool,
+                 options: Optional[Dict[str, Any]], keep_alive) -> Dict[str, Any]:
+        payload = {"model": model, "messages": messages, "stream": stream}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    async def _check(self, response: httpx.Response):
+        if response.status_code >= 400:
+            body = (await response.aread()).decode("utf-8", "replace")
+            try:
+                message = json.loads(body).get("error", body)
+            except ValueError:
+                message = body
+            raise OllamaError(f"Ollama returned {response.status_code}: {message}", response.status_code)
+
+    def _retryable(self, error: Exception) -> bool:
+        if isinstance(error, OllamaError):
+            return error.status_code in RETRYABLE_STATUS
+        return isinstance(error, httpx.TransportError)
+
+    async def stream_chat(self, model: str, messages: List[Dict[str, str]],
+                          options: Optional[Dict[str, Any]] = None,
+                          keep_alive=None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options such as num_ctx
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+
+        Yields:
+            Dict[str, Any]: Response chunks as sent by Ollama, the last one with `done` set
+
+        Raises:
+            OllamaError: If Ollama fails and retries are exhausted
+        """
+        payload = self._payload(model, messages, True, options, keep_alive)
+        self._stats["requests"] += 1
+        self._stats["in_flight"] += 1
+        attempt = 0
+        try:
+            while True:
+                produced = False
+                try:
+                    async with self._client.stream("POST", "/api/chat", json=payload) as response:
+                        await self._check(response)
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise OllamaError(chunk["error"])
+                            produced = True
+                            yield chunk
+                    return
+                except Exception as e:
+                    if produced or attempt >= self.max_retries or not self._retryable(e):
+                        self._stats["failures"] += 1
+                        if isinstance(e, OllamaError):
+                            raise
+                        raise OllamaError(f"Ollama request failed: {e.__class__.__name__}: {str(e)}") from e
+                    delay = self.retry_delay(attempt)
+                    attempt += 1
+                    self._stats["retries"] += 1
+                    logging.warning(f"Ollama request failed ({str(e) or e.__class__.__name__}), "
+                                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        except (asyncio.CancelledError, GeneratorExit):
+            self._stats["cancelled"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+
+    async def chat(self, model: str, messages: List[Dict[str, str]],
+                   options: Optional[Dict[str, Any]] = None, keep_alive=None) -> Dict[str, Any]:
+        """
+        Run a chat completion and return the whole reply.
+
+        The reply is streamed internally, so the read timeout bounds the
+        silence between tokens rather than the full generation time.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+
+        Returns:
+            Dict[str, Any]: The final response with the full `message`, like Ollama's non-streaming reply
+        """
+        parts, final = [], {}
+        async for chunk in self.stream_chat(model, messages, options, keep_alive):
+            parts.append(chunk.get("message", {}).get("content", ""))
+            final = chunk
+        final = dict(final)
+        final["message"] = {"role": "assistant", "content": "".join(parts)}
+        return final
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get request, retry and in-flight counts."""
+        return dict(self._stats)
+
+    async def aclose(self):
+        """Close the connection pool."""
+        await self._client.aclose()
+
+class OllamaClient:
+    """
+    Blocking facade over AsyncOllamaClient for Flask handlers and Celery tasks.
+
+    Every call runs on one event loop thread per process, so all in-flight
+    generations share the loop and the connection pool; a waiting caller
+    holds no socket of its own. Abandoning a stream (closing the iterator,
+    e.g. when the client disconnects) cancels the request on the loop.
+    """
+
+    _DONE = object()
+
+    def __init__(self, **client_kwargs):
+        self._client_kwargs = client_kwargs
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[AsyncOllamaClient] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # A forked worker inherits the object but not the loop thread, so start a fresh one
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True).start()
+                    self._client = AsyncOllamaClient(**self._client_kwargs)
+                    self._loop, self._pid = loop, os.getpid()
+        return self._loop
+
+    @property
+    def async_client(self) -> AsyncOllamaClient:
+        self._ensure_loop()
+        return self._client
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+             keep_alive=None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run a chat completion and wait for the whole reply.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+            timeout (float, optional): Seconds to wait for the reply; the request is cancelled after that
+
+        Returns:
+            Dict[str, Any]: The final response with the full `message`
+
+        Raises:
+            OllamaError: If Ollama fails and retries are exhausted
+            TimeoutError: If the reply took longer than `timeout`
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._client.chat(model, messages, options, keep_alive), loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                    keep_alive=None, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a chat completion.
+
+        Args:
+            model (str): Model name
+            messages (List[Dict[str, str]]): Chat messages with role and content
+            options (Dict[str, Any], optional): Ollama model options
+            keep_alive (optional): How long Ollama keeps the model loaded afterwards
+            timeout (float, optional): Seconds the whole stream may take; the request is cancelled after that
+
+        Yields:
+            Dict[str, Any]: Response chunks as sent by Ollama
+
+        Raises:
+            OllamaError: If Ollama fails and retries are exhausted
+            TimeoutError: If the stream ran longer than `timeout`
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        loop = self._ensure_loop()
+        chunks: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self._client.stream_chat(model, messages, options, keep_alive):
+                    chunks.put(chunk)
+                chunks.put(self._DONE)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                chunks.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=max(0.0, deadline - time.monotonic()) if deadline else None)
+                except queue.Empty:
+                    item = None
+                if item is None or (deadline and time.monotonic() > deadline):
+                    raise TimeoutError(f"Generation exceeded {timeout:.0f}s")
+                if item is self._DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get request, retry and in-flight counts of this process."""
+        if self._client is None:
+            return {"requests": 0, "retries": 0, "failures": 0, "cancelled": 0, "in_flight": 0}
+        return self._client.get_stats()
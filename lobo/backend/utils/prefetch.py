@@ -0,0 +1,193 @@
+# File: lobo/backend/utils/prefetch.py
+# Enhancement: Speculative prefetch of likely follow-up answers into the response cache
+
+import os
+import time
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "False").lower() == "true"
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", 1800))  # seconds between prefetch runs
+PREFETCH_LOOKBACK_DAYS = int(os.getenv("PREFETCH_LOOKBACK_DAYS", 7))
+PREFETCH_MAX_CHATS = int(os.getenv("PREFETCH_MAX_CHATS", 2000))
+PREFETCH_MAX_TOPICS = int(os.getenv("PREFETCH_MAX_TOPICS", 20))  # opening prompts whose follow-ups are prefetched
+PREFETCH_MAX_FOLLOW_UPS = int(os.getenv("PREFETCH_MAX_FOLLOW_UPS", 3))
+PREFETCH_MIN_COUNT = int(os.getenv("PREFETCH_MIN_COUNT", 3))
+PREFETCH_MIN_PROBABILITY = float(os.getenv("PREFETCH_MIN_PROBABILITY", 0.2))
+PREFETCH_IDLE_SECONDS = int(os.getenv("PREFETCH_IDLE_SECONDS", 30))  # quiet time required before prefetching
+
+INTERACTIVE_KEY = "prefetch:interactive"
+_last_mark = 0.0
+
+def mark_interactive():
+    """
+    Note that a user-facing generation is running.
+
+    The flag lives in Redis for PREFETCH_IDLE_SECONDS so prefetch workers in
+    other processes see it. Each process writes it at most once a second.
+    """
+    global _last_mark
+    if not PREFETCH_ENABLED:
+        return
+    now = time.monotonic()
+    if now - _last_mark < 1:
+        return
+    _last_mark = now
+    try:
+        from utils.cache import redis_client
+        redis_client.set(INTERACTIVE_KEY, 1, ex=PREFETCH_IDLE_SECONDS)
+    except Exception as e:
+        logging.debug(f"Could not mark interactive traffic: {e}")
+
+def is_idle(model: str) -> bool:
+    """
+    Check whether the model has spare capacity for speculative work.
+
+    Args:
+        model (str): Model name
+
+    Returns:
+        bool: True if no user-facing generation ran recently and nothing is queued in this process
+    """
+    from utils.inference_scheduler import get_inference_scheduler
+
+    queue = get_inference_scheduler().get_stats().get(model)
+    if queue and (queue["queue_depth"] or queue["in_flight"] >= queue["max_concurrency"]):
+        return False
+    try:
+        from utils.cache import redis_client
+        return not redis_client.exists(INTERACTIVE_KEY)
+    except Exception:
+        # Without the shared flag there is no way to tell, so stay out of the way
+        return False
+
+def mine_follow_ups(chats: List[List[Dict[str, Any]]], max_topics: int = PREFETCH_MAX_TOPICS,
+                    max_follow_ups: int = PREFETCH_MAX_FOLLOW_UPS, min_count: int = PREFETCH_MIN_COUNT,
+                    min_probability: float = PREFETCH_MIN_PROBABILITY) -> List[Dict[str, Any]]:
+    """
+    Find the most common opening prompts and the questions that usually follow them.
+
+    Prompts are compared after normalization. The probability of a
+    follow-up is the share of chats opened with that prompt whose second
+    user message was the follow-up.
+
+    Args:
+        chats (List[List[Dict[str, Any]]]): Messages of each chat, oldest first
+        max_topics (int): Number of opening prompts to return
+        max_follow_ups (int): Follow-ups kept per opening prompt
+        min_count (int): Minimum number of chats a follow-up must appear in
+        min_probability (float): Minimum probability of a follow-up
+
+    Returns:
+        List[Dict[str, Any]]: Opening prompts, most common first, each with
+        `prompt`, `count` and `follow_ups` (`prompt` and `probability`)
+    """
+    from utils.response_cache import normalize_prompt
+
+    openers, pairs = Counter(), defaultdict(Counter)
+    originals: Dict[str, str] = {}  # normalized prompt -> first phrasing seen
+    for messages in chats:
+        prompts = [m["content"] for m in messages if m.get("role") == "user" and m.get("content")]
+        if not prompts:
+            continue
+        first = normalize_prompt(prompts[0])
+        originals.setdefault(first, prompts[0])
+        openers[first] += 1
+        if len(prompts) > 1:
+            second = normalize_prompt(prompts[1])
+            originals.setdefault(second, prompts[1])
+            pairs[first][second] += 1
+
+    topics = []
+    for first, count in openers.most_common():
+        follow_ups = [
+            {"prompt": originals[second], "probability": round(seen / count, 3)}
+            for second, seen in pairs[first].most_common(max_follow_ups)
+            if seen >= min_count and seen / count >= min_probability
+        ]
+        if follow_ups:
+            topics.append({"prompt": originals[first], "count": count, "follow_ups": follow_ups})
+            if len(topics) >= max_topics:
+                break
+    return topics
+
+def load_recent_chats(days: int = PREFETCH_LOOKBACK_DAYS, limit: int = PREFETCH_MAX_CHATS) -> List[List[Dict[str, Any]]]:
+    """
+    Load the messages of recently active chats.
+
+    Args:
+        days (int): How far back to look
+        limit (int): Maximum number of chats
+
+    Returns:
+        List[List[Dict[str, Any]]]: Messages of each chat
+    """
+    from utils.database import supabase
+
+    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    response = supabase.table("chat_history") \
+        .select("messages") \
+        .gte("updated_at", since) \
+        .order("updated_at", desc=True) \
+        .limit(limit) \
+        .execute()
+    return [row.get("messages") or [] for row in response.data or []]
+
+def prefetch_follow_ups(topics: List[Dict[str, Any]], chatbot,
+                        idle: Optional[Callable[[], bool]] = None) -> Dict[str, int]:
+    """
+    Generate answers to likely follow-ups into the response cache.
+
+    For each opening prompt the shared (cached) first answer is produced if
+    needed, then each follow-up is answered after that first turn, so a user
+    whose conversation opened the same way gets the second answer from the
+    cache. Generations run at background priority, and the run stops as
+    soon as the model is no longer idle.
+
+    Args:
+        topics (List[Dict[str, Any]]): Output of mine_follow_ups
+        chatbot: Chatbot whose cache and model are used
+        idle (Callable[[], bool], optional): Returns False when user traffic needs the model
+
+    Returns:
+        Dict[str, int]: Counts of generated, already cached and failed answers, and whether the run was interrupted
+    """
+    from utils.inference_scheduler import SchedulerRejected
+
+    stats = {"generated": 0, "cached": 0, "failed": 0, "interrupted": 0}
+
+    def answer(prompt: str, history: Optional[List[Dict[str, str]]] = None) -> Optional[str]:
+        if chatbot.is_cached(prompt, tier="background", history=history):
+            stats["cached"] += 1
+            # Only an opening answer is used afterwards, as the first turn of its follow-ups
+            return chatbot.generate_response(prompt, tier="background") if history is None else None
+        if idle is not None and not idle():
+            raise InterruptedError
+        try:
+            response = chatbot.generate_response(prompt, tier="background", history=history)
+        except SchedulerRejected:
+            raise InterruptedError
+        stats["generated" if response is not None else "failed"] += 1
+        return response
+
+    try:
+        for topic in topics:
+            first_answer = answer(topic["prompt"])
+            if first_answer is None:
+                continue
+            history = [
+                {"role": "user", "content": topic["prompt"]},
+                {"role": "assistant", "content": first_answer}
+            ]
+            for follow_up in topic["follow_ups"]:
+                answer(follow_up["prompt"], history)
+    except InterruptedError:
+        stats["interrupted"] = 1
+        logging.info("Prefetch interrupted by user traffic")
+    return stats
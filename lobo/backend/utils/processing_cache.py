@@ -0,0 +1,144 @@
+# File: lobo/backend/utils/processing_cache.py
+# Enhancement: Reuse of file processing results across uploads of the same content
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+PROCESSING_CACHE_ENABLED = os.getenv("PROCESSING_CACHE_ENABLED", "True").lower() == "true"
+PROCESSING_CACHE_TTL = int(os.getenv("PROCESSING_CACHE_TTL", 30 * 24 * 3600))  # seconds, 0 = never expire
+
+# Bump whenever text extraction or chunking changes, so older results are not reused
+PROCESSOR_VERSION = "1"
+
+def processor_version(mime_type: str) -> str:
+    """
+    Describe everything that shapes the processing result of a file type.
+
+    Args:
+        mime_type (str): MIME type the file is processed as
+
+    Returns:
+        str: Version string; results are only reused between equal versions
+    """
+    from utils.vector_db import CHUNK_OVERLAP, CHUNK_SIZE, OLLAMA_MODEL
+    return f"{PROCESSOR_VERSION}|{mime_type}|{OLLAMA_MODEL}|{CHUNK_SIZE}|{CHUNK_OVERLAP}"
+
+def processing_cache_key(file_hash: str, mime_type: str) -> str:
+    """
+    Build the cache key of a processing result.
+
+    Args:
+        file_hash (str): SHA-256 of the file content
+        mime_type (str): MIME type the file is processed as
+
+    Returns:
+        str: Redis key
+    """
+    version = hashlib.sha256(processor_version(mime_type).encode("utf-8")).hexdigest()[:16]
+    return f"processing:{version}:{file_hash}"
+
+class ProcessingCache:
+    """
+    Processing results of already processed content, shared by all workers.
+
+    An entry records which file was processed (its ID and owner, to find
+    its vectors), whether text and vectors were produced, the processing
+    result and the first 10K characters of the extracted text, i.e. what
+    process_file writes to the `files` row. Only successful runs are
+    stored. Lookup errors count as misses, so a Redis outage only costs
+    the full processing.
+    """
+
+    def __init__(self, client=None, ttl: int = PROCESSING_CACHE_TTL):
+        self._client = client
+        self.ttl = ttl
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from utils.cache import redis_client
+            self._client = redis_client
+        return self._client
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, file_hash: str, mime_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the processing result of a content hash.
+
+        Args:
+            file_hash (str): SHA-256 of the file content
+            mime_type (str): MIME type the file is processed as
+
+        Returns:
+            Dict[str, Any]: Cached result, or None on a miss
+        """
+        try:
+            data = self.client.get(processing_cache_key(file_hash, mime_type))
+            entry = json.loads(data) if data else None
+        except Exception as e:
+            logging.warning(f"Processing cache lookup failed: {str(e)}")
+            entry = None
+        self._count("hits" if entry else "misses")
+        return entry
+
+    def set(self, file_hash: str, mime_type: str, entry: Dict[str, Any]):
+        """
+        Store the processing result of a content hash.
+
+        Args:
+            file_hash (str): SHA-256 of the file content
+            mime_type (str): MIME type the file was processed as
+            entry (Dict[str, Any]): Result to share with later uploads
+        """
+        try:
+            key, data = processing_cache_key(file_hash, mime_type), json.dumps(entry)
+            if self.ttl > 0:
+                self.client.setex(key, self.ttl, data)
+            else:
+                self.client.set(key, data)
+            self._count("stores")
+        except Exception as e:
+            logging.warning(f"Processing cache store failed: {str(e)}")
+
+    def invalidate(self, file_hash: str, mime_type: str):
+        """Forget the processing result of a content hash."""
+        try:
+            self.client.delete(processing_cache_key(file_hash, mime_type))
+        except Exception as e:
+            logging.warning(f"Processing cache invalidation failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get hit, miss and store counts of this process."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+# Process-wide cache
+_processing_cache: Optional[ProcessingCache] = None
+_processing_cache_lock = threading.Lock()
+
+def get_processing_cache() -> Optional[ProcessingCache]:
+    """Get the process-wide processing cache, or None if it is disabled."""
+    global _processing_cache
+    if not PROCESSING_CACHE_ENABLED:
+        return None
+    if _processing_cache is None:
+        with _processing_cache_lock:
+            if _processing_cache is None:
+                _processing_cache = ProcessingCache()
+    return _processing_cache
@@ -0,0 +1,184 @@
+# File: lobo/backend/utils/rag.py
+# Enhancement: Retrieval-augmented generation over the caller's vector shard
+
+import os
+import re
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", 20))  # chunks fetched from the index before reranking
+RAG_MAX_CHUNKS = int(os.getenv("RAG_MAX_CHUNKS", 6))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", 1500))
+RAG_CACHE_TTL = int(os.getenv("RAG_CACHE_TTL", 300))
+RAG_RERANKER = os.getenv("RAG_RERANKER", "")  # cross-encoder model name; empty = lexical rerank
+RAG_LEXICAL_WEIGHT = float(os.getenv("RAG_LEXICAL_WEIGHT", 0.3))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _terms(text: str) -> set:
+    return {word for word in _WORD_RE.findall(text.casefold()) if len(word) > 2}
+
+@lru_cache(maxsize=2)
+def get_reranker(name: str = RAG_RERANKER):
+    """
+    Load the cross-encoder reranker once per process.
+
+    Args:
+        name (str): sentence-transformers cross-encoder model name
+
+    Returns:
+        The cross-encoder, or None to use the lexical reranker
+    """
+    if not name:
+        return None
+    try:
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(name)
+    except Exception as e:
+        logging.warning(f"Could not load reranker {name}, using lexical reranking: {e}")
+        return None
+
+def rerank(query: str, chunks: List[Dict[str, Any]], reranker_name: str = RAG_RERANKER) -> List[Dict[str, Any]]:
+    """
+    Order retrieved chunks by relevance to the query.
+
+    With a cross-encoder configured, each (query, chunk) pair is scored by
+    the model. Otherwise the vector distance is blended with the share of
+    query terms the chunk contains, which lifts exact keyword matches the
+    embedding missed. Duplicate chunk texts are dropped.
+
+    Args:
+        query (str): User query
+        chunks (List[Dict[str, Any]]): Results of search_vectors (text, metadata, score as L2 distance)
+        reranker_name (str): Cross-encoder model name, empty for lexical reranking
+
+    Returns:
+        List[Dict[str, Any]]: Unique chunks, most relevant first, each with a `relevance` score
+    """
+    unique, seen = [], set()
+    for chunk in chunks:
+        if chunk["text"] not in seen:
+            seen.add(chunk["text"])
+            unique.append(dict(chunk))
+    if not unique:
+        return []
+
+    reranker = get_reranker(reranker_name)
+    if reranker is not None:
+        scores = reranker.predict([(query, chunk["text"]) for chunk in unique])
+        for chunk, score in zip(unique, scores):
+            chunk["relevance"] = float(score)
+    else:
+        query_terms = _terms(query)
+        for chunk in unique:
+            similarity = 1.0 / (1.0 + chunk.get("score", 0.0))
+            overlap = len(query_terms & _terms(chunk["text"])) / len(query_terms) if query_terms else 0.0
+            chunk["relevance"] = (1 - RAG_LEXICAL_WEIGHT) * similarity + RAG_LEXICAL_WEIGHT * overlap
+
+    return sorted(unique, key=lambda chunk: chunk["relevance"], reverse=True)
+
+def pack_context(chunks: List[Dict[str, Any]], max_tokens: int = RAG_CONTEXT_TOKENS,
+                 max_chunks: int = RAG_MAX_CHUNKS, counter=None) -> str:
+    """
+    Pack the most relevant chunks into a numbered context block within a token budget.
+
+    Args:
+        chunks (List[Dict[str, Any]]): Reranked chunks, most relevant first
+        max_tokens (int): Token budget for the whole block
+        max_chunks (int): Maximum number of chunks
+        counter (TokenCounter, optional): Token counter, defaults to the process-wide one
+
+    Returns:
+        str: Context block, empty if nothing fits
+    """
+    if counter is None:
+        from utils.context_builder import get_token_counter
+        counter = get_token_counter()
+
+    parts, used = [], 0
+    for chunk in chunks:
+        if len(parts) >= max_chunks:
+            break
+        source = chunk.get("metadata", {}).get("file_name") or chunk.get("metadata", {}).get("file_id") or "document"
+        part = f"[{len(parts) + 1}] ({source})\n{chunk['text'].strip()}"
+        tokens = counter.count(part)
+        if used + tokens > max_tokens:
+            continue  # A shorter chunk further down may still fit
+        parts.append(part)
+        used += tokens
+    return "\n\n".join(parts)
+
+def _retrieval_cache_key(user_id: Optional[str], query: str, filters: Optional[Dict[str, Any]],
+                         revision: str) -> str:
+    from utils.response_cache import normalize_prompt
+    raw = f"{user_id}|{normalize_prompt(query)}|{sorted((filters or {}).items())}|{revision}"
+    return f"rag:{user_id or 'default'}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+def retrieve(query: str, user_id: Optional[str], filters: Optional[Dict[str, Any]] = None,
+             candidates: int = RAG_CANDIDATES) -> List[Dict[str, Any]]:
+    """
+    Retrieve and rerank the caller's most relevant chunks, with caching.
+
+    Results are cached per (user, normalized query, filters) and keyed by the
+    shard revision, so a new upload or deletion invalidates them. Every call,
+    hit or miss, is timed under the `retrieval` latency metric.
+
+    Args:
+        query (str): User query
+        user_id (str, optional): Owner whose shard is searched
+        filters (Dict[str, Any], optional): Metadata filters for search_vectors
+        candidates (int): Number of chunks fetched before reranking
+
+    Returns:
+        List[Dict[str, Any]]: Reranked chunks
+    """
+    from utils.cache import cache_get, cache_set
+    from utils.metrics import record_latency
+    from utils.vector_db import get_index_manager, search_vectors
+
+    start = time.perf_counter()
+    try:
+        key = _retrieval_cache_key(user_id, query, filters, get_index_manager(user_id).revision)
+        cached = cache_get(key)
+        if cached is not None:
+            return cached
+
+        chunks = rerank(query, search_vectors(query, top_k=candidates, user_id=user_id, filters=filters))
+        cache_set(key, chunks, RAG_CACHE_TTL)
+        return chunks
+
+    except Exception as e:
+        logging.error(f"Error retrieving context: {str(e)}")
+        return []
+
+    finally:
+        record_latency("retrieval", time.perf_counter() - start)
+
+def build_rag_context(query: str, user_id: Optional[str], filters: Optional[Dict[str, Any]] = None,
+                      max_tokens: int = RAG_CONTEXT_TOKENS) -> str:
+    """
+    Build the document context for a RAG answer.
+
+    Args:
+        query (str): User query
+        user_id (str, optional): Owner whose documents are searched
+        filters (Dict[str, Any], optional): Metadata filters for search_vectors
+        max_tokens (int): Token budget for the packed chunks
+
+    Returns:
+        str: Instructions plus numbered chunks, or an empty string when nothing relevant was found
+    """
+    packed = pack_context(retrieve(query, user_id, filters), max_tokens=max_tokens)
+    if not packed:
+        return ""
+    return (
+        "Answer using the following excerpts from the user's documents when they are relevant, "
+        "citing them by number. If they do not contain the answer, say so.\n\n" + packed
+    )
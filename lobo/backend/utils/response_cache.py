@@ -0,0 +1,367 @@
+# File: lobo/backend/utils/response_cache.py
+# Enhancement: Exact and semantic response cache in front of the LLM
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "redis")  # redis, memory or none
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))  # memory backend only
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "False").lower() == "true"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95))
+RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES", 2000))
+RESPONSE_CACHE_MAX_HISTORY = int(os.getenv("RESPONSE_CACHE_MAX_HISTORY", 2))  # earlier messages a cached reply may follow
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so trivially different phrasings share an exact cache entry.
+
+    Args:
+        prompt (str): User prompt
+
+    Returns:
+        str: NFC-normalized, case-folded prompt with collapsed whitespace
+    """
+    return " ".join(unicodedata.normalize("NFC", prompt).casefold().split())
+
+def history_digest(history: List[Dict[str, str]]) -> str:
+    """
+    Identify the earlier turns a response was generated after.
+
+    Args:
+        history (List[Dict[str, str]]): Earlier messages with role and content
+
+    Returns:
+        str: Digest of the normalized turns, equal for conversations that started identically
+    """
+    turns = [[m.get("role"), normalize_prompt(m.get("content") or "")] for m in history]
+    return hashlib.sha256(json.dumps(turns, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def response_cache_scope(model: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Identify the model and generation parameters a cached response is valid for.
+
+    Args:
+        model (str): Model name
+        params (Dict[str, Any], optional): Generation parameters such as temperature and max_tokens
+
+    Returns:
+        str: Short digest of the model and parameters
+    """
+    scope = json.dumps({"model": model, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+
+def response_cache_key(prompt: str, model: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the exact-match cache key of a prompt.
+
+    Args:
+        prompt (str): User prompt
+        model (str): Model name
+        params (Dict[str, Any], optional): Generation parameters
+
+    Returns:
+        str: Cache key
+    """
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{response_cache_scope(model, params)}:{digest}"
+
+class MemoryResponseStore:
+    """In-process exact-match store with TTL expiry and LRU eviction."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            expires_at = time.time() + self.ttl if self.ttl > 0 else 0
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisResponseStore:
+    """Exact-match store shared by all workers; Redis evicts by TTL and its maxmemory LRU policy."""
+
+    def __init__(self, client, ttl: int = RESPONSE_CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        data = self.client.get(f"resp:{key}")
+        return pickle.loads(data) if data else None
+
+    def set(self, key: str, value: str):
+        if self.ttl > 0:
+            self.client.setex(f"resp:{key}", self.ttl, pickle.dumps(value))
+        else:
+            self.client.set(f"resp:{key}", pickle.dumps(value))
+
+class SemanticResponseIndex:
+    """
+    In-process nearest-neighbour index of prompt embeddings.
+
+    Vectors are L2-normalized so the dot product is the cosine similarity.
+    Entries expire after `ttl` seconds and the least recently hit entry is
+    evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # key -> (scope, expires_at, unit vector, response), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else None
+
+    def search(self, scope: str, vector: List[float], threshold: float) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar cached prompt within a scope.
+
+        Returns:
+            Optional[Tuple[str, float]]: Cached response and its similarity, if above the threshold
+        """
+        query = self._unit(vector)
+        if query is None:
+            return None
+
+        with self._lock:
+            now = time.time()
+            for key in [k for k, entry in self._entries.items() if entry[1] and entry[1] < now]:
+                del self._entries[key]
+
+            keys = [k for k, entry in self._entries.items() if entry[0] == scope]
+            if not keys:
+                return None
+
+            similarities = np.stack([self._entries[key][2] for key in keys]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                return None
+
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]][3], float(similarities[best])
+
+    def add(self, scope: str, key: str, vector: List[float], response: str):
+        """Add a prompt embedding and its response, evicting the least recently used entry if full."""
+        unit = self._unit(vector)
+        if unit is None:
+            return
+
+        with self._lock:
+            expires_at = time.time() + self.ttl if self.ttl > 0 else 0
+            self._entries[key] = (scope, expires_at, unit, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class ResponseCache:
+    """
+    Response cache in front of the LLM.
+
+    Lookups first try the exact layer, keyed by normalized prompt, model and
+    parameters. If that misses and a semantic layer is configured, the prompt
+    embedding is compared to previously answered prompts and the closest
+    answer is reused when its cosine similarity reaches `similarity`.
+    """
+
+    def __init__(self, store=None, semantic_index: Optional[SemanticResponseIndex] = None,
+                 embeddings=None, similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self.store = store
+        self.semantic_index = semantic_index
+        self.embeddings = embeddings
+        self.similarity = similarity
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "errors": 0
+        }
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_index is not None and self.embeddings is not None
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get cumulative cache statistics for this process.
+
+        Returns:
+            Dict[str, float]: Counters plus overall, exact and semantic hit rates
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["lookups"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        stats["exact_hit_rate"] = stats["exact_hits"] / lookups if lookups else 0.0
+        stats["semantic_hit_rate"] = stats["semantic_hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _embed(self, prompt: str) -> Optional[List[float]]:
+        try:
+            return self.embeddings.embed_query(normalize_prompt(prompt))
+        except Exception as e:
+            logging.warning(f"Response cache embedding failed: {e}")
+            return None
+
+    def contains(self, prompt: str, model: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """Check the exact layer for a response without counting a lookup."""
+        if self.store is None:
+            return False
+        try:
+            return self.store.get(response_cache_key(prompt, model, params)) is not None
+        except Exception as e:
+            logging.warning(f"Response cache lookup failed: {e}")
+            return False
+
+    def get(self, prompt: str, model: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            prompt (str): User prompt
+            model (str): Model name
+            params (Dict[str, Any], optional): Generation parameters
+
+        Returns:
+            Optional[str]: Cached response, or None on a miss
+        """
+        self._count("lookups")
+
+        if self.store is not None:
+            try:
+                response = self.store.get(response_cache_key(prompt, model, params))
+                if response is not None:
+                    self._count("exact_hits")
+                    return response
+            except Exception as e:
+                self._count("errors")
+                logging.warning(f"Response cache lookup failed: {e}")
+
+        if self.semantic:
+            vector = self._embed(prompt)
+            if vector is not None:
+                match = self.semantic_index.search(response_cache_scope(model, params), vector, self.similarity)
+                if match is not None:
+                    response, similarity = match
+                    self._count("semantic_hits")
+                    logging.info(f"Semantic response cache hit (similarity {similarity:.3f})")
+                    return response
+
+        self._count("misses")
+        return None
+
+    def set(self, prompt: str, model: str, params: Optional[Dict[str, Any]], response: str):
+        """
+        Store a generated response in every configured layer.
+
+        Args:
+            prompt (str): User prompt
+            model (str): Model name
+            params (Dict[str, Any], optional): Generation parameters
+            response (str): Generated response
+        """
+        if not response:
+            return
+
+        key = response_cache_key(prompt, model, params)
+        if self.store is not None:
+            try:
+                self.store.set(key, response)
+            except Exception as e:
+                self._count("errors")
+                logging.warning(f"Response cache write failed: {e}")
+
+        if self.semantic:
+            vector = self._embed(prompt)
+            if vector is not None:
+                self.semantic_index.add(response_cache_scope(model, params), key, vector, response)
+
+        self._count("stores")
+
+def create_response_store(backend: str = RESPONSE_CACHE_BACKEND):
+    """
+    Create the configured exact-match store.
+
+    Args:
+        backend (str): "redis", "memory" or "none"
+
+    Returns:
+        The store, or None if the exact layer is disabled
+    """
+    backend = (backend or "none").lower()
+
+    if backend == "redis":
+        from utils.cache import redis_client, is_redis_available
+        if is_redis_available():
+            return RedisResponseStore(redis_client)
+        logging.warning("Redis is not available, falling back to the in-memory response cache")
+        backend = "memory"
+
+    if backend == "memory":
+        return MemoryResponseStore()
+
+    return None
+
+# Process-wide response cache
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache, creating it on first use."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                semantic_index, embeddings = None, None
+                if RESPONSE_CACHE_SEMANTIC:
+                    from utils.embeddings import get_cached_embeddings
+                    semantic_index = SemanticResponseIndex()
+                    embeddings = get_cached_embeddings()
+                _response_cache = ResponseCache(create_response_store(), semantic_index, embeddings)
+    return _response_cache
+
+def get_response_cache_stats() -> Dict[str, float]:
+    """Get response cache hit-rate statistics for this process."""
+    return get_response_cache().get_stats()
@@ -0,0 +1,378 @@
+# File: lobo/backend/utils/single_flight.py
+# Enhancement: Single-flight coalescing of identical LLM generations within and across workers
+
+import os
+import uuid
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Configuration
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+SINGLE_FLIGHT_DISTRIBUTED = os.getenv("SINGLE_FLIGHT_DISTRIBUTED", "True").lower() == "true"
+SINGLE_FLIGHT_LOCK_TTL = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL", 300))  # seconds a leader may generate for
+SINGLE_FLIGHT_STREAM_TTL = int(os.getenv("SINGLE_FLIGHT_STREAM_TTL", 60))  # seconds a finished stream is kept
+SINGLE_FLIGHT_MIRROR_INTERVAL = float(os.getenv("SINGLE_FLIGHT_MIRROR_INTERVAL", 0.05))  # seconds between XADDs
+SINGLE_FLIGHT_REDIS_CONNECTIONS = int(os.getenv("SINGLE_FLIGHT_REDIS_CONNECTIONS", 32))  # own pool, blocking reads
+
+# Release the lock only if this worker still owns it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+class FlightError(Exception):
+    """Raised to every waiter when the shared generation fails."""
+
+class FlightCancelled(FlightError):
+    """Raised in the producer thread when every caller has left the generation."""
+
+class _StreamMirror:
+    """Copies a leader's tokens into its Redis stream, batched into one XADD per interval."""
+
+    def __init__(self, redis_client, stream_key: str, interval: float = SINGLE_FLIGHT_MIRROR_INTERVAL):
+        self.redis = redis_client
+        self.stream_key = stream_key
+        self.interval = interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def push(self, token: str):
+        self._buffer.append(token)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.redis.xadd(self.stream_key, {"token": "".join(self._buffer)})
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+class Flight:
+    """
+    One in-progress generation shared by every caller with the same key.
+
+    Tokens are appended as they are produced; each subscriber replays them
+    from the start, so late joiners still receive the full response.
+    """
+
+    def __init__(self):
+        self._tokens: List[str] = []
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._condition = threading.Condition()
+        self.subscribers = 0
+        self.cancelled = False
+
+    @property
+    def done(self) -> bool:
+        with self._condition:
+            return self._done
+
+    def publish(self, token: str):
+        with self._condition:
+            self._tokens.append(token)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[Exception] = None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def subscribe(self, timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield every token of the flight, waiting for new ones until it finishes."""
+        position = 0
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            with self._condition:
+                while position >= len(self._tokens) and not self._done:
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        raise FlightError("Timed out waiting for the shared generation")
+                    self._condition.wait(remaining)
+                tokens = self._tokens[position:]
+                position += len(tokens)
+                done, error = self._done, self._error
+            yield from tokens
+            if done and position >= len(self._tokens):
+                if error is not None:
+                    raise error
+                return
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical generations.
+
+    The first caller for a key starts the generation in a background thread;
+    it and every concurrent caller with the same key subscribe to the same
+    token stream. Running the producer off the request thread means a client
+    that disconnects does not cancel the generation for the others; once the
+    last caller has left, the producer is closed at its next token, which
+    cancels the model request.
+
+    With a Redis client, one worker wins a `SET NX` lock per key and mirrors
+    its tokens into a Redis stream, a batch per `SINGLE_FLIGHT_MIRROR_INTERVAL`;
+    the other workers replay that stream with blocking reads instead of
+    generating. Each follower holds a connection while it waits, so the
+    client should have its own pool (see `get_single_flight`). If the lock holder dies before finishing, a
+    waiting worker takes over and generates itself.
+    """
+
+    def __init__(self, redis_client=None, lock_ttl: int = SINGLE_FLIGHT_LOCK_TTL,
+                 stream_ttl: int = SINGLE_FLIGHT_STREAM_TTL):
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+        self.stream_ttl = stream_ttl
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "remote_followers": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get how many generations ran and how many requests were coalesced onto them."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def stream(self, key: str, producer: Callable[[], Iterator[str]],
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Stream a generation, sharing it with concurrent callers using the same key.
+
+        Args:
+            key (str): Coalescing key, normally the response cache key
+            producer (Callable[[], Iterator[str]]): Starts the generation and yields its tokens
+            timeout (float, optional): Seconds to wait for the next token before giving up
+
+        Yields:
+            str: Response tokens
+
+        Raises:
+            FlightError: If the shared generation times out or a remote one fails
+            Exception: Whatever the producer raised, re-raised to every caller
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = Flight()
+                self._flights[key] = flight
+                leader = True
+            else:
+                leader = False
+            flight.subscribers += 1
+
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, producer), daemon=True).start()
+        else:
+            self._count("coalesced")
+
+        try:
+            yield from flight.subscribe(timeout)
+        finally:
+            self._leave(key, flight)
+
+    def _leave(self, key: str, flight: Flight):
+        """Drop a subscriber, cancelling the generation if it was the last one."""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return
+            flight.cancelled = True
+            # Later callers start a new generation instead of joining the cancelled one
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        logging.info(f"Every caller left the shared generation for {key}, cancelling it")
+
+    def do(self, key: str, fn: Callable[[], Optional[str]], timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Run a non-streaming generation once for all concurrent callers with the same key.
+
+        Args:
+            key (str): Coalescing key
+            fn (Callable[[], Optional[str]]): Produces the full response, or None on failure
+            timeout (float, optional): Seconds to wait for the shared result
+
+        Returns:
+            Optional[str]: The shared response, or None if it failed
+        """
+        def producer():
+            result = fn()
+            if result is None:
+                raise FlightError("Generation returned no response")
+            yield result
+
+        try:
+            return "".join(self.stream(key, producer, timeout)) or None
+        except FlightError as e:
+            logging.error(f"Coalesced generation failed: {str(e)}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Leader side
+    # ------------------------------------------------------------------
+
+    def _run(self, key: str, flight: Flight, producer: Callable[[], Iterator[str]]):
+        """Produce the flight's tokens, locally or by following another worker."""
+        error = None
+        try:
+            if self.redis is None:
+                self._generate(flight, producer)
+            else:
+                self._run_distributed(key, flight, producer)
+        except FlightCancelled as e:
+            error = e
+        except Exception as e:
+            logging.error(f"Shared generation for {key} failed: {str(e)}")
+            error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.finish(error)
+
+    def _generate(self, flight: Flight, producer: Callable[[], Iterator[str]],
+                  mirror: Optional[Callable[[str], None]] = None):
+        self._count("leaders")
+        tokens = producer()
+        try:
+            for token in tokens:
+                if flight.cancelled:
+                    raise FlightCancelled("Every caller left the shared generation")
+                flight.publish(token)
+                if mirror:
+                    mirror(token)
+        finally:
+            # Closing the producer stops the model request it is streaming from
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+
+    def _run_distributed(self, key: str, flight: Flight, producer: Callable[[], Iterator[str]]):
+        lock_key = f"sf:lock:{key}"
+        stream_key = f"sf:stream:{key}"
+        owner = uuid.uuid4().hex
+
+        while True:
+            if self.redis.set(lock_key, owner, nx=True, ex=self.lock_ttl):
+                break
+            if self._follow_remote(lock_key, stream_key, flight):
+                return
+            # The lock holder vanished without finishing; try to take over
+
+        try:
+            self.redis.delete(stream_key)
+            mirror = _StreamMirror(self.redis, stream_key)
+            try:
+                self._generate(flight, producer, mirror.push)
+                mirror.flush()
+                self.redis.xadd(stream_key, {"done": "1"})
+            except FlightCancelled:
+                mirror.flush()
+                self.redis.xadd(stream_key, {"cancelled": "1"})
+                raise
+            except Exception as e:
+                mirror.flush()
+                self.redis.xadd(stream_key, {"error": str(e) or e.__class__.__name__})
+                raise
+            finally:
+                self.redis.expire(stream_key, self.stream_ttl)
+        finally:
+            self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, owner)
+
+    def _follow_remote(self, lock_key: str, stream_key: str, flight: Flight) -> bool:
+        """
+        Replay another worker's generation into the local flight.
+
+        Returns:
+            bool: True if the remote generation finished, False if its owner disappeared
+                or cancelled it before producing any token
+        """
+        self._count("remote_followers")
+        last_id = "0-0"
+        published = False
+        while True:
+            if flight.cancelled:
+                raise FlightCancelled("Every caller left the shared generation")
+            entries = self.redis.xread({stream_key: last_id}, block=1000, count=100)
+            for _, messages in entries or []:
+                for message_id, fields in messages:
+                    last_id = message_id
+                    fields = {
+                        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                        for k, v in fields.items()
+                    }
+                    if "token" in fields:
+                        flight.publish(fields["token"])
+                        published = True
+                    elif "error" in fields:
+                        raise FlightError(fields["error"])
+                    elif "done" in fields:
+                        return True
+                    elif "cancelled" in fields:
+                        # Its callers left; generate ourselves unless half a response was sent
+                        if published:
+                            raise FlightError("Remote generation was cancelled")
+                        return False
+
+            if not entries and not self.redis.exists(lock_key):
+                # Nothing new and nobody holds the lock: the leader died mid-generation
+                if last_id != "0-0":
+                    raise FlightError("Remote generation was interrupted")
+                return False
+
+def _create_redis_client():
+    """
+    Create a Redis client with its own connection pool for coalescing.
+
+    Followers hold a connection for each blocking XREAD, so sharing the
+    cache's small pool would starve the rate limiter and caches. When all
+    connections are busy, a blocking pool waits for one instead of failing.
+
+    Returns:
+        The client, or None if Redis is not reachable
+    """
+    import redis
+    from utils.cache import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+
+    client = redis.Redis(connection_pool=redis.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        password=REDIS_PASSWORD,
+        max_connections=SINGLE_FLIGHT_REDIS_CONNECTIONS,
+        timeout=5  # seconds to wait for a free connection
+    ))
+    try:
+        client.ping()
+    except Exception:
+        return None
+    return client
+
+# Process-wide single-flight group
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide single-flight group, creating it on first use."""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                client = None
+                if SINGLE_FLIGHT_DISTRIBUTED:
+                    client = _create_redis_client()
+                    if client is None:
+                        logging.warning("Redis is not available, coalescing generations within this process only")
+                _single_flight = SingleFlight(client)
+    return _single_flight
@@ -5,6 +5,7 @@ import os
 import logging
 from typing import Dict, List, Optional, Union, Any
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_ready
 from dotenv import load_dotenv
 import time
 import traceback
@@ -59,18 +60,34 @@ class TaskStatus:
 
 # File processing task
 @celery_app.task(bind=True, name="process_file")
-def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: str):
+def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: str, upload_date: str = None,
+                 file_hash: str = None):
     """
     Process an uploaded file asynchronously.
     
+    If content with the same hash was already processed by the current
+    processor version, its results and vectors are copied instead of
+    extracting and embedding the file again.
+    
     Args:
         file_id (str): ID of the file to process
         file_path (str): Path to the file
         mime_type (str): MIME type of the file
         user_id (str): ID of the user who uploaded the file
+        upload_date (str, optional): ISO upload date, stored with the vectors for filtering
+        file_hash (str, optional): SHA-256 of the content; enables reuse of earlier results
     """
     from utils.database import supabase
     from utils.vector_db import store_vectors
+    from utils.processing_cache import get_processing_cache
+    
+    processing_cache = get_processing_cache() if file_hash else None
+    vector_metadata = {
+        "file_id": file_id,
+        "user_id": user_id,
+        "mime_type": mime_type,
+        "upload_date": upload_date or time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+    }
     
     try:
         # First update status to started
@@ -80,6 +97,14 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
             "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         }).eq("id", file_id).execute()
         
+        # Reuse the results of identical content processed before
+        if processing_cache is not None:
+            cached = processing_cache.get(file_hash, mime_type)
+            if cached and cached.get("file_id") != file_id:
+                reused = _reuse_processing_result(file_id, cached, vector_metadata)
+                if reused is not None:
+                    return reused
+        
         # Report progress (10%)
         self.update_state(
             state=TaskStatus.PROGRESS,
@@ -96,6 +121,8 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
         # Extract content based on file type
         extracted_text = None
         processing_result = None
+        vectors_stored = False
+        embedded_during_extraction = False
         
         if mime_type == "application/pdf":
             # Report progress (20%)
@@ -111,8 +138,9 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
             }).eq("id", file_id).execute()
             
-            from utils.file_handler import process_pdf
-            extracted_text, processing_result = process_pdf(file_path)
+            # Pages are chunked and embedded while later pages are still extracted
+            extracted_text, processing_result, vectors_stored = _extract_and_embed_pdf(file_path, vector_metadata)
+            embedded_during_extraction = True
             
         elif mime_type == "text/plain":
             # Report progress (20%)
@@ -128,7 +156,7 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
             }).eq("id", file_id).execute()
             
-            from utils.file_handler import process_text_file
+            from utils.file_processors import process_text_file
             extracted_text, processing_result = process_text_file(file_path)
             
         elif mime_type == "text/csv":
@@ -145,7 +173,7 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
             }).eq("id", file_id).execute()
             
-            from utils.file_handler import process_csv
+            from utils.file_processors import process_csv
             extracted_text, processing_result = process_csv(file_path)
             
         elif mime_type in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
@@ -163,7 +191,7 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
             }).eq("id", file_id).execute()
             
-            from utils.file_handler import process_excel
+            from utils.file_processors import process_excel
             extracted_text, processing_result = process_excel(file_path)
         
         # Report progress (50%)
@@ -180,8 +208,7 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
         }).eq("id", file_id).execute()
         
         # Store vectors for search if text was extracted
-        vectors_stored = False
-        if extracted_text:
+        if extracted_text and not embedded_during_extraction:
             # Report progress (70%)
             self.update_state(
                 state=TaskStatus.PROGRESS,
@@ -195,10 +222,7 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
             }).eq("id", file_id).execute()
             
-            vectors_stored = store_vectors(extracted_text, {
-                "file_id": file_id,
-                "user_id": user_id
-            })
+            vectors_stored = store_vectors(extracted_text, vector_metadata)
         
         # Report progress (90%)
         self.update_state(
@@ -230,6 +254,17 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
         
         supabase.table("files").update(update_data).eq("id", file_id).execute()
         
+        # Share the results with later uploads of the same content
+        if processing_cache is not None and (vectors_stored or not extracted_text):
+            processing_cache.set(file_hash, mime_type, {
+                "file_id": file_id,
+                "user_id": user_id,
+                "text_extracted": bool(extracted_text),
+                "vectors_stored": vectors_stored,
+                "processing_result": processing_result or {},
+                "extracted_text": (extracted_text or "")[:10000]
+            })
+        
         return {
             "success": True,
             "file_id": file_id,
@@ -255,6 +290,94 @@ def process_file(self, file_id: str, file_path: str, mime_type: str, user_id: st
         # Re-raise exception for Celery to handle
         raise
 
+def _extract_and_embed_pdf(file_path: str, vector_metadata: Dict[str, Any]) -> tuple:
+    """
+    Extract a PDF page by page and store its vectors while it is being extracted.
+    
+    Args:
+        file_path (str): Path to the PDF
+        vector_metadata (Dict[str, Any]): Metadata for the file's vectors
+        
+    Returns:
+        tuple: (extracted_text, processing_result, vectors_stored); text and result
+            are None if the PDF could not be read
+    """
+    from utils.file_processors import iter_pdf_pages, pdf_processing_result
+    from utils.vector_db import delete_vectors, store_page_vectors
+    
+    pages, errors = [], []
+    
+    def extracted_pages():
+        try:
+            for page_text in iter_pdf_pages(file_path):
+                pages.append(page_text)
+                yield page_text
+        except Exception as e:
+            errors.append(e)
+    
+    page_stream = extracted_pages()
+    vectors_stored = store_page_vectors(page_stream, vector_metadata)
+    # A failed embedding stops consuming pages; the text is still wanted
+    for _ in page_stream:
+        pass
+    
+    if errors:
+        logging.error(f"Error extracting text from PDF: {str(errors[0])}")
+        if vectors_stored:
+            delete_vectors(vector_metadata["file_id"], vector_metadata["user_id"])
+        return None, None, False
+    
+    extracted_text, processing_result = pdf_processing_result(pages)
+    return extracted_text, processing_result, vectors_stored
+
+def _reuse_processing_result(file_id: str, cached: Dict[str, Any],
+                             vector_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Complete a file from the cached processing result of identical content.
+    
+    Args:
+        file_id (str): ID of the file being processed
+        cached (Dict[str, Any]): Processing cache entry of the content
+        vector_metadata (Dict[str, Any]): Metadata for the file's vectors
+        
+    Returns:
+        Dict[str, Any]: Task result, or None if the source vectors are gone and the file must be processed
+    """
+    from utils.database import supabase
+    from utils.vector_db import copy_file_vectors
+    
+    vectors_stored = False
+    if cached.get("vectors_stored"):
+        if not copy_file_vectors(cached["file_id"], cached.get("user_id"), vector_metadata):
+            # The source file was deleted since; fall back to processing
+            return None
+        vectors_stored = True
+    
+    extracted_text = cached.get("extracted_text") or ""
+    update_data = {
+        "processing_status": TaskStatus.SUCCESS,
+        "processing_progress": 100,
+        "text_extracted": bool(cached.get("text_extracted")),
+        "vectors_stored": vectors_stored,
+        "processing_result": cached.get("processing_result") or {},
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    if extracted_text:
+        update_data["extracted_text"] = extracted_text
+        update_data["text_preview"] = extracted_text[:500]
+    
+    supabase.table("files").update(update_data).eq("id", file_id).execute()
+    logging.info(f"Reused processing result of file {cached['file_id']} for file {file_id}")
+    
+    return {
+        "success": True,
+        "file_id": file_id,
+        "text_extracted": update_data["text_extracted"],
+        "vectors_stored": vectors_stored,
+        "processing_result": update_data["processing_result"],
+        "reused_from": cached["file_id"]
+    }
+
 # Vector embedding generation task
 @celery_app.task(bind=True, name="generate_embeddings")
 def generate_embeddings(self, text: str, metadata: Dict = None):
@@ -285,23 +408,40 @@ def generate_embeddings(self, text: str, metadata: Dict = None):
 
 # Chat processing task
 @celery_app.task(bind=True, name="process_chat_message")
-def process_chat_message(self, user_id: str, chat_id: str, message: str):
+def process_chat_message(self, user_id: str, chat_id: str, message: str, rag: bool = False):
     """
     Process a chat message asynchronously.
     
+    The reply is streamed from the model and relayed to the `chat:{chat_id}`
+    room as throttled `new_message` deltas through the Socket.IO message
+    queue. The chat is written back once, when the reply is complete.
+    
     Args:
         user_id (str): ID of the user
         chat_id (str): ID of the chat
-        message (str): User message
+        message (str): User message, already appended to the chat by the socket handler
+        rag (bool): Answer from the user's uploaded files
     """
     from utils.database import supabase
-    import ollama
+    from utils.websocket import ChatMessageStream, get_external_socketio
+    from utils.inference_scheduler import SchedulerRejected, get_inference_scheduler, tier_budget
+    from middleware.rate_limiter import get_user_tier
+    from utils.context_builder import CHAT_SYSTEM_PROMPT, CONTEXT_WINDOW, build_context, needs_summary
+    from utils.metrics import record_latency
+    from utils.rag import build_rag_context
+    from utils.prefetch import mark_interactive
+    from utils.model_pool import OLLAMA_KEEP_ALIVE, record_model_use
+    from utils.llm_router import get_llm_router
     from config import Config
     
+    error_message = "Sorry, I encountered an error while processing your request."
+    messages = None
+    stream = ChatMessageStream(chat_id, server=get_external_socketio())
+    
     try:
         # Get the existing chat history
         response = supabase.table("chat_history") \
-            .select("messages") \
+            .select("messages, summary, summary_message_count") \
             .eq("id", chat_id) \
             .eq("user_id", user_id) \
             .single() \
@@ -317,72 +457,109 @@ def process_chat_message(self, user_id: str, chat_id: str, message: str):
         # Get chat messages
         chat_data = response.data
         messages = chat_data.get("messages", [])
+        summary = chat_data.get("summary")
+        summarized_count = chat_data.get("summary_message_count") or 0
+        if summarized_count > len(messages):
+            # Messages were removed since the summary was written; it no longer lines up
+            summary, summarized_count = None, 0
+        
+        # The socket handler stores the user message before queueing this task
+        if not messages or messages[-1].get("role") != "user" or messages[-1].get("content") != message:
+            messages.append({"role": "user", "content": message})
         
-        # Add user message
-        messages.append({"role": "user", "content": message})
+        try:
+            tier = get_user_tier(user_id)
+        except Exception:
+            tier = "free"
+        
+        # Same default reply length as the HTTP API, capped by the tier's budget
+        budget = tier_budget(tier)
+        max_tokens = min(budget.clamp(512), CONTEXT_WINDOW // 2)
         
-        # Add temporary assistant message
-        messages.append({"role": "assistant", "content": "Thinking..."})
+        # Retrieve document context before taking a model slot
+        knowledge = build_rag_context(message, user_id) if rag else ""
+        
+        # Send the system prompt, the rolling summary and as many recent turns as fit
+        context, omitted = build_context(
+            messages[summarized_count:],
+            max_tokens=max_tokens,
+            system_prompt="\n\n".join(part for part in (CHAT_SYSTEM_PROMPT, knowledge) if part),
+            summary=summary
+        )
         
-        # Update chat with user message
+        # Stream the response from Ollama once the scheduler admits it
+        mark_interactive()
+        record_model_use(Config.OLLAMA_MODEL)
+        with get_inference_scheduler().slot(Config.OLLAMA_MODEL, tier):
+            start = time.perf_counter()
+            try:
+                for chunk in get_llm_router().stream_chat(
+                    Config.OLLAMA_MODEL,
+                    context,
+                    options={"num_ctx": CONTEXT_WINDOW, "num_predict": max_tokens},
+                    keep_alive=OLLAMA_KEEP_ALIVE,
+                    timeout=budget.max_seconds
+                ):
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        stream.push(token)
+            except TimeoutError:
+                # Keep what was generated within the tier's time budget
+                logging.warning(f"Reply for chat {chat_id} cut off after {budget.max_seconds:.0f}s")
+            record_latency("generation", time.perf_counter() - start)
+        
+        bot_response = stream.content or "Sorry, I couldn't generate a response."
+        
+        # Persist the complete reply in a single write
+        messages.append({
+            "role": "assistant",
+            "content": bot_response,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        })
         supabase.table("chat_history").update({
             "messages": messages,
             "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         }).eq("id", chat_id).execute()
         
-        # Get response from Ollama
-        response = ollama.chat(
-            model=Config.OLLAMA_MODEL,
-            messages=messages[:-1]  # Exclude the temporary assistant message
-        )
+        stream.finish(bot_response)
+        
+        # Fold older turns into the summary before they fall out of the context window
+        if omitted or needs_summary(messages, summarized_count):
+            schedule_chat_summary(chat_id, user_id)
         
-        # Extract assistant response
-        bot_response = response.get("message", {}).get("content", "Sorry, I couldn't generate a response.")
+        return {
+            "success": True,
+            "response": bot_response,
+            "chat_id": chat_id
+        }
         
-        # Update messages with real assistant response
-        messages[-1] = {"role": "assistant", "content": bot_response}
+    except SchedulerRejected as e:
+        # Nothing was generated yet: try again once the model has capacity
+        if self.request.retries < 3:
+            logging.warning(f"Chat message for {chat_id} deferred: {str(e)}")
+            raise self.retry(exc=e, countdown=e.retry_after)
         
-        # Update chat with assistant response
+        logging.error(f"Giving up on chat message for {chat_id}: {str(e)}")
+        stream.finish(error_message)
+        messages.append({"role": "assistant", "content": error_message})
         supabase.table("chat_history").update({
             "messages": messages,
             "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
         }).eq("id", chat_id).execute()
-        
         return {
-            "success": True,
-            "response": bot_response,
-            "chat_id": chat_id
+            "success": False,
+            "error": str(e)
         }
         
     except Exception as e:
         logging.error(f"Error processing chat message: {str(e)}")
         logging.error(traceback.format_exc())
         
-        # Try to update chat with error message
+        # Try to replace the partial reply with an error message
         try:
-            # Get the existing chat history again
-            response = supabase.table("chat_history") \
-                .select("messages") \
-                .eq("id", chat_id) \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
-                
-            if not response.error and response.data:
-                messages = response.data.get("messages", [])
-                # Update last message or add error message
-                if messages and messages[-1]["role"] == "assistant":
-                    messages[-1] = {
-                        "role": "assistant", 
-                        "content": "Sorry, I encountered an error while processing your request."
-                    }
-                else:
-                    messages.append({
-                        "role": "assistant", 
-                        "content": "Sorry, I encountered an error while processing your request."
-                    })
-                
-                # Update chat
+            stream.finish(error_message)
+            if messages is not None:
+                messages.append({"role": "assistant", "content": error_message})
                 supabase.table("chat_history").update({
                     "messages": messages,
                     "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
@@ -393,6 +570,130 @@ def process_chat_message(self, user_id: str, chat_id: str, message: str):
         # Re-raise exception for Celery to handle
         raise
 
+def schedule_chat_summary(chat_id: str, user_id: str):
+    """
+    Queue a summary run for a chat unless one is already pending.
+    
+    Args:
+        chat_id (str): ID of the chat
+        user_id (str): ID of the chat owner
+    """
+    try:
+        from utils.cache import redis_client
+        if not redis_client.set(f"summary_pending:{chat_id}", 1, nx=True, ex=600):
+            return
+    except Exception as e:
+        logging.warning(f"Could not deduplicate summary run for chat {chat_id}: {str(e)}")
+    
+    summarize_chat.delay(chat_id, user_id)
+
+# Chat summary task
+@celery_app.task(bind=True, name="summarize_chat")
+def summarize_chat(self, chat_id: str, user_id: str) -> Dict[str, Any]:
+    """
+    Fold the older turns of a chat into its rolling summary.
+    
+    Only the messages added since the last summary (minus the most recent
+    turns, which are always sent verbatim) are sent to the model together
+    with the previous summary. A backlog that doesn't fit in the context
+    window, such as a long chat summarized for the first time, is folded in
+    several generations, each taking its own background slot and saving
+    its progress.
+    
+    Args:
+        chat_id (str): ID of the chat
+        user_id (str): ID of the chat owner
+        
+    Returns:
+        Dict[str, Any]: Summarization results
+    """
+    from utils.database import supabase
+    from utils.inference_scheduler import SchedulerRejected, get_inference_scheduler
+    from utils.context_builder import (
+        CHAT_SUMMARY_MAX_TOKENS, CONTEXT_WINDOW, summary_backlog, summary_budget, summary_prompt
+    )
+    from utils.model_pool import OLLAMA_KEEP_ALIVE, record_model_use
+    from utils.llm_router import get_llm_router
+    from config import Config
+    
+    try:
+        response = supabase.table("chat_history") \
+            .select("messages, summary, summary_message_count") \
+            .eq("id", chat_id) \
+            .eq("user_id", user_id) \
+            .single() \
+            .execute()
+            
+        if response.error:
+            logging.error(f"Error fetching chat for summary: {response.error}")
+            return {
+                "success": False,
+                "error": str(response.error)
+            }
+        
+        messages = response.data.get("messages", [])
+        summary = response.data.get("summary")
+        summarized_count = response.data.get("summary_message_count") or 0
+        if summarized_count > len(messages):
+            summary, summarized_count = None, 0
+        
+        stored_count = response.data.get("summary_message_count") or 0
+        while True:
+            # Fold in only what fits next to the prompt, the previous summary and the new one
+            budget = summary_budget(summary)
+            end, tokens = summary_backlog(messages, summarized_count, max_tokens=budget)
+            if end <= summarized_count:
+                break
+            
+            # Background work queues behind every interactive tier
+            record_model_use(Config.OLLAMA_MODEL)
+            with get_inference_scheduler().slot(Config.OLLAMA_MODEL, "background"):
+                result = get_llm_router().chat(
+                    Config.OLLAMA_MODEL,
+                    summary_prompt(summary, messages[summarized_count:end], max_tokens=budget),
+                    options={"num_predict": CHAT_SUMMARY_MAX_TOKENS, "num_ctx": CONTEXT_WINDOW},
+                    keep_alive=OLLAMA_KEEP_ALIVE
+                )
+            new_summary = result.get("message", {}).get("content", "").strip()
+            if not new_summary:
+                raise ValueError("Model returned an empty summary")
+            
+            # Only replace the summary this run started from, so a concurrent run cannot go backwards
+            update = supabase.table("chat_history").update({
+                "summary": new_summary,
+                "summary_message_count": end
+            }).eq("id", chat_id).eq("summary_message_count", stored_count).execute()
+            if not update.data:
+                logging.info(f"Summary of chat {chat_id} was updated concurrently, stopping")
+                break
+            
+            logging.info(f"Summarized {end - summarized_count} messages ({tokens} tokens) of chat {chat_id}")
+            summary, summarized_count, stored_count = new_summary, end, end
+        
+        return {
+            "success": True,
+            "chat_id": chat_id,
+            "summarized_messages": summarized_count
+        }
+        
+    except SchedulerRejected as e:
+        raise self.retry(exc=e, countdown=max(e.retry_after, 30), max_retries=5)
+        
+    except Exception as e:
+        logging.error(f"Error summarizing chat {chat_id}: {str(e)}")
+        logging.error(traceback.format_exc())
+        return {
+            "success": False,
+            "error": str(e)
+        }
+        
+    finally:
+        try:
+            from utils.cache import redis_client
+            redis_client.delete(f"summary_pending:{chat_id}")
+        except Exception:
+            pass
+
 # Analytics data processing task
 @celery_app.task(name="process_analytics")
 def process_analytics():
@@ -507,6 +808,126 @@ def cleanup_old_data(days: int = 30):
         # Re-raise exception for Celery to handle
         raise
 
+# Flush in-memory vector indexes before a worker process exits
+@worker_process_shutdown.connect
+def flush_vector_indexes(**kwargs):
+    """Write pending FAISS changes to disk when a worker process shuts down."""
+    from utils.vector_db import flush_vectors
+    flush_vectors()
+
+# Model keep-alive task
+@celery_app.task(name="keep_models_warm", ignore_result=True)
+def keep_models_warm() -> Dict[str, Dict[str, bool]]:
+    """
+    Load the configured Ollama models and refresh their keep-alive.
+
+    Scheduled by beat, so one worker process does it for every web and worker process.
+
+    Returns:
+        Dict[str, Dict[str, bool]]: Per host, whether each resident model answered the ping
+    """
+    from utils.model_pool import keep_models_warm as warm
+    return warm()
+
+# Preload the chat model once a worker is up instead of waiting for the first ping
+@worker_ready.connect
+def warm_model_pool(**kwargs):
+    """Queue a keep-alive run when the worker starts."""
+    from utils.model_pool import MODEL_POOL_ENABLED
+    if MODEL_POOL_ENABLED:
+        keep_models_warm.delay()
+
+# Vector deletion task
+@celery_app.task(bind=True, name="delete_file_vectors")
+def delete_file_vectors(self, file_id: str, user_id: str = None) -> Dict[str, Any]:
+    """
+    Remove a deleted file's chunks from the vector index.
+
+    Args:
+        file_id (str): ID of the deleted file
+        user_id (str, optional): Owner of the file
+
+    Returns:
+        Dict[str, Any]: Deletion results
+    """
+    from utils.vector_db import delete_vectors, get_index_manager
+
+    deleted = delete_vectors(file_id, user_id)
+    if deleted:
+        # Persist right away so other workers stop serving the dead chunks
+        get_index_manager(user_id).snapshot()
+
+    return {
+        "status": "success",
+        "file_id": file_id,
+        "deleted_chunks": deleted
+    }
+
+# Periodic task to compact vector indexes
+@celery_app.task(bind=True, name="compact_vector_indexes")
+def compact_vector_indexes(self) -> Dict[str, Any]:
+    """
+    Compact vector index shards that have accumulated too many deleted vectors,
+    and drop embedding cache entries that went unused.
+
+    Returns:
+        Dict[str, Any]: Compaction results
+    """
+    from utils.vector_db import compact_vectors, flush_vectors
+    from utils.embeddings import sweep_embedding_cache
+
+    compacted = compact_vectors()
+    if compacted:
+        flush_vectors()
+
+    return {
+        "status": "success",
+        "compacted_shards": compacted,
+        "removed_embeddings": sweep_embedding_cache()
+    }
+
+# Periodic task to clean up abandoned uploads
+@celery_app.task(bind=True, name="cleanup_abandoned_uploads")
+def cleanup_abandoned_uploads(self) -> Dict[str, Any]:
+    """
+    Delete chunked upload sessions and temporary upload files that went idle.
+
+    Returns:
+        Dict[str, Any]: Cleanup results
+    """
+    from utils.chunked_upload import cleanup_expired_uploads
+
+    return {
+        "status": "success",
+        "removed_uploads": cleanup_expired_uploads()
+    }
+
+# Periodic task to prefetch follow-up answers
+@celery_app.task(bind=True, name="prefetch_follow_up_answers")
+def prefetch_follow_up_answers(self) -> Dict[str, Any]:
+    """
+    Pre-generate answers to common follow-up questions while the model is idle.
+
+    Returns:
+        Dict[str, Any]: Prefetch results
+    """
+    from utils.prefetch import is_idle, load_recent_chats, mine_follow_ups, prefetch_follow_ups
+    from models.chatbot import Chatbot
+    from config import Config
+
+    if not is_idle(Config.OLLAMA_MODEL):
+        return {"status": "skipped", "reason": "model busy"}
+
+    topics = mine_follow_ups(load_recent_chats())
+    stats = prefetch_follow_ups(topics, Chatbot(), lambda: is_idle(Config.OLLAMA_MODEL))
+    logging.info(f"Prefetched follow-ups for {len(topics)} topics: {stats}")
+
+    return {
+        "status": "success",
+        "topics": len(topics),
+        **stats
+    }
+
 # Set up periodic tasks
 @celery_app.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -523,4 +944,36 @@ def setup_periodic_tasks(sender, **kwargs):
         86400.0,  # 24 hours
         cleanup_old_data.s(30),  # Keep data for 30 days
         name="clean up old data every day"
-    )
\ No newline at end of file
+    )
+
+    # Compact vector indexes every hour
+    sender.add_periodic_task(
+        3600.0,  # 1 hour
+        compact_vector_indexes.s(),
+        name="compact vector indexes every hour"
+    )
+
+    # Delete abandoned uploads every hour
+    sender.add_periodic_task(
+        3600.0,  # 1 hour
+        cleanup_abandoned_uploads.s(),
+        name="clean up abandoned uploads every hour"
+    )
+
+    # Keep the configured models loaded in Ollama
+    from utils.model_pool import MODEL_POOL_ENABLED, MODEL_POOL_PING_INTERVAL
+    if MODEL_POOL_ENABLED:
+        sender.add_periodic_task(
+            MODEL_POOL_PING_INTERVAL,
+            keep_models_warm.s(),
+            name="keep models warm"
+        )
+
+    # Prefetch likely follow-up answers while the model is idle
+    from utils.prefetch import PREFETCH_ENABLED, PREFETCH_INTERVAL
+    if PREFETCH_ENABLED:
+        sender.add_periodic_task(
+            PREFETCH_INTERVAL,
+            prefetch_follow_up_answers.s(),
+            name="prefetch follow-up answers"
+        )
\ No newline at end of file
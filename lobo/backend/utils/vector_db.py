@@ -1,11 +1,26 @@
 # File: lobo/backend/utils/vector_db.py
+# Enhancement: Persistent in-process FAISS index manager with background snapshots
+# Enhancement: Per-user sharded indexes with lazy loading and LRU eviction
+# Enhancement: Metadata pre-filtering inside the index through bitmap ID selectors
+# Enhancement: IVF-Flat, IVF-PQ and HNSW indexes with automatic promotion from flat
+# Enhancement: File-level deletion through tombstones with threshold-triggered compaction
+# Enhancement: Chunking and embedding of documents streamed page by page
+
 import os
+import re
+import time
+import atexit
 import logging
-from typing import List, Dict, Optional, Any, Union
+import threading
+from datetime import date, datetime, timezone
+from collections import OrderedDict, defaultdict
+from typing import List, Dict, Optional, Any, Union, Tuple, Set, Iterable, Iterator
 import numpy as np
+import faiss
+from filelock import FileLock
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.embeddings import get_cached_embeddings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -16,10 +31,974 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:1.5b")
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Index manager configuration
+VECTOR_DB_SNAPSHOT_INTERVAL = float(os.getenv("VECTOR_DB_SNAPSHOT_INTERVAL", 10))  # seconds between snapshots
+VECTOR_DB_RELOAD_INTERVAL = float(os.getenv("VECTOR_DB_RELOAD_INTERVAL", 5))  # seconds between disk version checks
+INDEX_NAME = "index"
+VERSION_FILE = "index.version"
+TOMBSTONES_FILE = "index.tombstones.npy"
+LOCK_FILE = "index.lock"
+
+# Approximate nearest neighbour configuration
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()  # flat, ivf_flat, ivf_pq or hnsw
+VECTOR_ANN_THRESHOLD = int(os.getenv("VECTOR_ANN_THRESHOLD", 50000))  # vectors before promoting a flat index
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", 1024))  # IVF clusters (capped at vectors / 39)
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", 16))  # clusters visited per query: higher = better recall
+VECTOR_PQ_M = int(os.getenv("VECTOR_PQ_M", 64))  # PQ sub-quantizers (rounded down to a divisor of the dimension)
+VECTOR_PQ_NBITS = int(os.getenv("VECTOR_PQ_NBITS", 8))  # bits per PQ code
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", 32))  # HNSW graph degree
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", 200))
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", 64))  # candidates per query: higher = better recall
+ANN_INDEX_TYPES = ("ivf_flat", "ivf_pq", "hnsw")
+
+# Compaction configuration
+VECTOR_DB_COMPACTION_RATIO = float(os.getenv("VECTOR_DB_COMPACTION_RATIO", 0.2))  # dead share that triggers a rebuild
+
+# Metadata fields that can be used as exact-match search filters
+FILTER_FIELDS = ("user_id", "file_id", "mime_type")
+
+# Sharding configuration
+VECTOR_DB_SHARD_DIR = "shards"
+VECTOR_DB_MAX_SHARDS = int(os.getenv("VECTOR_DB_MAX_SHARDS", 64))  # shards kept resident in memory
+
+# Streamed documents
+STREAM_SPLIT_CHARS = 8 * CHUNK_SIZE  # buffered text before splitting off chunks
+STREAM_EMBED_BATCH = int(os.getenv("STREAM_EMBED_BATCH", 64))  # chunks embedded per batch
+
 # Initialize embeddings model
 def get_embeddings():
-    """Get embeddings model."""
-    return OllamaEmbeddings(model=OLLAMA_MODEL)
+    """Get the shared, batched and content-hash cached embeddings model."""
+    return get_cached_embeddings(OLLAMA_MODEL)
+
+def to_timestamp(value: Union[str, date, datetime, float, int, None]) -> float:
+    """
+    Convert an ISO date string, date, datetime or epoch seconds to epoch seconds.
+
+    Dates and datetimes without a timezone are taken as UTC, like the stored
+    upload dates, so results don't depend on the server's local timezone.
+
+    Raises:
+        ValueError: If value is a string that isn't an ISO date
+    """
+    if value is None or value == "":
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _upload_timestamp(metadata: Dict[str, Any]) -> float:
+    """Get the upload time of a chunk in epoch seconds (NaN if missing or unreadable)."""
+    try:
+        return to_timestamp(metadata.get("upload_date"))
+    except (TypeError, ValueError):
+        return float("nan")
+
+def build_ann_index(vectors: np.ndarray, index_type: str = VECTOR_INDEX_TYPE):
+    """
+    Train an approximate nearest neighbour index and add vectors to it.
+
+    Vectors keep their positions, so the LangChain docstore mapping stays valid.
+
+    Args:
+        vectors (np.ndarray): float32 matrix of shape (n, d)
+        index_type (str): "ivf_flat", "ivf_pq" or "hnsw"
+
+    Returns:
+        faiss.Index: The populated index
+    """
+    n, dimension = vectors.shape
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, VECTOR_HNSW_M)
+        index.hnsw.efConstruction = VECTOR_HNSW_EF_CONSTRUCTION
+        index.add(vectors)
+        return index
+
+    # Faiss wants ~39 training points per cluster
+    nlist = max(1, min(VECTOR_IVF_NLIST, n // 39))
+    if index_type == "ivf_pq":
+        pq_m = max(m for m in range(1, min(VECTOR_PQ_M, dimension) + 1) if dimension % m == 0)
+        index = faiss.index_factory(dimension, f"IVF{nlist},PQ{pq_m}x{VECTOR_PQ_NBITS}")
+    elif index_type == "ivf_flat":
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat")
+    else:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+
+    index.train(vectors)
+    # Keep a direct map so vectors can still be reconstructed by position
+    faiss.extract_index_ivf(index).make_direct_map()
+    index.add(vectors)
+    return index
+
+def search_parameters(index, selector=None):
+    """Build per-query search parameters for an index, including its recall knobs."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=VECTOR_IVF_NPROBE)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=VECTOR_HNSW_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+class MetadataIndex:
+    """
+    Inverted index over chunk metadata, keyed by FAISS position.
+
+    Exact-match fields map each value to the positions holding it, and upload
+    dates are kept in a flat array, so a filter turns into a boolean mask over
+    the index without touching the documents.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Drop all entries."""
+        self._fields: Dict[str, Dict[Any, List[int]]] = {field: defaultdict(list) for field in FILTER_FIELDS}
+        self._upload_ts = np.empty(0, dtype=np.float64)
+
+    def add(self, start: int, metadatas: List[Dict[str, Any]]):
+        """
+        Index the metadata of chunks stored at consecutive positions.
+
+        Args:
+            start (int): FAISS position of the first chunk
+            metadatas (List[Dict[str, Any]]): Metadata for each chunk
+        """
+        for offset, metadata in enumerate(metadatas):
+            for field in FILTER_FIELDS:
+                value = metadata.get(field)
+                if value is not None:
+                    self._fields[field][value].append(start + offset)
+
+        timestamps = np.array([_upload_timestamp(m) for m in metadatas], dtype=np.float64)
+        self._upload_ts = np.concatenate([self._upload_ts, timestamps])
+
+    def positions(self, field: str, value: Any) -> List[int]:
+        """Get the positions whose metadata field equals value."""
+        return list(self._fields[field].get(value, []))
+
+    def mask(self, filters: Dict[str, Any], ntotal: int) -> np.ndarray:
+        """
+        Build a mask of the positions matching every filter.
+
+        Args:
+            filters (Dict[str, Any]): Exact-match fields (a value or a list of values),
+                plus optional `uploaded_after` / `uploaded_before` bounds
+            ntotal (int): Number of vectors in the index
+
+        Returns:
+            np.ndarray: Boolean mask of length ntotal
+
+        Raises:
+            ValueError: If a date bound isn't an ISO date
+        """
+        mask = np.ones(ntotal, dtype=bool)
+
+        for field in FILTER_FIELDS:
+            wanted = filters.get(field)
+            if wanted is None:
+                continue
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            field_mask = np.zeros(ntotal, dtype=bool)
+            for value in values:
+                positions = self._fields[field].get(value)
+                if positions:
+                    field_mask[positions] = True
+            mask &= field_mask
+
+        timestamps = self._upload_ts[:ntotal]
+        if filters.get("uploaded_after") is not None:
+            mask &= timestamps >= to_timestamp(filters["uploaded_after"])
+        if filters.get("uploaded_before") is not None:
+            mask &= timestamps <= to_timestamp(filters["uploaded_before"])
+
+        return mask
+
+class VectorIndexManager:
+    """
+    Long-lived owner of a FAISS index for the current process.
+
+    The index is loaded from disk once and served from memory. New chunks are
+    applied in place and recorded in a pending journal; a background thread
+    snapshots the index to disk. Every snapshot bumps a version counter stored
+    next to the index, so other processes (the Flask app reading, Celery
+    workers writing) can detect a newer snapshot and reload it. If the disk
+    version moved underneath us, the pending journal is replayed on top of the
+    newer snapshot before writing, so concurrent writers never lose chunks.
+    """
+
+    def __init__(self, path: str = VECTOR_DB_PATH, embeddings=None,
+                 snapshot_interval: float = VECTOR_DB_SNAPSHOT_INTERVAL,
+                 reload_interval: float = VECTOR_DB_RELOAD_INTERVAL,
+                 index_type: str = VECTOR_INDEX_TYPE,
+                 ann_threshold: int = VECTOR_ANN_THRESHOLD):
+        self.path = path
+        self.index_type = index_type
+        self.ann_threshold = ann_threshold
+        self.embeddings = embeddings or get_embeddings()
+        self.snapshot_interval = snapshot_interval
+        self.reload_interval = reload_interval
+
+        self._lock = threading.RLock()
+        self._file_lock = None
+        self._vectorstore: Optional[FAISS] = None
+        self._metadata_index = MetadataIndex()
+        self._tombstones: Set[int] = set()  # Positions of deleted chunks still held by the index
+        self._dead_selector = None
+        self._loaded = False
+        self._disk_version = 0      # Version of the snapshot the in-memory index is based on
+        self._pending: List[Tuple[str, Any]] = []  # Journal of (operation, payload) not yet on disk
+        self._last_reload_check = 0.0
+
+        self._stop_event = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Disk state
+    # ------------------------------------------------------------------
+
+    def _get_file_lock(self) -> FileLock:
+        """Get the inter-process lock guarding the on-disk snapshot."""
+        if self._file_lock is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._file_lock = FileLock(os.path.join(self.path, LOCK_FILE))
+        return self._file_lock
+
+    def _read_disk_version(self) -> int:
+        """Read the version of the snapshot currently on disk (0 if none)."""
+        try:
+            with open(os.path.join(self.path, VERSION_FILE), "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_disk_version(self, version: int):
+        """Atomically write the snapshot version."""
+        version_path = os.path.join(self.path, VERSION_FILE)
+        tmp_path = f"{version_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(version))
+        os.replace(tmp_path, version_path)
+
+    def _load_from_disk(self):
+        """Load the index snapshot from disk and replay any pending chunks on top."""
+        with self._get_file_lock():
+            disk_version = self._read_disk_version()
+            if os.path.exists(os.path.join(self.path, f"{INDEX_NAME}.faiss")):
+                start = time.perf_counter()
+                self._vectorstore = FAISS.load_local(
+                    self.path,
+                    self.embeddings,
+                    index_name=INDEX_NAME,
+                    allow_dangerous_deserialization=True
+                )
+                logging.info(
+                    f"Loaded FAISS index from {self.path} (version {disk_version}, "
+                    f"{self._vectorstore.index.ntotal} vectors) in {time.perf_counter() - start:.2f}s"
+                )
+            else:
+                self._vectorstore = None
+
+            tombstones_path = os.path.join(self.path, TOMBSTONES_FILE)
+            if self._vectorstore is not None and os.path.exists(tombstones_path):
+                self._set_tombstones(np.load(tombstones_path).tolist())
+            else:
+                self._set_tombstones([])
+
+        self._rebuild_metadata_index()
+        self._disk_version = disk_version
+        self._loaded = True
+        self._last_reload_check = time.monotonic()
+
+        for operation, payload in self._pending:
+            self._replay(operation, payload)
+
+    def _ensure_fresh(self):
+        """Load the index on first use and pick up newer snapshots from other processes."""
+        if not self._loaded:
+            self._load_from_disk()
+            return
+
+        now = time.monotonic()
+        if now - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = now
+
+        if self._read_disk_version() > self._disk_version:
+            logging.info(f"Newer FAISS snapshot detected in {self.path}, reloading")
+            self._load_from_disk()
+
+    # ------------------------------------------------------------------
+    # In-memory mutation and search
+    # ------------------------------------------------------------------
+
+    def _set_tombstones(self, positions):
+        """Replace the tombstone set and drop the cached selector."""
+        self._tombstones = set(int(position) for position in positions)
+        self._dead_selector = None
+
+    def _rebuild_metadata_index(self):
+        """Rebuild the metadata index from the documents in the loaded index."""
+        self._metadata_index.clear()
+        if self._vectorstore is None:
+            return
+        docstore = self._vectorstore.docstore
+        metadatas = [
+            docstore.search(docstore_id).metadata
+            for _, docstore_id in sorted(self._vectorstore.index_to_docstore_id.items())
+        ]
+        self._metadata_index.add(0, metadatas)
+
+    def _apply(self, text_embeddings: List[Tuple[str, List[float]]], metadatas: List[Dict[str, Any]]):
+        """Apply pre-computed embeddings to the in-memory index."""
+        if self._vectorstore is None:
+            start = 0
+            self._vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+        else:
+            start = self._vectorstore.index.ntotal
+            self._vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+        self._metadata_index.add(start, metadatas)
+
+    def _replay(self, operation: str, payload: Any):
+        """Re-apply a journaled operation on top of a freshly loaded snapshot."""
+        if operation == "add":
+            self._apply(*payload)
+        elif operation == "reset":
+            self._vectorstore = None
+            self._metadata_index.clear()
+            self._set_tombstones([])
+            if payload[0]:
+                self._apply(*payload)
+        elif operation == "promote":
+            if self._needs_promotion():
+                ntotal = self._vectorstore.index.ntotal
+                self._vectorstore.index = build_ann_index(
+                    self._vectorstore.index.reconstruct_n(0, ntotal), self.index_type
+                )
+        elif operation == "delete":
+            self._tombstone_file(payload)
+        elif operation == "compact":
+            self._compact_in_place()
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Embed texts and add them to the in-memory index.
+
+        Args:
+            texts (List[str]): Text chunks to add
+            metadatas (List[Dict[str, Any]], optional): Metadata for each chunk
+
+        Returns:
+            int: Number of chunks added
+        """
+        if not texts:
+            return 0
+
+        # Embed outside the lock so searches are not blocked by the embedding model
+        vectors = self.embeddings.embed_documents(texts)
+        return self.add_embeddings(list(zip(texts, vectors)), metadatas)
+
+    def add_embeddings(self, text_embeddings: List[Tuple[str, List[float]]],
+                       metadatas: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Add pre-computed embeddings to the in-memory index.
+
+        Args:
+            text_embeddings (List[Tuple[str, List[float]]]): (text, vector) pairs
+            metadatas (List[Dict[str, Any]], optional): Metadata for each chunk
+
+        Returns:
+            int: Number of chunks added
+        """
+        if not text_embeddings:
+            return 0
+
+        metadatas = metadatas or [{} for _ in text_embeddings]
+
+        with self._lock:
+            self._ensure_fresh()
+            self._apply(text_embeddings, metadatas)
+            self._pending.append(("add", (text_embeddings, metadatas)))
+
+        self._start_snapshot_thread()
+        return len(text_embeddings)
+
+    def reset(self, text_embeddings: List[Tuple[str, List[float]]],
+              metadatas: Optional[List[Dict[str, Any]]] = None):
+        """
+        Replace the whole index with the given embeddings.
+
+        Args:
+            text_embeddings (List[Tuple[str, List[float]]]): (text, vector) pairs, may be empty
+            metadatas (List[Dict[str, Any]], optional): Metadata for each chunk
+        """
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        with self._lock:
+            self._ensure_fresh()
+            self._replay("reset", (text_embeddings, metadatas))
+            self._pending.append(("reset", (text_embeddings, metadatas)))
+
+        self._start_snapshot_thread()
+
+    def similarity_search(self, query: str, k: int = 5,
+                          filters: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
+        """
+        Search the in-memory index.
+
+        Args:
+            query (str): Search query
+            k (int): Number of results to return
+            filters (Dict[str, Any], optional): Metadata predicates applied inside the
+                index (see MetadataIndex.mask)
+
+        Returns:
+            List[Tuple[Document, float]]: Matching documents and L2 distances
+        """
+        query_vector = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+
+        with self._lock:
+            self._ensure_fresh()
+            if self._vectorstore is None:
+                return []
+
+            index = self._vectorstore.index
+            selector = None
+            if filters:
+                mask = self._metadata_index.mask(filters, index.ntotal)
+                if self._tombstones:
+                    mask[list(self._tombstones)] = False
+                if not mask.any():
+                    return []
+                if not mask.all():
+                    # Only positions set in the bitmap are visited by the search
+                    selector = faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+            elif self._tombstones:
+                selector = self._get_dead_selector()
+
+            params = search_parameters(index, selector)
+            scores, positions = index.search(query_vector, k, params=params)
+
+            results = []
+            for score, position in zip(scores[0], positions[0]):
+                if position == -1:
+                    continue
+                docstore_id = self._vectorstore.index_to_docstore_id[int(position)]
+                results.append((self._vectorstore.docstore.search(docstore_id), float(score)))
+            return results
+
+    def export(self) -> Tuple[List[Tuple[str, List[float]]], List[Dict[str, Any]]]:
+        """
+        Export every live chunk with its stored vector.
+
+        Returns:
+            Tuple[List[Tuple[str, List[float]]], List[Dict[str, Any]]]: (text, vector) pairs and metadatas
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return self._export_live()
+
+    def export_file(self, file_id: str) -> Tuple[List[Tuple[str, List[float]]], List[Dict[str, Any]]]:
+        """
+        Export the live chunks of one file with their stored vectors.
+
+        Args:
+            file_id (str): ID of the file
+
+        Returns:
+            Tuple[List[Tuple[str, List[float]]], List[Dict[str, Any]]]: (text, vector) pairs and metadatas
+        """
+        with self._lock:
+            self._ensure_fresh()
+            positions = set(self._metadata_index.positions("file_id", file_id))
+            return self._export_live(positions)
+
+    def _export_live(self, positions: Optional[Set[int]] = None
+                     ) -> Tuple[List[Tuple[str, List[float]]], List[Dict[str, Any]]]:
+        """Collect the chunks that are not tombstoned, in position order, optionally only at `positions`."""
+        if self._vectorstore is None:
+            return [], []
+
+        index_to_docstore_id = self._vectorstore.index_to_docstore_id
+        if positions is None:
+            items = sorted(index_to_docstore_id.items())
+        else:
+            items = [(position, index_to_docstore_id[position]) for position in sorted(positions)]
+
+        text_embeddings, metadatas = [], []
+        for position, docstore_id in items:
+            if position in self._tombstones:
+                continue
+            doc = self._vectorstore.docstore.search(docstore_id)
+            vector = self._vectorstore.index.reconstruct(int(position)).tolist()
+            text_embeddings.append((doc.page_content, vector))
+            metadatas.append(doc.metadata)
+        return text_embeddings, metadatas
+
+    # ------------------------------------------------------------------
+    # Deletion and compaction
+    # ------------------------------------------------------------------
+
+    def _get_dead_selector(self):
+        """Get a cached selector that skips every tombstoned position."""
+        if self._dead_selector is None:
+            dead = faiss.IDSelectorBatch(np.array(sorted(self._tombstones), dtype=np.int64))
+            self._dead_selector = faiss.IDSelectorNot(dead)
+            # IDSelectorNot does not own the wrapped selector
+            self._dead_selector.referenced_selector = dead
+        return self._dead_selector
+
+    def _tombstone_file(self, file_id: str) -> int:
+        """Tombstone every live chunk of a file."""
+        positions = set(self._metadata_index.positions("file_id", file_id)) - self._tombstones
+        if positions:
+            self._set_tombstones(self._tombstones | positions)
+        return len(positions)
+
+    def delete_file(self, file_id: str) -> int:
+        """
+        Delete all chunks of a file.
+
+        Chunks are tombstoned and skipped by every search; their space is
+        reclaimed by the next compaction.
+
+        Args:
+            file_id (str): ID of the file whose chunks should be deleted
+
+        Returns:
+            int: Number of chunks deleted
+        """
+        with self._lock:
+            self._ensure_fresh()
+            deleted = self._tombstone_file(file_id)
+            if deleted:
+                self._pending.append(("delete", file_id))
+
+        if deleted:
+            self._start_snapshot_thread()
+        return deleted
+
+    @property
+    def dead_ratio(self) -> float:
+        """Share of the vectors in the index that are tombstoned."""
+        with self._lock:
+            self._ensure_fresh()
+            ntotal = self._vectorstore.index.ntotal if self._vectorstore is not None else 0
+            return len(self._tombstones) / ntotal if ntotal else 0.0
+
+    def _compact_in_place(self):
+        """Rebuild the index from its live chunks, dropping tombstoned vectors."""
+        if not self._tombstones:
+            return
+
+        lossy = self._vectorstore is not None and isinstance(self._vectorstore.index, faiss.IndexIVFPQ)
+        text_embeddings, metadatas = self._export_live()
+        if lossy and text_embeddings:
+            # PQ codes only approximate the vectors; re-embed (normally all embedding cache hits)
+            texts = [text for text, _ in text_embeddings]
+            text_embeddings = list(zip(texts, self.embeddings.embed_documents(texts)))
+
+        self._vectorstore = None
+        self._metadata_index.clear()
+        self._set_tombstones([])
+        if text_embeddings:
+            self._apply(text_embeddings, metadatas)
+            if self._needs_promotion():
+                self._vectorstore.index = build_ann_index(
+                    self._vectorstore.index.reconstruct_n(0, self._vectorstore.index.ntotal), self.index_type
+                )
+
+    def compact(self, min_dead_ratio: float = 0.0) -> bool:
+        """
+        Rebuild the index without its tombstoned vectors.
+
+        Args:
+            min_dead_ratio (float): Only compact if at least this share of vectors is dead
+
+        Returns:
+            bool: True if the index was compacted
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if not self._tombstones or self.dead_ratio < min_dead_ratio:
+                return False
+
+            start = time.perf_counter()
+            dead = len(self._tombstones)
+            self._compact_in_place()
+            self._pending.append(("compact", None))
+
+        logging.info(
+            f"Compacted FAISS index in {self.path}: dropped {dead} dead vectors "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        self._start_snapshot_thread()
+        return True
+
+    @property
+    def size(self) -> int:
+        """Number of vectors held in memory."""
+        with self._lock:
+            self._ensure_fresh()
+            return self._vectorstore.index.ntotal if self._vectorstore is not None else 0
+
+    @property
+    def revision(self) -> str:
+        """Identifier that changes whenever the searchable contents may have changed."""
+        with self._lock:
+            self._ensure_fresh()
+            return f"{self._disk_version}.{len(self._pending)}"
+
+    # ------------------------------------------------------------------
+    # Index type promotion
+    # ------------------------------------------------------------------
+
+    def _needs_promotion(self) -> bool:
+        """Whether the index is still flat but has grown past the ANN threshold."""
+        return (
+            self.index_type in ANN_INDEX_TYPES
+            and self._vectorstore is not None
+            and isinstance(self._vectorstore.index, faiss.IndexFlat)
+            and self._vectorstore.index.ntotal >= self.ann_threshold
+        )
+
+    def maybe_promote(self) -> bool:
+        """
+        Migrate a flat index to the configured ANN index once it crosses the size threshold.
+
+        Training runs outside the lock, so searches keep using the flat index
+        meanwhile; chunks added during training are copied over before the swap.
+
+        Returns:
+            bool: True if the index was promoted
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if not self._needs_promotion():
+                return False
+            flat_index = self._vectorstore.index
+            trained_count = flat_index.ntotal
+            vectors = flat_index.reconstruct_n(0, trained_count)
+
+        start = time.perf_counter()
+        ann_index = build_ann_index(vectors, self.index_type)
+
+        with self._lock:
+            if self._vectorstore is None or self._vectorstore.index is not flat_index:
+                # The index was reloaded or replaced while training; try again later
+                return False
+            added_since = flat_index.ntotal - trained_count
+            if added_since:
+                ann_index.add(flat_index.reconstruct_n(trained_count, added_since))
+            self._vectorstore.index = ann_index
+            self._pending.append(("promote", None))
+
+        logging.info(
+            f"Promoted FAISS index in {self.path} from flat to {self.index_type} "
+            f"({ann_index.ntotal} vectors) in {time.perf_counter() - start:.2f}s"
+        )
+        return True
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> bool:
+        """
+        Persist pending changes to disk if there are any.
+
+        Returns:
+            bool: True if a snapshot was written
+        """
+        with self._lock:
+            if not self._pending:
+                return False
+
+            with self._get_file_lock():
+                # Another process wrote a newer snapshot: rebase our journal onto it
+                if self._read_disk_version() != self._disk_version:
+                    logging.info(f"FAISS snapshot in {self.path} changed on disk, replaying pending chunks")
+                    self._load_from_disk()
+
+                start = time.perf_counter()
+                tombstones_path = os.path.join(self.path, TOMBSTONES_FILE)
+                if self._vectorstore is not None:
+                    tmp_path = os.path.join(self.path, ".snapshot")
+                    self._vectorstore.save_local(tmp_path, index_name=INDEX_NAME)
+                    for ext in ("faiss", "pkl"):
+                        os.replace(
+                            os.path.join(tmp_path, f"{INDEX_NAME}.{ext}"),
+                            os.path.join(self.path, f"{INDEX_NAME}.{ext}")
+                        )
+                    if self._tombstones:
+                        tmp_tombstones = os.path.join(tmp_path, TOMBSTONES_FILE)
+                        np.save(tmp_tombstones, np.array(sorted(self._tombstones), dtype=np.int64))
+                        os.replace(tmp_tombstones, tombstones_path)
+                    elif os.path.exists(tombstones_path):
+                        os.remove(tombstones_path)
+                else:
+                    # The index was emptied: drop the files so readers load nothing
+                    for index_file in (f"{INDEX_NAME}.faiss", f"{INDEX_NAME}.pkl", TOMBSTONES_FILE):
+                        index_file = os.path.join(self.path, index_file)
+                        if os.path.exists(index_file):
+                            os.remove(index_file)
+
+                new_version = self._disk_version + 1
+                self._write_disk_version(new_version)
+
+            self._disk_version = new_version
+            pending_count = len(self._pending)
+            self._pending = []
+
+        logging.info(
+            f"Snapshot of FAISS index written to {self.path} (version {new_version}, "
+            f"{pending_count} pending operations) in {time.perf_counter() - start:.2f}s"
+        )
+        return True
+
+    def _snapshot_loop(self):
+        """Background loop writing periodic snapshots."""
+        while not self._stop_event.wait(self.snapshot_interval):
+            try:
+                self.maybe_promote()
+                self.snapshot()
+            except Exception as e:
+                logging.error(f"Error writing FAISS snapshot: {str(e)}")
+
+    def _start_snapshot_thread(self):
+        """Start the background snapshot thread if it is not running."""
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        with self._lock:
+            if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop,
+                name=f"faiss-snapshot:{self.path}",
+                daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def close(self):
+        """Stop the snapshot thread and flush pending changes."""
+        self._stop_event.set()
+        try:
+            self.snapshot()
+        except Exception as e:
+            logging.error(f"Error flushing FAISS index: {str(e)}")
+
+class ShardedVectorStore:
+    """
+    Registry of per-user vector indexes.
+
+    Each user's chunks live in their own index under `<root>/shards/<user_id>`,
+    so a search only touches the caller's vectors. Shards are loaded lazily on
+    first use and at most `max_shards` stay resident; the least recently used
+    shard is flushed and dropped when the limit is exceeded. Chunks without a
+    user go to the legacy index at `<root>`.
+    """
+
+    def __init__(self, root: str = VECTOR_DB_PATH, max_shards: int = VECTOR_DB_MAX_SHARDS):
+        self.root = root
+        self.max_shards = max(1, max_shards)
+        self._shards: "OrderedDict[Optional[str], VectorIndexManager]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, shard_key: Optional[str]) -> str:
+        """Get the directory holding a shard's index."""
+        if not shard_key:
+            return self.root
+        safe_key = re.sub(r"[^A-Za-z0-9_-]", "_", str(shard_key))
+        return os.path.join(self.root, VECTOR_DB_SHARD_DIR, safe_key)
+
+    def get_shard(self, shard_key: Optional[str] = None) -> VectorIndexManager:
+        """
+        Get the index manager for a shard, creating it if needed.
+
+        Args:
+            shard_key (str, optional): User ID owning the shard, None for the legacy index
+
+        Returns:
+            VectorIndexManager: The shard's index manager
+        """
+        evicted = []
+        with self._lock:
+            manager = self._shards.get(shard_key)
+            if manager is not None:
+                self._shards.move_to_end(shard_key)
+                return manager
+
+            manager = VectorIndexManager(self.shard_path(shard_key))
+            self._shards[shard_key] = manager
+            while len(self._shards) > self.max_shards:
+                evicted.append(self._shards.popitem(last=False))
+
+        # Flush evicted shards outside the registry lock
+        for evicted_key, evicted_manager in evicted:
+            logging.info(f"Evicting inactive vector shard {evicted_key or 'default'}")
+            evicted_manager.close()
+
+        return manager
+
+    def resident_shards(self) -> List[Optional[str]]:
+        """List the shard keys currently held in memory, least recently used first."""
+        with self._lock:
+            return list(self._shards.keys())
+
+    def stored_shards(self) -> List[Optional[str]]:
+        """List the shard keys with an index on disk, None for the legacy index."""
+        keys: List[Optional[str]] = []
+        if os.path.exists(os.path.join(self.root, f"{INDEX_NAME}.faiss")):
+            keys.append(None)
+        shards_root = os.path.join(self.root, VECTOR_DB_SHARD_DIR)
+        if os.path.isdir(shards_root):
+            keys.extend(sorted(
+                name for name in os.listdir(shards_root)
+                if os.path.exists(os.path.join(shards_root, name, f"{INDEX_NAME}.faiss"))
+            ))
+        return keys
+
+    def flush_all(self) -> int:
+        """
+        Flush pending changes of every resident shard.
+
+        Returns:
+            int: Number of shards that wrote a snapshot
+        """
+        with self._lock:
+            managers = list(self._shards.values())
+        written = 0
+        for manager in managers:
+            try:
+                if manager.snapshot():
+                    written += 1
+            except Exception as e:
+                logging.error(f"Error flushing vector shard {manager.path}: {str(e)}")
+        return written
+
+# Process-wide sharded store
+_vector_store: Optional[ShardedVectorStore] = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> ShardedVectorStore:
+    """Get the process-wide sharded vector store, creating it on first use."""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = ShardedVectorStore(VECTOR_DB_PATH)
+    return _vector_store
+
+def get_index_manager(user_id: Optional[str] = None) -> VectorIndexManager:
+    """Get the index manager holding a user's vectors."""
+    return get_vector_store().get_shard(user_id)
+
+def flush_vectors() -> bool:
+    """
+    Flush pending in-memory vectors of every resident shard to disk.
+
+    Returns:
+        bool: True if any snapshot was written
+    """
+    if _vector_store is None:
+        return False
+    return _vector_store.flush_all() > 0
+
+atexit.register(flush_vectors)
+
+def delete_vectors(file_id: str, user_id: Optional[str] = None,
+                   compaction_ratio: float = VECTOR_DB_COMPACTION_RATIO) -> int:
+    """
+    Delete all vectors of a file and compact its shard if enough of it is dead.
+
+    Args:
+        file_id (str): ID of the deleted file
+        user_id (str, optional): Owner of the file, selects the shard
+        compaction_ratio (float): Dead share of the shard that triggers a rebuild
+
+    Returns:
+        int: Number of chunks deleted
+    """
+    try:
+        manager = get_index_manager(user_id)
+        deleted = manager.delete_file(file_id)
+        if deleted:
+            logging.info(f"Tombstoned {deleted} chunks of file {file_id}")
+            manager.compact(min_dead_ratio=compaction_ratio)
+        return deleted
+
+    except Exception as e:
+        logging.error(f"Error deleting vectors for file {file_id}: {str(e)}")
+        return 0
+
+def compact_vectors(min_dead_ratio: float = VECTOR_DB_COMPACTION_RATIO) -> int:
+    """
+    Compact every shard whose dead vector share exceeds a ratio.
+
+    Shards on disk are covered as well as those resident in this process:
+    the periodic task runs in a worker that rarely serves searches. A shard
+    on disk is only loaded if it has tombstones, and is released again
+    afterwards instead of taking a place among the resident shards.
+
+    Args:
+        min_dead_ratio (float): Dead share that triggers a rebuild
+
+    Returns:
+        int: Number of shards compacted
+    """
+    store = get_vector_store()
+    resident = {store.shard_path(shard_key): shard_key for shard_key in store.resident_shards()}
+    stored = {store.shard_path(shard_key): shard_key for shard_key in store.stored_shards()}
+
+    compacted = 0
+    for path, shard_key in {**stored, **resident}.items():
+        try:
+            if path in resident:
+                if store.get_shard(shard_key).compact(min_dead_ratio=min_dead_ratio):
+                    compacted += 1
+                continue
+            if not os.path.exists(os.path.join(path, TOMBSTONES_FILE)):
+                continue  # Nothing deleted since the last compaction
+            manager = VectorIndexManager(path)
+            try:
+                if manager.compact(min_dead_ratio=min_dead_ratio):
+                    compacted += 1
+            finally:
+                manager.close()
+        except Exception as e:
+            logging.error(f"Error compacting vector shard {shard_key or 'default'}: {str(e)}")
+    return compacted
+
+def copy_file_vectors(source_file_id: str, source_user_id: Optional[str], metadata: Dict[str, Any]) -> int:
+    """
+    Give a file the chunks of another file with the same content, without embedding them again.
+
+    Args:
+        source_file_id (str): ID of the file whose chunks are copied
+        source_user_id (str, optional): Owner of the source file, selects its shard
+        metadata (Dict[str, Any]): Metadata of the new file (`file_id`, `user_id`, ...),
+            replacing the source's values in every chunk
+
+    Returns:
+        int: Number of chunks copied, 0 if the source has none left
+    """
+    try:
+        text_embeddings, metadatas = get_index_manager(source_user_id).export_file(source_file_id)
+        if not text_embeddings:
+            return 0
+        metadatas = [{**chunk_metadata, **metadata} for chunk_metadata in metadatas]
+        copied = get_index_manager(metadata.get("user_id")).add_embeddings(text_embeddings, metadatas)
+        logging.info(f"Copied {copied} chunks of file {source_file_id} to file {metadata.get('file_id')}")
+        return copied
+
+    except Exception as e:
+        logging.error(f"Error copying vectors of file {source_file_id}: {str(e)}")
+        return 0
 
 def store_vectors(text: str, metadata: Dict[str, Any] = None) -> bool:
     """
@@ -38,9 +1017,6 @@ def store_vectors(text: str, metadata: Dict[str, Any] = None) -> bool:
             logging.warning("Invalid input: text must be a non-empty string.")
             return False
             
-        # Create directory if it doesn't exist
-        os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-        
         # Process text
         text_processed = process_document_for_vectors(text)
         
@@ -53,51 +1029,114 @@ def store_vectors(text: str, metadata: Dict[str, Any] = None) -> bool:
         texts = text_splitter.split_text(text_processed)
         
         # Create metadata for each chunk
-        metadatas = [metadata or {}] * len(texts)
-        
-        # Get embeddings
-        embeddings = get_embeddings()
+        metadatas = [dict(metadata or {}) for _ in texts]
         
-        # Load existing or create new FAISS index
-        if os.path.exists(os.path.join(VECTOR_DB_PATH, "index.faiss")):
-            vectorstore = FAISS.load_local(VECTOR_DB_PATH, embeddings)
-            logging.info(f"Loaded existing FAISS index from {VECTOR_DB_PATH}")
-        else:
-            vectorstore = FAISS.from_texts([], embeddings)
-            logging.info("Created new FAISS index")
-        
-        # Add new embeddings
-        vectorstore.add_texts(texts, metadatas=metadatas)
-        vectorstore.save_local(VECTOR_DB_PATH)
+        # Add to the owner's shard; persisted by the background snapshot
+        stored = get_index_manager((metadata or {}).get("user_id")).add_texts(texts, metadatas)
         
-        logging.info(f"Successfully stored {len(texts)} text chunks in FAISS")
+        logging.info(f"Successfully stored {stored} text chunks in FAISS")
         return True
     
     except Exception as e:
         logging.error(f"Error storing vectors: {str(e)}")
         return False
 
-def search_vectors(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+def split_text_stream(pages: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                      chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Split a document arriving in pieces (e.g. PDF pages) into chunks as it arrives.
+
+    Yields the same chunks as splitting the whole document with store_vectors
+    would, except near the points where the buffer was split: the last chunk
+    of every split is carried into the next one, so chunks never end at a
+    page boundary and keep their overlap.
+
+    Args:
+        pages (Iterable[str]): Pieces of the document, in order
+        chunk_size (int): Maximum chunk length
+        chunk_overlap (int): Overlap between consecutive chunks
+
+    Yields:
+        str: Text chunks
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    split_chars = max(STREAM_SPLIT_CHARS, 4 * chunk_size)
+
+    buffer = ""
+    for page in pages:
+        page_processed = process_document_for_vectors(page)
+        if not page_processed:
+            continue
+        buffer = f"{buffer} {page_processed}" if buffer else page_processed
+        if len(buffer) >= split_chars:
+            chunks = text_splitter.split_text(buffer)
+            yield from chunks[:-1]
+            buffer = chunks[-1] if chunks else ""
+    if buffer:
+        yield from text_splitter.split_text(buffer)
+
+def store_page_vectors(pages: Iterable[str], metadata: Dict[str, Any] = None) -> bool:
+    """
+    Chunk, embed and store a document while its pages are still being produced.
+
+    Chunks are embedded in batches as soon as enough pages have arrived, so
+    embedding overlaps the extraction of later pages. If storing fails
+    part-way, the chunks already stored for the file are deleted again.
+
+    Args:
+        pages (Iterable[str]): Text of each page, in order
+        metadata (Dict[str, Any], optional): Metadata to associate with every chunk
+
+    Returns:
+        bool: True if chunks were stored, False if there were none or an error occurs
+    """
+    metadata = metadata or {}
+    stored = 0
+
+    def store_batch(batch: List[str]) -> int:
+        return get_index_manager(metadata.get("user_id")).add_texts(batch, [dict(metadata) for _ in batch])
+
+    batch: List[str] = []
+    try:
+        for chunk in split_text_stream(pages):
+            batch.append(chunk)
+            if len(batch) >= STREAM_EMBED_BATCH:
+                stored += store_batch(batch)
+                batch = []
+        stored += store_batch(batch)
+
+    except Exception as e:
+        logging.error(f"Error storing vectors: {str(e)}")
+        if stored and metadata.get("file_id"):
+            delete_vectors(metadata["file_id"], metadata.get("user_id"))
+        return False
+
+    logging.info(f"Successfully stored {stored} text chunks in FAISS")
+    return stored > 0
+
+def search_vectors(query: str, top_k: int = 5, user_id: Optional[str] = None,
+                   filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
     Search for similar texts in the vector store.
     
     Args:
         query (str): Search query
         top_k (int): Number of results to return
+        user_id (str, optional): Only search this user's shard
+        filters (Dict[str, Any], optional): Metadata predicates applied inside the index:
+            `file_id`, `mime_type` (a value or a list of values) and
+            `uploaded_after` / `uploaded_before` (ISO dates or datetimes)
         
     Returns:
         List[Dict]: List of results with text and metadata
     """
     try:
-        if not os.path.exists(os.path.join(VECTOR_DB_PATH, "index.faiss")):
-            logging.warning("No FAISS index found.")
-            return []
-        
-        embeddings = get_embeddings()
-        vectorstore = FAISS.load_local(VECTOR_DB_PATH, embeddings)
-        
-        # Search for similar documents
-        results = vectorstore.similarity_search_with_score(query, k=top_k)
+        # Search only the caller's shard
+        results = get_index_manager(user_id).similarity_search(query, k=top_k, filters=filters)
         
         # Format results
         formatted_results = []
@@ -131,10 +1170,9 @@ def process_document_for_vectors(text: str) -> str:
     processed_text = " ".join(text.split())
     
     # Remove very long sequences of the same character (noise)
-    import re
     processed_text = re.sub(r'(.)\1{50,}', r'\1\1\1', processed_text)
     
     # Replace non-UTF8 characters
     processed_text = processed_text.encode('utf-8', 'ignore').decode('utf-8')
     
-    return processed_text
\ No newline at end of file
+    return processed_text
@@ -1,7 +1,10 @@
 # File: lobo/backend/utils/websocket.py
 # Enhancement: WebSocket implementation for real-time chat
+# Enhancement: Throttled token streaming over the new_message channel
 
 import os
+import time
+import uuid
 import logging
 import json
 import asyncio
@@ -21,6 +24,15 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # Initialize SocketIO
 socketio = SocketIO()
 
+# Minimum seconds between streamed delta emits for one message
+STREAM_EMIT_INTERVAL = float(os.getenv("STREAM_EMIT_INTERVAL", 0.05))
+
+# Redis queue shared by the web servers and the workers that emit to them; unset = no queue
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+
+# Write-only SocketIO used outside the web server process (e.g. Celery workers)
+_external_socketio: Optional[SocketIO] = None
+
 # In-memory store for connected clients and rooms
 connected_clients = {}  # user_id -> sid
 client_rooms = {}       # sid -> set of room names
@@ -30,6 +42,9 @@ def init_socketio(app: Flask):
     """Initialize SocketIO with the Flask app."""
     cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
     
+    # Receive emits from background workers only when a message queue is configured
+    queue_options = {"message_queue": SOCKETIO_MESSAGE_QUEUE} if SOCKETIO_MESSAGE_QUEUE else {}
+    
     socketio.init_app(
         app,
         cors_allowed_origins=cors_origins,
@@ -39,6 +54,7 @@ def init_socketio(app: Flask):
         ping_timeout=30,
         ping_interval=15,
         max_http_buffer_size=10 * 1024 * 1024,  # 10MB
+        **queue_options
     )
     
     # Register event handlers
@@ -316,7 +332,7 @@ def register_handlers():
             
             # Start processing message asynchronously
             from utils.tasks import process_chat_message
-            process_result = process_chat_message.delay(user_id, chat_id, message)
+            process_result = process_chat_message.delay(user_id, chat_id, message, bool(data.get("rag")))
             
             logging.info(f"User {user_id} sent message to chat {chat_id}: {message[:50]}...")
             
@@ -440,4 +456,104 @@ def send_to_user(user_id: str, event_type: str, data: Dict[str, Any]):
         data (Dict[str, Any]): Event data to send
     """
     user_room = f"user:{user_id}"
-    socketio.emit(event_type, data, room=user_room)
\ No newline at end of file
+    socketio.emit(event_type, data, room=user_room)
+
+def get_external_socketio() -> Optional[SocketIO]:
+    """
+    Get a SocketIO emitter for processes that do not serve clients.
+
+    Events are published to the Redis message queue and delivered by the web
+    servers subscribed to it.
+
+    Returns:
+        Optional[SocketIO]: Write-only SocketIO instance, or None if no
+            SOCKETIO_MESSAGE_QUEUE is configured
+    """
+    global _external_socketio
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return None
+    if _external_socketio is None:
+        _external_socketio = SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE)
+    return _external_socketio
+
+class ChatMessageStream:
+    """
+    Streams one assistant message to a chat room as it is generated.
+
+    Tokens are buffered and flushed as `new_message` events at most once per
+    `interval` seconds, so a fast model does not produce one emit per token.
+    Every event carries the same `message_id`; partial events hold only the
+    new text (`delta`), while the final event holds the complete content with
+    `partial` set to False so clients can replace what they accumulated.
+    """
+
+    def __init__(self, chat_id: str, server: SocketIO = None, interval: float = STREAM_EMIT_INTERVAL,
+                 event: str = "new_message"):
+        self.chat_id = chat_id
+        self.server = server or socketio
+        self.interval = interval
+        self.event = event
+        self.message_id = str(uuid.uuid4())
+        self.room = f"chat:{chat_id}"
+        self._buffer: List[str] = []
+        self._parts: List[str] = []
+        self._sequence = 0
+        self._last_emit = 0.0
+
+    @property
+    def content(self) -> str:
+        """Text received so far."""
+        return "".join(self._parts)
+
+    def _emit(self, message: Dict[str, Any], partial: bool):
+        if self.server.server is None:
+            # Neither a web server nor a message queue in this process: nobody to stream to
+            return
+        self.server.emit(self.event, {
+            "chat_id": self.chat_id,
+            "message_id": self.message_id,
+            "partial": partial,
+            "sequence": self._sequence,
+            "message": message
+        }, room=self.room)
+        self._sequence += 1
+
+    def push(self, token: str):
+        """
+        Add generated text, emitting a delta if the throttle interval has passed.
+
+        Args:
+            token (str): Newly generated text
+        """
+        self._buffer.append(token)
+        self._parts.append(token)
+        if time.monotonic() - self._last_emit >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Emit any buffered text immediately."""
+        if not self._buffer:
+            return
+        delta = "".join(self._buffer)
+        self._buffer = []
+        self._last_emit = time.monotonic()
+        self._emit({"role": "assistant", "delta": delta}, partial=True)
+
+    def finish(self, content: Optional[str] = None) -> str:
+        """
+        Emit the complete message and end the stream.
+
+        Args:
+            content (str, optional): Final content, defaults to the streamed text
+
+        Returns:
+            str: The final message content
+        """
+        self.flush()
+        final = self.content if content is None else content
+        self._emit({
+            "role": "assistant",
+            "content": final,
+            "timestamp": datetime.utcnow().isoformat()
+        }, partial=False)
+        return final